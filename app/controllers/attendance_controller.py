@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+import datetime
+from app.core import database
+from app.services.attendance_rollup import employee_attendance, department_attendance, employee_events
+
+router = APIRouter(prefix="/api/attendance",
+                   tags=["Attendance"])
+
+# Every list is newest first and keyset-paginated: pass the returned "next" value back as "before".
+
+# Endpoint 1 : Attendance of one employee per day / week / month
+@router.get("/employees/{employee_id}")
+def get_employee_attendance(
+    employee_id: int,
+    period: str = Query("day", pattern="^(day|week|month)$"),
+    before: Optional[datetime.date] = None,
+    limit: int = Query(31, ge=1, le=366),
+    db: Session = Depends(database.get_db),
+):
+    items, next_cursor = employee_attendance(db, employee_id, period, before, limit)
+    return {"status": "success", "items": items, "next": next_cursor}
+
+# Endpoint 2 : Attendance of a department per day / week / month
+@router.get("/departments/{department}")
+def get_department_attendance(
+    department: str,
+    period: str = Query("day", pattern="^(day|week|month)$"),
+    before: Optional[datetime.date] = None,
+    limit: int = Query(31, ge=1, le=366),
+    db: Session = Depends(database.get_db),
+):
+    items, next_cursor = department_attendance(db, department, period, before, limit)
+    return {"status": "success", "items": items, "next": next_cursor}
+
+# Endpoint 3 : Raw attendance events of one employee (activity log)
+@router.get("/employees/{employee_id}/events")
+def get_employee_events(
+    employee_id: int,
+    before_time: Optional[datetime.datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(database.get_db),
+):
+    before = (before_time, before_id) if before_time is not None and before_id is not None else None
+    items, next_cursor = employee_events(db, employee_id, before, limit)
+    next_page = {"before_time": next_cursor[0], "before_id": next_cursor[1]} if next_cursor else None
+    return {"status": "success", "items": items, "next": next_page}
@@ -5,10 +5,22 @@ from fastapi import APIRouter, UploadFile, File, Form, Depends
 # Form : Tor recieve form data like (name, department)
 # Depends : Used for database session --> dependency injection
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import asyncio
+import numpy as np
 from app.core import database
 from app.models.employee import Employee
-from app.services.face_logic import load_image_from_bytes, detect_faces, get_live_encoding, find_match
+from app.services.face_logic import get_live_encodings, run_face_job, FaceQueueFull, serves
+from app.services.encoding_format import deserialize_encoding
+from app.services.gallery_cache import gallery_cache
+from app.services.partitions import parse_scope, in_scope
+from app.services.frame_quality import check_frame, check_frames, record_rejection, rejection_response
+from app.services.registration import register_employee
+from app.services.registration_jobs import registration_queue
+from app.services.batcher import recognize_batcher
+from app.services.attendance_log import attendance_writer
+from app.services.result_cache import recognize_cache, frame_hash
+from app.core.metrics import stage, recognition_results, faces_per_frame
 
 router = APIRouter(prefix="/api",
                    tags=["Authentication"])
@@ -17,49 +29,185 @@ router = APIRouter(prefix="/api",
 async def register(
     name: str = Form(...),
     department: str = Form(...),
+    site: Optional[str] = Form(None), # Building the employee works at, for scoped recognition
     files: List[UploadFile] = File(...), # File is Required --> Waiting for request of images that will come from the webcam
     db: Session = Depends(database.get_db) # FastAPI Call get_db() --> open Session --> but the session in db variable 
     ):
+    if not serves("register"): # Recognize-only replicas never load MTCNN
+        return {"status": "error", "msg": "This worker does not serve registrations."}
     
-    best_encoding_bytes, best_index, best_confidence = await detect_faces(files)
+    images_bytes = [await file.read() for file in files]
+    try:
+        # Quality gate, MTCNN + encoding in the face pool, then the employee and its templates in one transaction
+        return await register_employee(db, name, department, site, images_bytes)
+    except FaceQueueFull:
+        return {"status": "error", "msg": "Server busy, please try again."}
 
-    if not best_encoding_bytes:
-        return {"status": "error", "msg": "No clear face found."}
-    # Add new Employee in Table Employee in the DataBase
-    new_employee = Employee(
-        name=name,
-        department=department,
-        encoding=best_encoding_bytes
-    )
-    
-    # Add the info 
-    db.add(new_employee)
-    db.commit()
-    # Refresh the db
-    db.refresh(new_employee)
-    return {"status": "success", "msg": f"Registered {name}"}
+# Endpoint 1b : Register in the background (returns a job id at once, poll /register/jobs/{job_id})
+@router.post("/register/jobs")
+async def register_job(
+    name: str = Form(...),
+    department: str = Form(...),
+    site: Optional[str] = Form(None),
+    files: List[UploadFile] = File(...),
+    ):
+    if not serves("register"):
+        return {"status": "error", "msg": "This worker does not serve registrations."}
+    job_id = await registration_queue.submit(name, department, site, [await file.read() for file in files])
+    if job_id is None: # REGISTER_QUEUE_SIZE jobs already waiting, or shutting down
+        return {"status": "error", "msg": "Server busy, please try again."}
+    return {"status": "success", "job_id": job_id}
+
+# Endpoint 1c : Status of a registration job (queued, running, done or failed), from any worker
+@router.get("/register/jobs/{job_id}")
+def register_job_status(job_id: str):
+    status = registration_queue.status(job_id)
+    if status is None:
+        return {"status": "error", "msg": "Unknown registration job."}
+    return status
 
 # Endpoint 2 : Recognize
 @router.post("/recognize")
 async def recognize(
     file: UploadFile = File(...),
+    device: Optional[str] = Form(None), # Camera / kiosk id, stored with the attendance event
+    scope: Optional[str] = Form(None), # Search only "site:<name>", "department:<name>" or "group:<name>" (access group)
     db: Session = Depends(database.get_db),
 ):
+    if not serves("recognize"):
+        return {"status": "error", "msg": "This worker does not serve recognition."}
+    try:
+        search_scope = parse_scope(scope)
+    except ValueError as exc:
+        return {"status": "error", "msg": str(exc)}
     image_bytes= await file.read() # Read the image as bytes
-    live_encoding = get_live_encoding(image_bytes) # Return encoding images using HOG detector
-    if not live_encoding:
+    # A near-identical frame from the same device a moment ago gets the same answer without detection.
+    # Only for identified devices: clients without one could be different kiosks (and different people).
+    with stage("frame_hash"):
+        image_hash = await asyncio.to_thread(frame_hash, image_bytes) if recognize_cache.enabled and device else None
+    cache_key = (device, search_scope) # The same frame may have another answer in another scope
+    cached, match = recognize_cache.get(cache_key, image_hash) if image_hash is not None else (False, None)
+    if not cached:
+        # Dark, blurry or empty frames are answered within a few ms, without a detector pass
+        reason = await asyncio.to_thread(check_frame, image_bytes)
+        if reason is not None:
+            record_rejection(reason)
+            recognition_results["rejected"].inc()
+            return rejection_response(reason)
+        generation = gallery_cache.generation
+        try:
+            # HOG encoding + gallery match, grouped with other concurrent scans into one micro-batch
+            match = await recognize_batcher.submit(image_bytes, search_scope)
+        except FaceQueueFull:
+            recognition_results["busy"].inc()
+            return {"status": "error", "msg": "Server busy, please try again."}
+        if image_hash is not None:
+            recognize_cache.put(cache_key, image_hash, match, generation)
+    faces_per_frame.observe(0 if match is None else 1) # Only the first face of a frame is used here
+    if match is None:
+        recognition_results["no_face"].inc()
         return {"status": "error", "msg": "No clear face found."}
     
-    # Get all the employees
-    employees = db.query(Employee).all()
-
-    # Compare between the known employees and live_encoding
-    employee,_,distance = find_match(employees, live_encoding)
+    # The match was computed against the cached gallery (no database read)
+    employee_id, _, distance = match
 
+    # Only the matched row is fully loaded
+    with stage("db"):
+        employee = db.get(Employee, employee_id) if employee_id is not None else None
     if employee:
-        return {"status": "success", "name": employee.name, "department":employee.department}
+        recognition_results["match"].inc()
+        # Queued for a bulk write, the response does not wait for a commit
+        attendance_writer.record(employee.id, distance, device)
+        response = {"status": "success", "id": employee.id, "name": employee.name, "department":employee.department}
+        if search_scope is not None:
+            response["in_scope"] = in_scope(search_scope, employee.site, employee.department) # False: found by the global fallback
+        return response
     else:
+        recognition_results["no_match"].inc()
         return {"status": "error", "msg": "Uknown"}
+
+# Endpoint 3 : Batch Recognize (several frames, several faces per frame)
+@router.post("/recognize/batch")
+async def recognize_batch(
+    files: List[UploadFile] = File(...),
+    device: Optional[str] = Form(None),
+    scope: Optional[str] = Form(None),
+    db: Session = Depends(database.get_db),
+):
+    if not serves("recognize"):
+        return {"status": "error", "msg": "This worker does not serve recognition."}
+    try:
+        search_scope = parse_scope(scope)
+    except ValueError as exc:
+        return {"status": "error", "msg": str(exc)}
+    images_bytes = [await file.read() for file in files]
+    # Only the images passing the quality gate go to the detectors
+    reasons = await asyncio.to_thread(check_frames, images_bytes)
+    for reason in filter(None, reasons):
+        record_rejection(reason)
+        recognition_results["rejected"].inc()
+    accepted = [i for i, reason in enumerate(reasons) if reason is None]
+    try:
+        # Every image is decoded, detected and encoded in a single pool job
+        faces_accepted = await run_face_job(get_live_encodings, [images_bytes[i] for i in accepted]) if accepted else []
+    except FaceQueueFull:
+        recognition_results["busy"].inc()
+        return {"status": "error", "msg": "Server busy, please try again."}
+    faces_per_image = [[] for _ in images_bytes]
+    for i, faces in zip(accepted, faces_accepted):
+        faces_per_image[i] = faces
+
+    # All faces from all images are matched against the gallery (or the scope's partition) in one matrix-by-matrix computation
+    encodings = [deserialize_encoding(encoding) for faces in faces_per_image for _, encoding in faces]
+    matches = gallery_cache.search(np.stack(encodings), search_scope) if encodings else []
+
+    # One query for every matched employee
+    matched_ids = {employee_id for employee_id, _, _ in matches if employee_id is not None}
+    with stage("db"):
+        employees = {emp.id: emp for emp in db.query(Employee).filter(Employee.id.in_(matched_ids))} if matched_ids else {}
+
+    results = []
+    match_iter = iter(matches)
+    for image_index, faces in enumerate(faces_per_image):
+        if reasons[image_index] is not None:
+            results.append({"image": image_index, "faces": [], "reason": reasons[image_index]})
+            continue
+        faces_per_frame.observe(len(faces))
+        if not faces:
+            recognition_results["no_face"].inc()
+        image_faces = []
+        for box, _ in faces:
+            employee_id, _, distance = next(match_iter)
+            employee = employees.get(employee_id)
+            recognition_results["match" if employee else "no_match"].inc()
+            if employee:
+                attendance_writer.record(employee.id, distance, device)
+                image_faces.append({"box": box, "status": "success", "name": employee.name,
+                                    "department": employee.department, "distance": distance})
+            else:
+                image_faces.append({"box": box, "status": "error", "msg": "Uknown"})
+        results.append({"image": image_index, "faces": image_faces})
+    return {"status": "success", "results": results}
+
+# Endpoint 4 : Gallery cache statistics
+@router.get("/gallery/stats")
+def gallery_stats():
+    return gallery_cache.stats()
+
+# Endpoint 5 : Micro-batching statistics (batch size and queue wait histograms)
+@router.get("/recognize/stats")
+def recognize_stats():
+    return recognize_batcher.stats()
+
+# Endpoint 6 : Duplicate-frame cache statistics (hit rate per process)
+@router.get("/recognize/cache/stats")
+def recognize_cache_stats():
+    return recognize_cache.stats()
+
+# Endpoint 7 : Registration queue statistics (depth, running jobs, wait and duration histograms)
+@router.get("/register/stats")
+def register_stats():
+    return registration_queue.stats()
     
     
 
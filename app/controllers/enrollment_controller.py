@@ -0,0 +1,57 @@
+from fastapi import APIRouter, UploadFile, File, Form
+from typing import Optional
+import os
+import shutil
+import tempfile
+from app.core.config import settings
+from app.services.face_logic import serves, pool_size
+from app.services.gallery_cache import gallery_cache
+from app.services.enrollment import read_manifest, resolve_import_source, start_import_job, import_jobs
+
+router = APIRouter(prefix="/api/employees",
+                   tags=["Enrollment"])
+
+# Endpoint 1 : Start a bulk import (zip upload, or a directory / zip already on the server)
+@router.post("/import")
+async def start_import(
+    manifest: UploadFile = File(...), # CSV : name, department, optional folder and site
+    archive: Optional[UploadFile] = File(None), # Zip of per-employee photo folders
+    source: Optional[str] = Form(None), # ... or a path under IMPORT_ROOT on the server (resumable through its checkpoint)
+    batch_size: int = Form(0),
+):
+    if not serves("register"):
+        return {"status": "error", "msg": "This worker does not serve registrations."}
+    rows = read_manifest((await manifest.read()).decode("utf-8-sig"))
+    if not rows:
+        return {"status": "error", "msg": "The CSV has no employees (expected columns: name, department, folder)."}
+
+    checkpoint_path = None
+    if archive is not None:
+        # Uploads are spooled to disk so pool workers can read the photos without copying the whole archive
+        with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as f:
+            shutil.copyfileobj(archive.file, f)
+            source = f.name
+    elif source:
+        try:
+            source = resolve_import_source(source)
+        except ValueError as exc:
+            return {"status": "error", "msg": str(exc)}
+        checkpoint_path = f"{source}.import.json" # Inside IMPORT_ROOT too
+    else:
+        return {"status": "error", "msg": "Upload a zip archive or give a server path under IMPORT_ROOT."}
+
+    # Always below the pool size, so live scans keep free workers while MTCNN runs for the import
+    concurrency = max(1, min(settings.IMPORT_CONCURRENCY or pool_size() // 2, pool_size() - 1))
+    job_id = start_import_job(source, rows, checkpoint_path, batch_size or settings.IMPORT_BATCH_SIZE, concurrency,
+                              on_insert=gallery_cache.add_employees) # New employees are recognizable as soon as their batch commits
+    if archive is not None:
+        import_jobs[job_id].task.add_done_callback(lambda _: os.remove(source))
+    return {"status": "success", "job_id": job_id, "total": len(rows)}
+
+# Endpoint 2 : Progress of an import (employees per minute, failures)
+@router.get("/import/{job_id}")
+def import_status(job_id: str):
+    job = import_jobs.get(job_id)
+    if job is None:
+        return {"status": "error", "msg": "Unknown import job."}
+    return {**job.stats(), "failures": job.failures, "flagged": job.flagged}
@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import registry
+from app.services.face_logic import face_jobs_in_flight
+from app.services.gallery_cache import gallery_cache
+from app.services.result_cache import recognize_cache
+from app.services.attendance_log import attendance_writer
+
+router = APIRouter(tags=["Monitoring"])
+
+# State read at scrape time, nothing to update on the request path
+registry.gauge("gallery_size", lambda: gallery_cache.stats()["size"], "Encodings in this worker's gallery")
+registry.gauge("face_jobs_in_flight", face_jobs_in_flight, "Face jobs queued or running in the pool")
+registry.gauge("recognize_cache_hit_ratio", lambda: recognize_cache.stats()["hit_rate"], "Duplicate-frame cache hit ratio")
+registry.gauge("attendance_buffered_events", lambda: attendance_writer.stats()["buffered"], "Attendance events waiting to be written")
+
+# Endpoint : Prometheus scrape target (metrics of this worker process)
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
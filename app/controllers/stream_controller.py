@@ -0,0 +1,130 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Optional
+import asyncio
+import numpy as np
+from app.core import database
+from app.core.config import settings
+from app.models.employee import Employee
+from app.services.face_logic import detect_face_boxes, encode_faces_full_resolution, run_face_job, FaceQueueFull, serves
+from app.services.gallery_cache import gallery_cache
+from app.services.attendance_log import attendance_writer
+from app.services.tracker import FaceTracker
+from app.services.partitions import parse_scope
+from app.services.frame_quality import check_frame, record_rejection
+from app.core.metrics import recognition_results, faces_per_frame
+
+router = APIRouter(prefix="/api",
+                   tags=["Streaming"])
+
+# Endpoint : Streaming Recognition over WebSocket
+# The client sends frames as binary messages (JPEG/PNG bytes) and receives JSON events:
+#   {"event": "identity", "track": 3, "status": "success", "id": 7, "name": ..., "department": ..., "distance": ..., "box": [...]}
+#   {"event": "identity", "track": 4, "status": "error", "msg": "Uknown", "box": [...]}
+#   {"event": "lost", "track": 3}
+# An optional `scope` query parameter limits the search like the scope of /api/recognize.
+# Sending the text message "stats" returns {"event": "stats", "frames": ..., "detections": ..., "encodings": ..., "rejected": ...}.
+@router.websocket("/stream")
+async def stream(websocket: WebSocket, device: Optional[str] = None, scope: Optional[str] = None):
+    await websocket.accept()
+    if not serves("recognize"):
+        await websocket.close(code=1008, reason="This worker does not serve recognition.")
+        return
+    try:
+        search_scope = parse_scope(scope) # Same scopes as /api/recognize, e.g. ?scope=site:HQ
+    except ValueError as exc:
+        await websocket.close(code=1008, reason=str(exc))
+        return
+
+    tracker = FaceTracker()
+    stats = {"frames": 0, "detections": 0, "encodings": 0, "rejected": 0}
+    latest = {"frame": None, "number": 0}
+    arrived = asyncio.Event()
+    employees = {} # employee id -> (name, department), looked up once per stream
+
+    async def receive():
+        # Only the newest frame is kept: when processing falls behind, stale frames are dropped
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                stats["frames"] += 1
+                latest["frame"], latest["number"] = message["bytes"], stats["frames"]
+                arrived.set()
+            elif message.get("text") == "stats":
+                await websocket.send_json({"event": "stats", **stats})
+
+    def lookup(employee_id):
+        if employee_id not in employees:
+            db = database.SessionLocal()
+            try:
+                employee = db.get(Employee, employee_id)
+                employees[employee_id] = (employee.name, employee.department) if employee else None
+            finally:
+                db.close()
+        return employees[employee_id]
+
+    receiver = asyncio.create_task(receive())
+    last_detection = -settings.STREAM_DETECT_INTERVAL
+    try:
+        while True:
+            waiter = asyncio.create_task(arrived.wait())
+            done, _ = await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                waiter.cancel()
+                break # Client disconnected
+            arrived.clear()
+            frame, number = latest["frame"], latest["number"]
+
+            # Between detection passes the tracks are kept as they are: no per-frame work at all
+            if number - last_detection < settings.STREAM_DETECT_INTERVAL:
+                continue
+            reason = await asyncio.to_thread(check_frame, frame)
+            if reason is not None:
+                stats["rejected"] += 1
+                record_rejection(reason)
+                if reason != "no_face":
+                    continue # Dark or blurry: keep the tracks and detect on the next frame instead
+            last_detection = number
+            try:
+                # Nobody in view: the tracks age out without a HOG pass
+                boxes = await run_face_job(detect_face_boxes, frame) if reason is None else []
+                stats["detections"] += reason is None
+                faces_per_frame.observe(len(boxes))
+                to_encode, dropped = tracker.update(boxes, number)
+                for track in dropped:
+                    await websocket.send_json({"event": "lost", "track": track.id})
+                if not to_encode:
+                    continue
+                # Encoding only for new tracks and uncertain / stale identities
+                encodings, _ = await run_face_job(encode_faces_full_resolution, frame, [track.box for track in to_encode])
+            except FaceQueueFull:
+                recognition_results["busy"].inc()
+                continue # Pool saturated: wait for the next frame
+            except ValueError:
+                continue # Unreadable frame
+            stats["encodings"] += len(to_encode)
+
+            encoded = [(track, encoding) for track, encoding in zip(to_encode, encodings) if encoding is not None]
+            if not encoded:
+                continue
+            matches = gallery_cache.search(np.stack([encoding for _, encoding in encoded]), search_scope)
+            for (track, _), (employee_id, _, distance) in zip(encoded, matches):
+                changed = track.verified_frame is None or employee_id != track.employee_id
+                track.employee_id, track.distance, track.verified_frame = employee_id, distance, number
+                if not changed:
+                    continue
+                employee = lookup(employee_id) if employee_id is not None else None
+                recognition_results["match" if employee else "no_match"].inc()
+                if employee:
+                    attendance_writer.record(employee_id, distance, device) # Once per identity per track, not per frame
+                    await websocket.send_json({"event": "identity", "track": track.id, "status": "success", "id": employee_id,
+                                               "name": employee[0], "department": employee[1],
+                                               "distance": distance, "box": track.box})
+                else:
+                    await websocket.send_json({"event": "identity", "track": track.id, "status": "error",
+                                               "msg": "Uknown", "box": track.box})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
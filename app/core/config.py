@@ -1,6 +1,7 @@
 #This file reads the raw text from .env and converts it into usable Python variables.
 
 import os
+import json
 from dotenv import load_dotenv # Load environment variables from a .env file
 
 load_dotenv() # load contents of the .env file into the environment
@@ -10,10 +11,110 @@ load_dotenv() # load contents of the .env file into the environment
 class Settings:
     # Get the DB URL from the environment variable , if it's missing in .env, use a default value provided.
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
+    # SQLite: WAL lets recognize reads run while a registration is writing; NORMAL is durable enough with WAL
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)) # Wait for a lock instead of failing with "database is locked"
+    # Postgres (or any server database): connection pool per worker process
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800)) # Seconds, stays under server / proxy idle timeouts
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
     # Get tolerance. Crucially, wrap it in float() because environment variables are always strings of text.
     FACE_TOLERANCE: float = float(os.getenv("FACE_TOLERANCE",0.5))
     CONFIDENCE_THRESHOLD: float = float(os.getenv("CONFIDENCE_THRESHOLD",0.90))
     API_URL: str = os.getenv("API_URL", "http://127.0.0.1:8000/api")
+    # Streamlit client: frames are downscaled to this longest side (0 = keep) and re-encoded as JPEG before upload
+    UPLOAD_MAX_SIDE: int = int(os.getenv("UPLOAD_MAX_SIDE", 960))
+    UPLOAD_JPEG_QUALITY: int = int(os.getenv("UPLOAD_JPEG_QUALITY", 85))
+    UPLOAD_TIMEOUT: float = float(os.getenv("UPLOAD_TIMEOUT", 60)) # Seconds before the client gives up on a scan / registration
+    # Device id the Streamlit client sends with every scan (recorded with attendance, keys the duplicate-frame cache).
+    # Empty: a random id per browser session
+    KIOSK_ID: str = os.getenv("KIOSK_ID", "")
+    # How often (seconds) each worker checks whether another worker has added employees
+    GALLERY_REFRESH_INTERVAL: float = float(os.getenv("GALLERY_REFRESH_INTERVAL", 5))
+    # Gallery search mode: "exact" scans every encoding, "ivf" uses the approximate k-means index
+    GALLERY_INDEX: str = os.getenv("GALLERY_INDEX", "exact")
+    IVF_NLIST: int = int(os.getenv("IVF_NLIST", 0)) # Number of partitions, 0 means sqrt(gallery size)
+    IVF_NPROBE: int = int(os.getenv("IVF_NPROBE", 8)) # Partitions searched per scan: higher = better recall, slower
+    IVF_MIN_SIZE: int = int(os.getenv("IVF_MIN_SIZE", 5000)) # Below this size the exact scan is used anyway
+    ANN_INDEX_PATH: str = os.getenv("ANN_INDEX_PATH", "./gallery_index.npz")
+    # Where detection / encoding run: "process" pool (default), "thread" pool, or "inline" on the event loop
+    FACE_EXECUTOR: str = os.getenv("FACE_EXECUTOR", "process")
+    FACE_WORKERS: int = int(os.getenv("FACE_WORKERS", 0)) # Pool size, 0 means one worker per CPU core
+    FACE_QUEUE_LIMIT: int = int(os.getenv("FACE_QUEUE_LIMIT", 64)) # Max jobs waiting or running before requests are refused
+    # Micro-batching of concurrent /api/recognize calls: wait up to N ms to group up to M frames in one job
+    RECOGNIZE_BATCH_SIZE: int = int(os.getenv("RECOGNIZE_BATCH_SIZE", 16))
+    RECOGNIZE_BATCH_WAIT_MS: float = float(os.getenv("RECOGNIZE_BATCH_WAIT_MS", 5))
+    # Registration stops looking at the other photos once a face reaches this MTCNN confidence (0 = always check all).
+    # With several templates (GALLERY_MAX_TEMPLATES) it stops only once that many faces reach it, i.e. never early
+    # with the default of 5 templates for 5 photos; set GALLERY_MAX_TEMPLATES=1 for the single-photo early exit.
+    REGISTER_GOOD_ENOUGH_CONFIDENCE: float = float(os.getenv("REGISTER_GOOD_ENOUGH_CONFIDENCE", 0))
+    # Background registration jobs (/api/register/jobs): queued jobs before new ones are refused, concurrent jobs,
+    # and how long (seconds) a finished job's status stays available
+    REGISTER_QUEUE_SIZE: int = int(os.getenv("REGISTER_QUEUE_SIZE", 32))
+    REGISTER_JOB_WORKERS: int = int(os.getenv("REGISTER_JOB_WORKERS", 2))
+    REGISTER_JOB_TTL: float = float(os.getenv("REGISTER_JOB_TTL", 600))
+    REGISTER_DRAIN_TIMEOUT: float = float(os.getenv("REGISTER_DRAIN_TIMEOUT", 30)) # On shutdown, seconds to finish accepted jobs
+    # Duplicate check at registration: a new face within DUPLICATE_THRESHOLD of a registered employee is
+    # "reject"ed, "flag"ged in the response (and registered anyway), or not checked ("off")
+    DUPLICATE_THRESHOLD: float = float(os.getenv("DUPLICATE_THRESHOLD", 0.4))
+    DUPLICATE_ACTION: str = os.getenv("DUPLICATE_ACTION", "reject")
+    # Detectors run on a copy whose longer side is at most this many pixels (0 = full resolution); encoding always uses full resolution
+    DETECTION_MAX_SIDE: int = int(os.getenv("DETECTION_MAX_SIDE", 640))
+    # Quality gate run before the detectors on a small grayscale copy (QUALITY_MAX_SIDE pixels): frames that are too dark,
+    # too bright (mean gray level 0-255), too blurry (variance of the Laplacian) or, with QUALITY_FACE_CHECK, without a frontal face
+    # are rejected with a reason. The thresholds and the Haar face check have not been measured against HOG on real
+    # kiosk frames yet: the face check is off until they are, since any face HOG finds but Haar misses would be a lost scan.
+    QUALITY_GATE: bool = os.getenv("QUALITY_GATE", "true").lower() in ("1", "true", "yes")
+    QUALITY_MAX_SIDE: int = int(os.getenv("QUALITY_MAX_SIDE", 240))
+    QUALITY_MIN_BRIGHTNESS: float = float(os.getenv("QUALITY_MIN_BRIGHTNESS", 35))
+    QUALITY_MAX_BRIGHTNESS: float = float(os.getenv("QUALITY_MAX_BRIGHTNESS", 225))
+    QUALITY_MIN_SHARPNESS: float = float(os.getenv("QUALITY_MIN_SHARPNESS", 20))
+    QUALITY_FACE_CHECK: bool = os.getenv("QUALITY_FACE_CHECK", "false").lower() in ("1", "true", "yes") # Live frames only
+    # What this worker serves: "all", "recognize" (never loads MTCNN / TensorFlow) or "register"
+    WORKER_ROLE: str = os.getenv("WORKER_ROLE", "all")
+    # Load MTCNN / TensorFlow in every pool worker at startup (faster first registration, far more memory per worker).
+    # Off: MTCNN is loaded by a worker on its first registration.
+    MTCNN_WARMUP: bool = os.getenv("MTCNN_WARMUP", "false").lower() in ("1", "true", "yes")
+    # Attendance events are written in bulk when this many are buffered, or every N seconds
+    ATTENDANCE_FLUSH_SIZE: int = int(os.getenv("ATTENDANCE_FLUSH_SIZE", 200))
+    ATTENDANCE_FLUSH_INTERVAL: float = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", 1.0))
+    # WebSocket streaming: detect every N frames, track faces in between, re-encode only when needed
+    STREAM_DETECT_INTERVAL: int = int(os.getenv("STREAM_DETECT_INTERVAL", 5))
+    STREAM_REVERIFY_FRAMES: int = int(os.getenv("STREAM_REVERIFY_FRAMES", 150)) # Re-check a confident identity this often
+    STREAM_CONFIDENT_DISTANCE: float = float(os.getenv("STREAM_CONFIDENT_DISTANCE", 0.4)) # Above this, re-encode on the next detection
+    STREAM_IOU_THRESHOLD: float = float(os.getenv("STREAM_IOU_THRESHOLD", 0.3))
+    STREAM_MAX_MISSES: int = int(os.getenv("STREAM_MAX_MISSES", 2)) # Detection passes a face may be missing before its track ends
+    # /api/recognize returns the previous result for a near-identical frame from the same device within N seconds (0 = off)
+    RESULT_CACHE_TTL: float = float(os.getenv("RESULT_CACHE_TTL", 2.0))
+    RESULT_CACHE_MAX_HAMMING: int = int(os.getenv("RESULT_CACHE_MAX_HAMMING", 8)) # Differing bits (of 256) still treated as the same frame
+    RESULT_CACHE_DEVICES: int = int(os.getenv("RESULT_CACHE_DEVICES", 256)) # Least recently used devices beyond this are evicted
+    RESULT_CACHE_PER_DEVICE: int = int(os.getenv("RESULT_CACHE_PER_DEVICE", 4))
+    # Face templates kept per employee: good registration shots (1 = only the best one, as before) and adaptive updates.
+    # Above 1, registration detects and encodes every photo (see REGISTER_GOOD_ENOUGH_CONFIDENCE).
+    GALLERY_MAX_TEMPLATES: int = int(os.getenv("GALLERY_MAX_TEMPLATES", 5))
+    # Adaptive templates: a confident recognition adds the live encoding as a new template when it is
+    # closer than ADAPTIVE_TEMPLATE_DISTANCE, yet farther than ADAPTIVE_TEMPLATE_NOVELTY from the employee's templates
+    # (a new angle), and at least ADAPTIVE_TEMPLATE_MARGIN closer than any other employee. Off by default.
+    ADAPTIVE_TEMPLATES: bool = os.getenv("ADAPTIVE_TEMPLATES", "false").lower() in ("1", "true", "yes")
+    ADAPTIVE_TEMPLATE_DISTANCE: float = float(os.getenv("ADAPTIVE_TEMPLATE_DISTANCE", 0.4))
+    ADAPTIVE_TEMPLATE_NOVELTY: float = float(os.getenv("ADAPTIVE_TEMPLATE_NOVELTY", 0.25))
+    ADAPTIVE_TEMPLATE_MARGIN: float = float(os.getenv("ADAPTIVE_TEMPLATE_MARGIN", 0.15))
+    # Scoped recognition (site:<name>, department:<name>, group:<name>): search the whole gallery when the scope has no match
+    SCOPE_FALLBACK: bool = os.getenv("SCOPE_FALLBACK", "true").lower() in ("1", "true", "yes")
+    # Named access groups as JSON, e.g. {"hq-lobby": {"sites": ["HQ"], "departments": ["Security", "Cleaning"]}}
+    ACCESS_GROUPS: dict = json.loads(os.getenv("ACCESS_GROUPS", "{}"))
+    # Gallery snapshot shared by every worker of a host through mmap (empty = each worker keeps its own copy).
+    # Use a local path per host; the first worker to see new rows publishes the next snapshot for the others.
+    GALLERY_SNAPSHOT_PATH: str = os.getenv("GALLERY_SNAPSHOT_PATH", "")
+    # Bulk enrollment: employees written per bulk INSERT (and per checkpoint)
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", 50))
+    # Directory the API may import from by server path (POST /api/employees/import `source`); empty = uploads only
+    IMPORT_ROOT: str = os.getenv("IMPORT_ROOT", "")
+    # Employees detected at once by an API import, on the face pool shared with live scans (0 = half the pool)
+    IMPORT_CONCURRENCY: int = int(os.getenv("IMPORT_CONCURRENCY", 0))
 
 
 settings = Settings()
@@ -1,11 +1,42 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
 
+# Engine factory : the options depend on the backend of the URL
+def create_db_engine(url=None):
+    """
+    SQLite : check_same_thread off (sessions are used from the thread pool), and on every new connection
+    the journal mode (WAL), synchronous level and busy timeout pragmas from Settings.
+    Others (Postgres) : a connection pool sized from Settings, with pre-ping and recycle against dropped connections.
+    """
+    url = url or settings.DATABASE_URL
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    # The connect_args parameter is used here to allow SQLite to be used in a multi-threaded environment.
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    journal_mode, synchronous, busy_timeout = settings.SQLITE_JOURNAL_MODE, settings.SQLITE_SYNCHRONOUS, settings.SQLITE_BUSY_TIMEOUT_MS
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}") # Persistent in the file, ignored for in-memory databases
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        cursor.close()
+
+    return engine
+
 # Create the SQLAlchemy engine using the database URL from settings
-# The connect_args parameter is used here to allow SQLite to be used in a multi-threaded environment.
-# For other databases, this parameter may not be necessary.
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_db_engine()
 # Create a configured "Session" class
 # This class will be used to create new database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -13,6 +44,26 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # This base class will be used to define the database models
 Base = declarative_base()
 
+# create_all only creates missing tables : nullable columns added to a model later are added to existing tables here
+def add_missing_columns(bind):
+    """ Adds new nullable columns (and their indexes) to tables created by an older version. Returns: Names added """
+    inspector = inspect(bind)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            with bind.begin() as connection:
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}")
+                for index in table.indexes:
+                    if column.name in index.columns:
+                        index.create(connection)
+            added.append(f"{table.name}.{column.name}")
+    return added
+
 # Dependency function to get a database session
 # This function can be used with FastAPI's dependency injection system
 # It ensures that the database session is properly created and closed after use
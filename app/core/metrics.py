@@ -0,0 +1,225 @@
+#Lightweight in-process metrics (no external dependency), exported in the Prometheus text format.
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+def _format_labels(labels, extra=None):
+    items = list((labels or {}).items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+class Counter:
+    """ A monotonically increasing count. """
+
+    kind = "counter"
+
+    def __init__(self, name, description="", labels=None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labels)} {self.value}"]
+
+
+class Gauge:
+    """ A value read from a callback when the metrics are scraped (nothing to update on the hot path). """
+
+    kind = "gauge"
+
+    def __init__(self, name, func, description="", labels=None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self._func = func
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labels)} {self._func()}"]
+
+
+class Histogram:
+    """ Counts observations into fixed cumulative buckets, like a Prometheus histogram. """
+
+    kind = "histogram"
+
+    def __init__(self, name, buckets, description="", labels=None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1) # Last slot is the +Inf bucket
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """ Returns: count, sum and the cumulative count of observations <= each bucket bound. """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + ["+Inf"], counts):
+            running += count
+            cumulative[str(bound)] = running
+        return {"count": running, "sum": total, "buckets": cumulative}
+
+    def render(self):
+        snapshot = self.snapshot()
+        lines = [f"{self.name}_bucket{_format_labels(self.labels, {'le': bound})} {count}"
+                 for bound, count in snapshot["buckets"].items()]
+        lines.append(f"{self.name}_sum{_format_labels(self.labels)} {snapshot['sum']}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels)} {snapshot['count']}")
+        return lines
+
+
+class Registry:
+    """ The metrics exposed at /metrics. Metrics with the same name (different labels) are rendered as one family. """
+
+    def __init__(self):
+        self._metrics = {} # (name, labels) -> metric
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[(metric.name, tuple(sorted(metric.labels.items())))] = metric
+        return metric
+
+    def _get_or_create(self, name, labels, factory):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(key, factory())
+        return metric
+
+    def counter(self, name, description="", labels=None):
+        return self._get_or_create(name, labels, lambda: Counter(name, description, labels))
+
+    def histogram(self, name, buckets, description="", labels=None):
+        return self._get_or_create(name, labels, lambda: Histogram(name, buckets, description, labels))
+
+    def gauge(self, name, func, description=""):
+        return self.register(Gauge(name, func, description))
+
+    def render(self):
+        families = {}
+        for metric in list(self._metrics.values()):
+            families.setdefault(metric.name, []).append(metric)
+        lines = []
+        for name, metrics in families.items():
+            lines.append(f"# HELP {name} {metrics[0].description}")
+            lines.append(f"# TYPE {name} {metrics[0].kind}")
+            for metric in metrics:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# Per-stage Timing
+# stage("hog") times a block. Inside a face job the time is collected and sent back with the result (pool workers
+# are other processes), elsewhere it is observed directly. Either way it also lands in the current request trace.
+STAGE_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+
+_collector = contextvars.ContextVar("stage_collector", default=None) # Set inside a face job
+_trace = contextvars.ContextVar("stage_trace", default=None) # Set for requests that asked for a trace
+
+def stage_histogram(name):
+    return registry.histogram("face_stage_seconds", STAGE_BUCKETS, "Time spent in each recognition stage", {"stage": name})
+
+def record_stages(stages):
+    """ Observes {stage: seconds} (e.g. returned by a face job) and adds them to the current request trace. """
+    trace = _trace.get()
+    for name, seconds in stages.items():
+        stage_histogram(name).observe(seconds)
+        if trace is not None:
+            trace[name] = trace.get(name, 0.0) + seconds
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        collector = _collector.get()
+        if collector is not None:
+            collector[name] = collector.get(name, 0.0) + elapsed
+        else:
+            record_stages({name: elapsed})
+
+def collect_stages(func, *args):
+    """ Runs func (inside a pool worker) and returns (result, {stage: seconds}) for record_stages. """
+    stages = {}
+    token = _collector.set(stages)
+    try:
+        return func(*args), stages
+    finally:
+        _collector.reset(token)
+
+@contextmanager
+def trace_stages():
+    """ Collects the stages recorded in this context into a dict (the batcher uses it to share one job's timings). """
+    trace = {}
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+def current_trace():
+    """ Returns: The trace dict of the current request, or None when it did not ask for one. """
+    return _trace.get()
+
+
+class StageTimingMiddleware:
+    """
+    Requests sent with the header `X-Trace: 1` get a `Server-Timing` response header with the time spent
+    in each stage (decode, hog, mtcnn, encode, match, db, ...) plus the total. Other requests pay one header lookup.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or dict(scope["headers"]).get(b"x-trace", b"0") in (b"0", b""):
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        trace = {}
+        token = _trace.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in trace.items()]
+                timings.append(f"total;dur={(time.perf_counter() - start) * 1000:.2f}")
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", ", ".join(timings).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _trace.reset(token)
+
+
+# Recognition outcomes (per face, "no_face" per frame) and faces per frame, observed by the controllers
+recognition_results = {
+    outcome: registry.counter("recognition_results_total", "Recognition outcomes", {"outcome": outcome})
+    for outcome in ("match", "no_match", "no_face", "busy", "rejected")
+}
+faces_per_frame = registry.histogram("faces_per_frame", [0, 1, 2, 3, 4, 6, 8, 12, 16], "Faces detected per recognized frame")
@@ -1,11 +1,55 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from app.core.database import engine, get_db, Base
+from app.core.config import settings
+from app.core.database import engine, get_db, Base, add_missing_columns
 from app.models.employee import Employee
+from app.models.attendance import AttendanceEvent, AttendanceDaily, AttendanceDepartmentDaily
+from app.models.face_template import FaceTemplate
+from app.models.registration_job import RegistrationJobRecord
 from app.controllers.auth_controller import router
+from app.controllers.attendance_controller import router as attendance_router
+from app.controllers.stream_controller import router as stream_router
+from app.controllers.metrics_controller import router as metrics_router
+from app.controllers.enrollment_controller import router as enrollment_router
+from app.core.metrics import StageTimingMiddleware
+from app.services.gallery_cache import gallery_cache
+from app.services.face_logic import start_executor, shutdown_executor
+from app.services.batcher import recognize_batcher
+from app.services.attendance_log import attendance_writer
+from app.services.registration_jobs import registration_queue
 
-app = FastAPI(title="Employee Attendance System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the gallery once so the first scan does not pay for loading every encoding
+    gallery_cache.load()
+    # Spawn the face worker pool now, so its model loading happens before the first scan
+    start_executor()
+    recognize_batcher.start()
+    registration_queue.start()
+    attendance_writer.start()
+    # Keep the gallery in sync with employees registered by other workers
+    watcher = asyncio.create_task(gallery_cache.watch(settings.GALLERY_REFRESH_INTERVAL))
+    yield
+    watcher.cancel()
+    await recognize_batcher.stop()
+    await registration_queue.stop()
+    # Write the attendance events still buffered, nothing is lost on a clean shutdown
+    await attendance_writer.stop()
+    # Keep incremental inserts in the saved ANN index (if enabled) for the next start
+    gallery_cache.save_index()
+    shutdown_executor()
+
+app = FastAPI(title="Employee Attendance System", lifespan=lifespan)
 
 # Setup the DB by autimatically creating the tables 
 Base.metadata.create_all(bind=engine)
+add_missing_columns(engine) # e.g. employees.site on a database created before scoped recognition
 app.include_router(router)
+app.include_router(attendance_router)
+app.include_router(stream_router)
+app.include_router(metrics_router)
+app.include_router(enrollment_router)
+# Per-stage Server-Timing header for requests sent with "X-Trace: 1"
+app.add_middleware(StageTimingMiddleware)
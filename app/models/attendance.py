@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index
+from app.core.database import Base # Import the Base class from the database module
+import datetime
+# One row per successful recognition (written in bulk by app/services/attendance_log.py)
+class AttendanceEvent(Base):
+    __tablename__ = "attendance_events"
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), index=True) # Who was recognized
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True) # When the frame was matched (UTC)
+    device = Column(String, nullable=True) # Camera / kiosk that sent the frame
+    distance = Column(Float) # Face distance of the match, lower is more certain
+    # History of one employee, newest first : WHERE employee_id = ? AND (timestamp, id) < cursor
+    __table_args__ = (Index("ix_attendance_events_employee_time", "employee_id", "timestamp", "id"),)
+
+# Daily rollup, maintained incrementally with every flush of attendance events.
+# Dashboards read these rows (at most one per employee per day) instead of aggregating raw events.
+class AttendanceDaily(Base):
+    __tablename__ = "attendance_daily"
+    employee_id = Column(Integer, ForeignKey("employees.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    week = Column(Date, nullable=False) # Monday of the day's week, so weekly totals are a plain GROUP BY
+    month = Column(Date, nullable=False) # First day of the day's month
+    scans = Column(Integer, nullable=False, default=0)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+    __table_args__ = (
+        Index("ix_attendance_daily_employee_week", "employee_id", "week"),
+        Index("ix_attendance_daily_employee_month", "employee_id", "month"),
+        Index("ix_attendance_daily_day", "day"),
+    )
+
+# Daily rollup per department, maintained together with AttendanceDaily
+class AttendanceDepartmentDaily(Base):
+    __tablename__ = "attendance_department_daily"
+    department = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    week = Column(Date, nullable=False)
+    month = Column(Date, nullable=False)
+    employees_present = Column(Integer, nullable=False, default=0) # Distinct employees seen that day
+    scans = Column(Integer, nullable=False, default=0)
+    __table_args__ = (
+        Index("ix_attendance_department_daily_week", "department", "week"),
+        Index("ix_attendance_department_daily_month", "department", "month"),
+    )
@@ -8,6 +8,7 @@ class Employee(Base):
     id = Column(Integer, primary_key=True, index=True) # Primary key column for employee ID
     name = Column(String, index=True)
     department = Column(String, index=True)
-    encoding = Column(LargeBinary) # Column to store the facial encoding as binary data
+    site = Column(String, index=True, nullable=True) # Building / site the employee works at, used to scope recognition
+    encoding = Column(LargeBinary) # Column to store the facial encoding as binary data (see app/services/encoding_format.py)
     last_seen = Column(DateTime, default=datetime.datetime.utcnow) # Column to store the last seen timestamp
     
\ No newline at end of file
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, LargeBinary, ForeignKey
+from app.core.database import Base # Import the Base class from the database module
+import datetime
+# Extra face templates of an employee : every good registration shot, plus adaptive updates from confident scans.
+# Employees without any row here are matched on Employee.encoding alone (databases created before templates).
+class FaceTemplate(Base):
+    __tablename__ = "face_templates"
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), index=True, nullable=False) # Owner
+    encoding = Column(LargeBinary, nullable=False) # Same float32 format as Employee.encoding (app/services/encoding_format.py)
+    source = Column(String, nullable=False, default="registration") # "registration" or "adaptive"
+    quality = Column(Float) # MTCNN confidence for registration shots, match distance for adaptive updates
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Text, DateTime
+from app.core.database import Base # Import the Base class from the database module
+import datetime
+# Status of a background registration (/api/register/jobs). The photos stay in the memory of the worker that
+# accepted the job, the status is here so any worker can answer a poll.
+class RegistrationJobRecord(Base):
+    __tablename__ = "registration_jobs"
+    id = Column(String, primary_key=True) # uuid4 hex, returned to the client
+    status = Column(String, nullable=False, index=True) # queued -> running -> done | failed
+    name = Column(String)
+    worker = Column(String) # host:pid of the worker holding the photos
+    result = Column(Text) # JSON: id, image_index, confidence, templates (done) or msg, reasons (failed)
+    queued_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
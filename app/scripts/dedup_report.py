@@ -0,0 +1,73 @@
+#Offline duplicate report : every pair of employees whose face templates are closer than a threshold.
+#Usage : python -m app.scripts.dedup_report [--threshold 0.4] [--block-size 2048] [--output duplicates.csv]
+#Distances are computed block by block (block x remaining rows, one matrix product each), so memory stays at
+#block-size x N floats and no pair is ever visited in a Python loop.
+
+import argparse
+import csv
+import sys
+import time
+import numpy as np
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.employee import Employee
+from app.services.gallery import Gallery
+from app.services.gallery_cache import GalleryCache
+
+
+def near_duplicate_pairs(gallery, threshold, block_size=2048):
+    """
+    Finds every pair of rows owned by two different employees within `threshold` of each other.
+    Each block of rows is compared only with itself and the rows after it (upper triangle), in one matrix product.
+    Returns: {(Employee id a, Employee id b): smallest distance between their templates}, with a < b
+    """
+    ids, encodings, sq_norms = gallery.ids, gallery.encodings, gallery.sq_norms
+    sq_threshold = threshold * threshold
+    pairs = {}
+    for start in range(0, len(gallery), block_size):
+        stop = min(start + block_size, len(gallery))
+        # ||a - b||^2 = ||a||^2 - 2 a.b + ||b||^2 for the block against rows start..N
+        sq_distances = sq_norms[start:stop, None] - 2.0 * (encodings[start:stop] @ encodings[start:].T) + sq_norms[None, start:]
+        rows, columns = np.nonzero(sq_distances < sq_threshold)
+        columns += start
+        keep = (columns > rows + start) & (ids[rows + start] != ids[columns]) # Upper triangle, two different employees
+        rows, columns = rows[keep], columns[keep]
+        distances = np.sqrt(np.maximum(sq_distances[rows, columns - start], 0.0))
+        for a, b, distance in zip(ids[rows + start].tolist(), ids[columns].tolist(), distances.tolist()):
+            key = (a, b) if a < b else (b, a)
+            if distance < pairs.get(key, np.inf):
+                pairs[key] = distance
+    return pairs
+
+
+def dedup_report(threshold=None, block_size=2048):
+    """ Returns: [(distance, employee a, employee b)] sorted by distance, the employees being (id, name, department) """
+    threshold = settings.DUPLICATE_THRESHOLD if threshold is None else threshold
+    db = SessionLocal()
+    try:
+        gallery = Gallery.from_rows(GalleryCache._read_rows(db)) # Every template, the same rows a worker searches
+        start = time.perf_counter()
+        pairs = near_duplicate_pairs(gallery, threshold, block_size)
+        print(f"Compared {len(gallery)} templates in {time.perf_counter() - start:.1f} s: {len(pairs)} pairs within {threshold}",
+              file=sys.stderr)
+        employee_ids = {employee_id for pair in pairs for employee_id in pair}
+        employees = {row.id: (row.id, row.name, row.department) for row in
+                     db.execute(select(Employee.id, Employee.name, Employee.department).where(Employee.id.in_(employee_ids)))}
+    finally:
+        db.close()
+    return sorted((distance, employees[a], employees[b]) for (a, b), distance in pairs.items())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List employees that are probably the same person registered twice.")
+    parser.add_argument("--threshold", type=float, default=None, help="Max face distance (default DUPLICATE_THRESHOLD)")
+    parser.add_argument("--block-size", type=int, default=2048, help="Rows compared per matrix product")
+    parser.add_argument("--output", help="CSV file (default: standard output)")
+    args = parser.parse_args()
+    report = dedup_report(args.threshold, args.block_size)
+    with (open(args.output, "w", newline="") if args.output else sys.stdout) as f:
+        writer = csv.writer(f)
+        writer.writerow(["distance", "id_a", "name_a", "department_a", "id_b", "name_b", "department_b"])
+        for distance, a, b in report:
+            writer.writerow([f"{distance:.4f}", *a, *b])
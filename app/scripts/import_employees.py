@@ -0,0 +1,39 @@
+#Bulk enrollment : imports employees from a directory or zip archive of per-employee photo folders plus a CSV.
+#Usage : python -m app.scripts.import_employees --source photos.zip --csv staff.csv [--workers 8] [--batch-size 50]
+#CSV columns : name, department and optionally folder (the photo folder, defaults to the name) and site.
+#Progress is checkpointed to <source>.import.json : re-running the same command resumes an interrupted import.
+
+import argparse
+from app.core.config import settings
+from app.services.enrollment import EnrollmentImport, read_manifest
+from app.services.gallery_cache import gallery_cache
+
+
+def import_employees(source, csv_path, workers=None, batch_size=None, checkpoint_path=None):
+    """ Returns: The import stats (enrolled, failed, skipped, employees_per_minute, ...), failures, flagged duplicates """
+    with open(csv_path, encoding="utf-8-sig") as f: # utf-8-sig: spreadsheets often add a BOM
+        manifest = read_manifest(f.read())
+    checkpoint_path = checkpoint_path or f"{str(source).rstrip('/')}.import.json"
+    # The duplicate check searches this process's gallery: committed batches are added to it as the import goes
+    on_insert = gallery_cache.add_employees if settings.DUPLICATE_ACTION in ("reject", "flag") else None
+    job = EnrollmentImport(source, manifest, checkpoint_path, batch_size or settings.IMPORT_BATCH_SIZE, on_insert)
+    if job.skipped:
+        print(f"Resuming: {job.skipped} of {job.total} employees already imported ({checkpoint_path})")
+    return job.run(workers), job.failures, job.flagged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-enroll employees from photo folders and a CSV.")
+    parser.add_argument("--source", required=True, help="Directory or .zip with one folder of photos per employee")
+    parser.add_argument("--csv", required=True, help="CSV with name, department and optional folder and site columns")
+    parser.add_argument("--workers", type=int, default=0, help="Detection processes (0 = one per CPU core)")
+    parser.add_argument("--batch-size", type=int, default=0, help="Employees per bulk INSERT (default IMPORT_BATCH_SIZE)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default <source>.import.json)")
+    args = parser.parse_args()
+    stats, failures, flagged = import_employees(args.source, args.csv, args.workers or None, args.batch_size or None, args.checkpoint)
+    for folder, reason in failures.items():
+        print(f"  {folder}: {reason}")
+    for folder, duplicate_of in flagged.items():
+        print(f"  {folder}: imported, but looks like {duplicate_of}")
+    print(f"Done: {stats['enrolled']} enrolled, {stats['failed']} failed, {stats['skipped']} already imported, "
+          f"{stats['employees_per_minute']:.1f} employees/min over {stats['elapsed_seconds']:.1f}s.")
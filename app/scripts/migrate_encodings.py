@@ -0,0 +1,58 @@
+#One-shot migration : converts pickled Employee.encoding rows to the compact float32 format.
+#Usage : python -m app.scripts.migrate_encodings [--batch-size 500] [--dry-run]
+
+import argparse
+from sqlalchemy import select, update
+from app.core.database import SessionLocal
+from app.models.employee import Employee
+from app.services.encoding_format import serialize_encoding, deserialize_encoding, is_legacy_encoding
+
+
+def migrate_encodings(batch_size=500, dry_run=False):
+    """
+    Walks the employees table in primary-key order, one batch at a time, and rewrites every legacy pickled
+    encoding in the versioned float32 format. Rows already in the new format are left untouched,
+    so the command can safely be re-run or resumed after an interruption.
+
+    Returns: Number of rows scanned (Int), Number of rows converted (Int)
+    """
+    scanned = converted = 0
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            # Keyset pagination : only id and encoding are loaded, never the full ORM objects
+            rows = db.execute(
+                select(Employee.id, Employee.encoding)
+                .where(Employee.id > last_id)
+                .order_by(Employee.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            scanned += len(rows)
+
+            updates = [
+                {"id": row.id, "encoding": serialize_encoding(deserialize_encoding(row.encoding))}
+                for row in rows
+                if row.encoding and is_legacy_encoding(row.encoding)
+            ]
+            if updates and not dry_run:
+                db.execute(update(Employee), updates) # Bulk UPDATE by primary key
+                db.commit()
+            converted += len(updates)
+            print(f"Scanned {scanned} rows, converted {converted}")
+    finally:
+        db.close()
+    return scanned, converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert pickled face encodings to the float32 binary format.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows converted per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Count legacy rows without writing")
+    args = parser.parse_args()
+    scanned, converted = migrate_encodings(args.batch_size, args.dry_run)
+    action = "would convert" if args.dry_run else "converted"
+    print(f"Done: {action} {converted} of {scanned} employees.")
@@ -1 +1,2 @@
 from .face_logic import load_image_from_bytes, detect_faces, get_live_encoding, find_match
+from .gallery import Gallery
@@ -0,0 +1,184 @@
+import os
+import numpy as np
+from app.core.config import settings
+from app.services.encoding_format import ENCODING_DIM
+from app.services.gallery import Gallery
+
+_ASSIGN_CHUNK = 8192 # Rows assigned to centroids per step, bounds the N x nlist distance matrix
+
+
+def _nearest_centroids(encodings, centroids):
+    """ Index of the closest centroid for every row, computed in fixed-size chunks. """
+    centroid_sq_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(encodings), dtype=np.int64)
+    for start in range(0, len(encodings), _ASSIGN_CHUNK):
+        chunk = encodings[start:start + _ASSIGN_CHUNK]
+        # ||x||^2 is the same for every centroid, so it can be left out of the argmin
+        scores = centroid_sq_norms - 2.0 * (chunk @ centroids.T)
+        assignments[start:start + _ASSIGN_CHUNK] = np.argmin(scores, axis=1)
+    return assignments
+
+
+def train_centroids(encodings, nlist, iterations=20, sample_size=None, seed=0):
+    """ Plain k-means (Lloyd) over a sample of the gallery. Returns an nlist x 128 float32 matrix. """
+    rng = np.random.default_rng(seed)
+    encodings = np.asarray(encodings, dtype=np.float32)
+    sample_size = sample_size or 256 * nlist # 256 points per centroid is plenty to place it
+    if len(encodings) > sample_size:
+        encodings = encodings[rng.choice(len(encodings), sample_size, replace=False)]
+
+    centroids = encodings[rng.choice(len(encodings), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest_centroids(encodings, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, encodings)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters from random points so every list stays useful
+        if empty.any():
+            centroids[empty] = encodings[rng.choice(len(encodings), int(empty.sum()), replace=False)]
+    return centroids
+
+
+# Approximate Nearest Neighbour Index : IVF (inverted file) over k-means partitions
+class IVFIndex:
+    """
+    Splits the gallery into `nlist` k-means partitions, each stored as its own contiguous Gallery.
+    A search only scans the `nprobe` partitions whose centroids are closest to the live encoding,
+    so `nprobe` trades recall for speed (nprobe == nlist is an exact search).
+    """
+
+    def __init__(self, centroids, nprobe=None):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self.nprobe = settings.IVF_NPROBE if nprobe is None else nprobe
+        self.trained_size = 0 # Gallery size the centroids were trained on
+        self._centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self._lists = [Gallery() for _ in range(len(self.centroids))]
+        self._size = 0
+
+    @classmethod
+    def train(cls, gallery, nlist=None, nprobe=None):
+        """ Trains centroids on the gallery and fills the inverted lists with every row. """
+        nlist = nlist or settings.IVF_NLIST or int(np.sqrt(len(gallery))) # sqrt(N) lists by default
+        nlist = max(1, min(nlist, len(gallery)))
+        index = cls(train_centroids(gallery.encodings, nlist), nprobe)
+        index.trained_size = len(gallery)
+        index.add_many(gallery.ids, gallery.encodings)
+        return index
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def add_many(self, ids, encodings, assignments=None):
+        """ Appends rows to their partitions (assigned to the nearest centroid unless given). """
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        ids = np.asarray(ids, dtype=np.int64)
+        if assignments is None:
+            assignments = _nearest_centroids(encodings, self.centroids)
+        # One Gallery per partition, built from all of its rows at once
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+        for list_no in range(self.nlist):
+            rows = order[bounds[list_no]:bounds[list_no + 1]]
+            if len(rows) == 0:
+                continue
+            current = self._lists[list_no]
+            self._lists[list_no] = Gallery(
+                np.concatenate([current.ids, ids[rows]]),
+                np.concatenate([current.encodings, encodings[rows]]),
+            )
+        self._size += len(ids)
+
+    def add(self, employee_id, encoding):
+        """ Incremental insert of one newly registered face into its nearest partition. """
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(ENCODING_DIM)
+        list_no = int(np.argmin(self._centroid_sq_norms - 2.0 * (self.centroids @ encoding)))
+        self._lists[list_no].add(employee_id, encoding)
+        self._size += 1
+
+    def nearest(self, live_encoding):
+        """
+        Searches the `nprobe` closest partitions.
+        Returns: Employee id (Int), Distance (Float) -- or (None, None) when nothing was found
+        """
+        live_encoding = np.asarray(live_encoding, dtype=np.float32).reshape(ENCODING_DIM)
+        scores = self._centroid_sq_norms - 2.0 * (self.centroids @ live_encoding)
+        nprobe = max(1, min(self.nprobe, self.nlist))
+        probe = np.argpartition(scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else range(self.nlist)
+
+        best_id, best_distance = None, None
+        for list_no in probe:
+            partition = self._lists[list_no]
+            index, distance = partition.nearest(live_encoding)
+            if index != -1 and (best_distance is None or distance < best_distance):
+                best_id, best_distance = int(partition.ids[index]), distance
+        return best_id, best_distance
+
+    def match(self, live_encoding, tolerance=None):
+        """
+        Same contract as Gallery.match, but approximate.
+        Returns: Employee id (Int), -1 (partition rows have no global index), Distance (Float) -- or (None, -1, None)
+        """
+        tolerance = settings.FACE_TOLERANCE if tolerance is None else tolerance
+        employee_id, distance = self.nearest(live_encoding)
+        if employee_id is None or distance >= tolerance:
+            return None, -1, None
+        return employee_id, -1, distance
+
+    def match_many(self, live_encodings, tolerance=None):
+        """ Batch version of match (each face probes its own partitions). """
+        live_encodings = np.asarray(live_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        return [self.match(live_encoding, tolerance) for live_encoding in live_encodings]
+
+    def save(self, path=None):
+        """
+        Persists the trained centroids and each employee's partition.
+        The encodings themselves are not duplicated on disk : the database stays the source of truth.
+        """
+        path = path or settings.ANN_INDEX_PATH
+        ids = np.concatenate([partition.ids for partition in self._lists])
+        assignments = np.repeat(np.arange(self.nlist), [len(partition) for partition in self._lists])
+        tmp_path = f"{path}.{os.getpid()}.tmp" # Per-process temp file, several workers may save at once
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, ids=ids, assignments=assignments, trained_size=self.trained_size)
+        os.replace(tmp_path, path) # Atomic, a crash never leaves a half-written index
+
+    @classmethod
+    def load(cls, gallery, path=None, nprobe=None):
+        """
+        Rebuilds the index for `gallery` from saved centroids without re-running k-means.
+        Employees missing from the saved file (registered after it was written) are assigned to their nearest centroid,
+        and so are the rows of employees with several templates (the file is keyed by employee id only).
+        Returns None if there is no saved index.
+        """
+        path = path or settings.ANN_INDEX_PATH
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            index = cls(saved["centroids"], nprobe)
+            index.trained_size = int(saved["trained_size"])
+            saved_ids, saved_assignments = saved["ids"], saved["assignments"]
+
+        # Look up each gallery id's saved partition
+        assignments = np.full(len(gallery), -1, dtype=np.int64)
+        known = np.zeros(len(gallery), dtype=bool)
+        if len(saved_ids):
+            order = np.argsort(saved_ids)
+            sorted_ids = saved_ids[order]
+            positions = np.clip(np.searchsorted(sorted_ids, gallery.ids), 0, len(sorted_ids) - 1)
+            known = sorted_ids[positions] == gallery.ids
+            if len(gallery) and known.any():
+                unique_ids, counts = np.unique(gallery.ids, return_counts=True)
+                known &= counts[np.searchsorted(unique_ids, gallery.ids)] == 1
+            assignments[known] = saved_assignments[order[positions[known]]]
+
+        missing = ~known
+        if missing.any():
+            assignments[missing] = _nearest_centroids(gallery.encodings[missing], index.centroids)
+        index.add_many(gallery.ids, gallery.encodings, assignments)
+        return index
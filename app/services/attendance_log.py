@@ -0,0 +1,113 @@
+import asyncio
+import datetime
+import threading
+from sqlalchemy import insert, update
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.attendance import AttendanceEvent
+from app.models.employee import Employee
+from app.services.attendance_rollup import apply_rollups
+
+# Write-behind Attendance Log
+class AttendanceWriter:
+    """
+    Buffers attendance events in memory so /api/recognize never waits for a commit.
+    The buffer is written with one bulk INSERT (plus one bulk UPDATE of Employee.last_seen and the daily rollups)
+    when it reaches `flush_size` events or every `flush_interval` seconds, whichever comes first.
+    stop() flushes whatever is left, so a clean shutdown loses nothing.
+    """
+
+    def __init__(self, flush_size=None, flush_interval=None, session_factory=SessionLocal):
+        self.flush_size = flush_size or settings.ATTENDANCE_FLUSH_SIZE
+        self.flush_interval = flush_interval or settings.ATTENDANCE_FLUSH_INTERVAL
+        self._session_factory = session_factory
+        self._buffer = []
+        self._lock = threading.Lock() # record() runs on the event loop, flush() in a thread
+        self._flush_lock = threading.Lock() # One flush at a time keeps events in order
+        self._wakeup = None
+        self._task = None
+        self._loop = None
+        self.flushed = 0 # Events written so far
+
+    def record(self, employee_id, distance, device=None, timestamp=None):
+        """ Queues one event (from the event loop). Never touches the database. """
+        try:
+            self.start() # No-op once running; lets the writer work without the lifespan hook
+        except RuntimeError:
+            pass # No event loop (scripts): the caller flushes explicitly
+        event = {
+            "employee_id": employee_id,
+            "timestamp": timestamp or datetime.datetime.utcnow(),
+            "device": device,
+            "distance": distance,
+        }
+        with self._lock:
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.flush_size
+        if full and self._wakeup is not None:
+            self._wakeup.set() # Size trigger: flush now instead of waiting for the interval
+
+    def flush(self):
+        """ Writes every buffered event in one transaction. Returns the number of events written. """
+        with self._flush_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            if not events:
+                return 0
+            # Latest timestamp per employee for last_seen
+            last_seen = {}
+            for event in events:
+                employee_id = event["employee_id"]
+                if employee_id not in last_seen or event["timestamp"] > last_seen[employee_id]:
+                    last_seen[employee_id] = event["timestamp"]
+            db = self._session_factory()
+            try:
+                db.execute(insert(AttendanceEvent), events) # Bulk INSERT
+                db.execute(update(Employee), [{"id": emp_id, "last_seen": seen} for emp_id, seen in last_seen.items()])
+                apply_rollups(db, events) # Same transaction: rollups never drift from the events
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                with self._lock:
+                    self._buffer[:0] = events # Keep the events for the next attempt
+                print(f"Attendance flush failed, {len(events)} events kept for retry: {exc}")
+                return 0
+            finally:
+                db.close()
+            self.flushed += len(events)
+            return len(events)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass # Time trigger
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    def start(self):
+        """ Starts the background flusher on the running event loop. """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """ Stops the background flusher and writes the remaining events. """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        await asyncio.to_thread(self.flush)
+
+    def stats(self):
+        return {"buffered": len(self._buffer), "flushed": self.flushed}
+
+
+attendance_writer = AttendanceWriter()
@@ -0,0 +1,158 @@
+import datetime
+from sqlalchemy import select, func, tuple_, case
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models.attendance import AttendanceEvent, AttendanceDaily, AttendanceDepartmentDaily
+from app.models.employee import Employee
+
+PERIODS = ("day", "week", "month")
+
+
+def period_starts(day):
+    """ Returns: Monday of the day's week, first day of its month """
+    return day - datetime.timedelta(days=day.weekday()), day.replace(day=1)
+
+
+# Incremental Rollup Maintenance
+_UPSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+_UPSERT_CHUNK = 500 # Rows per INSERT statement (SQLite caps the bound parameters of one statement)
+
+
+def _upsert(db, model, rows, keys, set_, returning=()):
+    """
+    INSERT ... ON CONFLICT (keys) DO UPDATE, in chunks. The increments in `set_` (built from the table and the
+    `excluded` row) run in the database, so concurrent flushes of several workers add up instead of overwriting.
+    Returns: The `returning` columns of every inserted or updated row
+    """
+    insert_ = _UPSERTS.get(db.get_bind().dialect.name)
+    if insert_ is None:
+        raise ValueError(f"Attendance rollups need SQLite or PostgreSQL, not {db.get_bind().dialect.name}")
+    returned = []
+    for start in range(0, len(rows), _UPSERT_CHUNK):
+        statement = insert_(model).values(rows[start:start + _UPSERT_CHUNK])
+        statement = statement.on_conflict_do_update(index_elements=keys, set_=set_(model.__table__.c, statement.excluded))
+        if returning:
+            returned += db.execute(statement.returning(*returning)).all()
+        else:
+            db.execute(statement)
+    return returned
+
+
+def apply_rollups(db, events):
+    """
+    Folds a batch of attendance events into the daily rollup tables, inside the caller's transaction.
+    Only the (employee, day) and (department, day) rows touched by the batch are written, with one upsert per table.
+    """
+    if not events:
+        return
+    # 1. Aggregate the batch in memory : (employee, day) -> [scans, first_seen, last_seen]
+    batch = {}
+    for event in events:
+        key = (event["employee_id"], event["timestamp"].date())
+        if key in batch:
+            entry = batch[key]
+            entry[0] += 1
+            entry[1] = min(entry[1], event["timestamp"])
+            entry[2] = max(entry[2], event["timestamp"])
+        else:
+            batch[key] = [1, event["timestamp"], event["timestamp"]]
+
+    employee_ids = {employee_id for employee_id, _ in batch}
+    departments = dict(db.execute(select(Employee.id, Employee.department).where(Employee.id.in_(employee_ids))).all())
+
+    # 2. Employee rollup : one upsert. A row that comes back with only this batch's scans was just inserted,
+    # so it is the employee's first scan of the day (decided under the row lock, not from an earlier read).
+    rows = []
+    for (employee_id, day), (scans, first_seen, last_seen) in batch.items():
+        week, month = period_starts(day)
+        rows.append({"employee_id": employee_id, "day": day, "week": week, "month": month,
+                     "scans": scans, "first_seen": first_seen, "last_seen": last_seen})
+    upserted = _upsert(db, AttendanceDaily, rows, ["employee_id", "day"], lambda c, excluded: {
+        "scans": c.scans + excluded.scans,
+        "first_seen": case((excluded.first_seen < c.first_seen, excluded.first_seen), else_=c.first_seen),
+        "last_seen": case((excluded.last_seen > c.last_seen, excluded.last_seen), else_=c.last_seen),
+    }, returning=(AttendanceDaily.employee_id, AttendanceDaily.day, AttendanceDaily.scans))
+    department_batch = {} # (department, day) -> [new employees present, scans]
+    for employee_id, day, total_scans in upserted:
+        department = departments.get(employee_id)
+        if department is not None:
+            scans = batch[(employee_id, day)][0]
+            entry = department_batch.setdefault((department, day), [0, 0])
+            entry[0] += int(total_scans == scans) # First scan of the day for this employee
+            entry[1] += scans
+
+    # 3. Department rollup
+    if department_batch:
+        rows = []
+        for (department, day), (present, scans) in department_batch.items():
+            week, month = period_starts(day)
+            rows.append({"department": department, "day": day, "week": week, "month": month,
+                         "employees_present": present, "scans": scans})
+        _upsert(db, AttendanceDepartmentDaily, rows, ["department", "day"], lambda c, excluded: {
+            "employees_present": c.employees_present + excluded.employees_present,
+            "scans": c.scans + excluded.scans,
+        })
+
+
+# Indexed History Queries (keyset pagination : pass the last period_start / cursor back as `before`)
+def employee_attendance(db, employee_id, period="day", before=None, limit=31):
+    """
+    Attendance of one employee per day, week or month, newest first.
+    Returns: A list of dicts (period_start, days_present, scans, first_seen, last_seen), next cursor or None
+    """
+    column = getattr(AttendanceDaily, period)
+    query = (
+        select(column.label("period_start"),
+               func.count().label("days_present"),
+               func.sum(AttendanceDaily.scans).label("scans"),
+               func.min(AttendanceDaily.first_seen).label("first_seen"),
+               func.max(AttendanceDaily.last_seen).label("last_seen"))
+        .where(AttendanceDaily.employee_id == employee_id)
+        .group_by(column)
+        .order_by(column.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        query = query.where(column < before)
+    rows = [dict(row._mapping) for row in db.execute(query)]
+    return rows, (rows[-1]["period_start"] if len(rows) == limit else None)
+
+
+def department_attendance(db, department, period="day", before=None, limit=31):
+    """
+    Attendance of a department per day, week or month, newest first.
+    person_days is the number of employees present for a day, and the sum of those for a week or month.
+    Returns: A list of dicts (period_start, person_days, scans), next cursor or None
+    """
+    column = getattr(AttendanceDepartmentDaily, period)
+    query = (
+        select(column.label("period_start"),
+               func.sum(AttendanceDepartmentDaily.employees_present).label("person_days"),
+               func.sum(AttendanceDepartmentDaily.scans).label("scans"))
+        .where(AttendanceDepartmentDaily.department == department)
+        .group_by(column)
+        .order_by(column.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        query = query.where(column < before)
+    rows = [dict(row._mapping) for row in db.execute(query)]
+    return rows, (rows[-1]["period_start"] if len(rows) == limit else None)
+
+
+def employee_events(db, employee_id, before=None, limit=50):
+    """
+    Raw attendance events of one employee, newest first, served from the (employee_id, timestamp, id) index.
+    `before` is the cursor returned by the previous page : the last event's (timestamp, id).
+    Returns: A list of dicts (id, timestamp, device, distance), next cursor or None
+    """
+    query = (
+        select(AttendanceEvent.id, AttendanceEvent.timestamp, AttendanceEvent.device, AttendanceEvent.distance)
+        .where(AttendanceEvent.employee_id == employee_id)
+        .order_by(AttendanceEvent.timestamp.desc(), AttendanceEvent.id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        query = query.where(tuple_(AttendanceEvent.timestamp, AttendanceEvent.id) < tuple_(*before))
+    rows = [dict(row._mapping) for row in db.execute(query)]
+    return rows, ((rows[-1]["timestamp"], rows[-1]["id"]) if len(rows) == limit else None)
@@ -0,0 +1,126 @@
+import asyncio
+import math
+import time
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import Histogram, registry, trace_stages, current_trace
+from app.services.encoding_format import deserialize_encoding
+from app.services.face_logic import get_live_encodings, run_face_job, pool_size
+from app.services.gallery_cache import gallery_cache
+from app.services.templates import adaptive_templates
+
+# Micro-batching Scheduler for /api/recognize
+class RecognizeBatcher:
+    """
+    Collects recognize requests that arrive within `max_wait_ms` of each other (up to `max_batch_size`),
+    sends them to the face pool as one job, matches all faces against the gallery in one matrix computation,
+    and hands each result back to the request that is waiting for it.
+    """
+
+    def __init__(self, max_batch_size=None, max_wait_ms=None):
+        self.max_batch_size = max_batch_size or settings.RECOGNIZE_BATCH_SIZE
+        self.max_wait = (settings.RECOGNIZE_BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self._running = set() # Strong references to in-flight batch tasks
+        self.batch_sizes = registry.register(Histogram("recognize_batch_size", [1, 2, 4, 8, 16, 32, 64],
+                                                      "Requests per micro-batch"))
+        self.queue_waits = registry.register(Histogram("recognize_queue_wait_seconds", [0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25],
+                                                      "Time a request waited before its batch was dispatched"))
+
+    def start(self):
+        """ Starts the collecting loop on the running event loop. """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def submit(self, image_bytes, scope=None):
+        """
+        Queues one frame and waits for its batch to finish. `scope` limits the search to a partition (see GalleryCache.search).
+        Returns: None if no face was found, otherwise (Employee id or None, Row index, Distance)
+        """
+        self.start() # No-op once running; lets the batcher work without the lifespan hook
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_bytes, future, time.perf_counter(), current_trace(), scope))
+        return await future
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()] # Block until the first request arrives
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            dispatched = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            for _, _, queued_at, trace, _ in batch:
+                self.queue_waits.observe(dispatched - queued_at)
+                if trace is not None:
+                    trace["queue"] = dispatched - queued_at
+            # Run the batch in the background so the next one can be collected meanwhile
+            task = asyncio.create_task(self._process(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _process(self, batch):
+        futures = [future for _, future, _, _, _ in batch]
+        try:
+            # The batch runs outside the requests' context: its stage timings are copied to every traced request
+            with trace_stages() as batch_trace:
+                # Only the first face of each frame is used, like get_live_encoding.
+                # Detection is spread over the pool (one chunk per worker), only the gallery match is batched.
+                images_bytes = [image_bytes for image_bytes, _, _, _, _ in batch]
+                chunk_size = math.ceil(len(images_bytes) / pool_size())
+                chunks = await asyncio.gather(*[run_face_job(get_live_encodings, images_bytes[start:start + chunk_size], 1)
+                                                for start in range(0, len(images_bytes), chunk_size)])
+                faces_per_image = [faces for chunk in chunks for faces in chunk]
+                # One matrix computation per scope in the batch (usually a single one: all kiosks of a site)
+                positions_by_scope = {}
+                for position, ((_, _, _, _, scope), faces) in enumerate(zip(batch, faces_per_image)):
+                    if faces:
+                        positions_by_scope.setdefault(scope, []).append(position)
+                results = [None] * len(batch)
+                for scope, positions in positions_by_scope.items():
+                    live_encodings = np.stack([deserialize_encoding(faces_per_image[position][0][1]) for position in positions])
+                    for position, match in zip(positions, gallery_cache.search(live_encodings, scope)):
+                        results[position] = match
+            for _, _, _, trace, _ in batch:
+                if trace is not None:
+                    for name, seconds in batch_trace.items():
+                        trace[name] = trace.get(name, 0.0) + seconds
+        except Exception as exc:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for future, result in zip(futures, results):
+            if not future.done(): # The request may have been cancelled (client disconnected)
+                future.set_result(result)
+        # Confident matches from new angles may become extra templates (ADAPTIVE_TEMPLATES)
+        for faces, result in zip(faces_per_image, results):
+            if result is not None and result[0] is not None:
+                adaptive_templates.consider(result[0], faces[0][1], result[2])
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_seconds": self.queue_waits.snapshot(),
+        }
+
+
+recognize_batcher = RecognizeBatcher()
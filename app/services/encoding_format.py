@@ -0,0 +1,61 @@
+#This file defines how face encodings are stored in Employee.encoding.
+
+import io
+import pickle
+import numpy as np
+
+# Format v1 : 4 byte header + 128 little-endian float32 values (516 bytes, versus ~1.2 KB for a pickled float64 array)
+ENCODING_DIM = 128
+ENCODING_DTYPE = np.dtype("<f4")
+ENCODING_FORMAT_VERSION = 1
+ENCODING_MAGIC = b"FE" # "Face Encoding"
+HEADER_SIZE = 4 # magic (2 bytes) + version (1 byte) + reserved (1 byte)
+ENCODING_SIZE = HEADER_SIZE + ENCODING_DIM * ENCODING_DTYPE.itemsize
+
+_HEADER = ENCODING_MAGIC + bytes([ENCODING_FORMAT_VERSION, 0])
+
+# Only the classes numpy needs to rebuild an ndarray may be loaded from legacy pickled rows
+_ALLOWED_PICKLE_GLOBALS = {
+    ("numpy", "ndarray"),
+    ("numpy", "dtype"),
+    ("numpy.core.multiarray", "_reconstruct"),
+    ("numpy._core.multiarray", "_reconstruct"),
+}
+
+
+class _NumpyUnpickler(pickle.Unpickler):
+    """ Unpickler that refuses anything other than a plain numpy array. """
+
+    def find_class(self, module, name):
+        if (module, name) not in _ALLOWED_PICKLE_GLOBALS:
+            raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from an encoding blob")
+        return super().find_class(module, name)
+
+
+def serialize_encoding(encoding):
+    """ Converts a 128-d face encoding into the compact versioned binary format. """
+    vector = np.asarray(encoding, dtype=ENCODING_DTYPE).reshape(ENCODING_DIM)
+    return _HEADER + vector.tobytes()
+
+
+def is_legacy_encoding(encoding_bytes):
+    """ True if the blob was written by pickle.dumps (rows registered before format v1). """
+    return not encoding_bytes.startswith(ENCODING_MAGIC)
+
+
+def deserialize_encoding(encoding_bytes):
+    """
+    Loads an encoding blob as a float32 vector.
+    Format v1 blobs are read zero-copy with np.frombuffer (the result is read-only).
+    Legacy pickled blobs are still accepted during the rollout and are unpickled with a restricted loader.
+    """
+    if is_legacy_encoding(encoding_bytes):
+        legacy = _NumpyUnpickler(io.BytesIO(encoding_bytes)).load()
+        return np.asarray(legacy, dtype=ENCODING_DTYPE).reshape(ENCODING_DIM)
+
+    version = encoding_bytes[2]
+    if version != ENCODING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported encoding format version: {version}")
+    if len(encoding_bytes) != ENCODING_SIZE:
+        raise ValueError(f"Encoding blob has {len(encoding_bytes)} bytes, expected {ENCODING_SIZE}")
+    return np.frombuffer(encoding_bytes, dtype=ENCODING_DTYPE, count=ENCODING_DIM, offset=HEADER_SIZE)
@@ -0,0 +1,332 @@
+import asyncio
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zipfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from sqlalchemy import insert, select
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.employee import Employee
+from app.services.encoding_format import deserialize_encoding
+from app.services.face_logic import detect_best_face, run_face_job, FaceQueueFull, _init_worker
+from app.services.gallery import Gallery
+from app.services.gallery_cache import gallery_cache
+from app.services.registration import duplicates
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+PHOTOS_PER_EMPLOYEE = 5 # Same as the webcam registration form
+
+# Photo source : a directory or a zip archive of per-employee folders
+def list_photos(source):
+    """
+    Returns: {folder name: sorted photo paths (zip member names for archives)}, the folder being
+    the directory that directly contains each image (so an archive may have a top-level root folder).
+    """
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            paths = [name for name in archive.namelist() if not name.endswith("/")]
+        split = lambda path: path.rsplit("/", 2)[-2] if "/" in path else ""
+    else:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(source) for name in names]
+        split = lambda path: os.path.basename(os.path.dirname(path))
+    photos = {}
+    for path in sorted(paths):
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            photos.setdefault(split(path), []).append(path)
+    return photos
+
+
+def read_manifest(csv_text):
+    """
+    Parses the CSV of employees: columns name, department and optionally folder (defaults to the name) and site.
+    Returns: A list of {"folder", "name", "department", "site"} dicts
+    """
+    rows = []
+    for row in csv.DictReader(io.StringIO(csv_text)):
+        row = {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+        if not row.get("name"):
+            continue
+        rows.append({"folder": row.get("folder") or row["name"], "name": row["name"], "department": row.get("department", ""),
+                     "site": row.get("site") or None})
+    return rows
+
+
+def resolve_import_source(source):
+    """
+    Resolves a server-side import path (relative to IMPORT_ROOT) for the API. Symlinks and ".." cannot leave the root.
+    Raises ValueError when server paths are disabled (no IMPORT_ROOT) or the path is outside the root or missing.
+    Returns: The absolute path
+    """
+    if not settings.IMPORT_ROOT:
+        raise ValueError("Server-side imports are disabled (IMPORT_ROOT is not set), upload a zip archive.")
+    root = os.path.realpath(settings.IMPORT_ROOT)
+    path = os.path.realpath(os.path.join(root, source))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise ValueError("The import path must be inside IMPORT_ROOT.")
+    if not os.path.exists(path):
+        raise ValueError("The import path does not exist.")
+    return path
+
+
+def enroll_photos(source, paths):
+    """
+    Reads one employee's photos and picks the best face with the registration logic (inside a pool worker).
+    Returns: Best Encoding (Bytes or None), Best Index (Int), Best Confidence (Float)
+    """
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            images_bytes = [archive.read(path) for path in paths]
+    else:
+        images_bytes = []
+        for path in paths:
+            with open(path, "rb") as f:
+                images_bytes.append(f.read())
+    return detect_best_face(images_bytes)
+
+
+# Bulk Enrollment
+class EnrollmentImport:
+    """
+    Imports employees from `source` + a CSV manifest. Detection runs in parallel, employees are written
+    with one bulk INSERT per `batch_size`, and the checkpoint file records every imported folder after each
+    commit, so an interrupted import resumes where it stopped (failed folders are tried again).
+    Rows whose encoding already exists in the table (a batch committed just before a crash, before its
+    checkpoint) are never inserted twice. Like /api/register, every batch is checked for faces already registered
+    (or twice in the batch) before the INSERT, per DUPLICATE_ACTION: rejects go to failures, flags to flagged.
+    The duplicate lookup uses gallery_cache, so `on_insert` should add committed batches to it.
+    """
+
+    def __init__(self, source, manifest, checkpoint_path=None, batch_size=50, on_insert=None):
+        self.source = source
+        self.manifest = manifest
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.on_insert = on_insert # Called with [(employee id, encoding bytes, site, department)] for every committed batch
+        self.done = self._load_checkpoint() # folder -> employee id
+        self.failures = {} # folder -> reason
+        self.flagged = {} # folder -> what it duplicates (DUPLICATE_ACTION=flag), imported anyway
+        self._batch = []
+        self._write_lock = threading.Lock()
+        self.enrolled = 0
+        self.skipped = len(self.done)
+        self.total = len(manifest)
+        self.started = None
+        self.finished = None
+        self.error = None
+
+    def _load_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                return json.load(f)["done"]
+        return {}
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"source": str(self.source), "done": dict(self.done), "failed": dict(self.failures)}, f)
+        os.replace(tmp_path, self.checkpoint_path) # Atomic: never a half-written checkpoint
+
+    def pending(self):
+        """ Returns: (manifest row, photo paths) for every employee not imported yet. Missing folders fail at once. """
+        photos = list_photos(self.source)
+        work = []
+        for row in self.manifest:
+            if row["folder"] in self.done:
+                continue
+            paths = photos.get(row["folder"], [])[:PHOTOS_PER_EMPLOYEE]
+            if paths:
+                work.append((row, paths))
+            else:
+                self.failures[row["folder"]] = "No photos found"
+        return work
+
+    def handle(self, row, result):
+        """ Queues one detection result. Returns: True when a full batch is waiting for flush() """
+        encoding_bytes, _, _ = result
+        if encoding_bytes:
+            self._batch.append((row, encoding_bytes))
+        else:
+            self.failures[row["folder"]] = "No clear face found"
+        return len(self._batch) >= self.batch_size
+
+    def take_batch(self):
+        batch, self._batch = self._batch, []
+        return batch
+
+    def flush(self, batch=None):
+        """ Bulk-inserts a batch (default: everything queued) in one transaction, then checkpoints. """
+        batch = self.take_batch() if batch is None else batch
+        with self._write_lock:
+            if batch:
+                db = SessionLocal()
+                try:
+                    # Already in the table: imported by a previous run whose checkpoint was not saved
+                    existing = dict(db.execute(select(Employee.encoding, Employee.id)
+                                               .where(Employee.encoding.in_([encoding for _, encoding in batch]))).all())
+                    new = self._check_duplicates([(row, encoding) for row, encoding in batch if encoding not in existing])
+                    ids = list(db.scalars(
+                        insert(Employee).returning(Employee.id, sort_by_parameter_order=True),
+                        [{"name": row["name"], "department": row["department"], "site": row.get("site"), "encoding": encoding}
+                         for row, encoding in new],
+                    )) if new else [] # One bulk INSERT for the batch
+                    db.commit()
+                finally:
+                    db.close()
+                for (row, encoding), employee_id in zip(new, ids):
+                    self.done[row["folder"]] = employee_id
+                if self.on_insert and new:
+                    self.on_insert([(employee_id, encoding, row.get("site"), row["department"])
+                                    for (row, encoding), employee_id in zip(new, ids)])
+                for row, encoding in batch:
+                    if encoding in existing:
+                        self.done[row["folder"]] = existing[encoding]
+                        self.skipped += 1
+                self.enrolled += len(new)
+            self._save_checkpoint()
+
+    def _check_duplicates(self, new):
+        """
+        Looks up a batch in the gallery (one batched search) and against the batch's earlier rows (one distance matrix).
+        Returns: The rows to insert; with DUPLICATE_ACTION=reject the duplicates are left out and recorded in failures
+        """
+        action = settings.DUPLICATE_ACTION
+        if action not in ("reject", "flag") or not new:
+            return new
+        encodings_bytes = [encoding for _, encoding in new]
+        matches = gallery_cache.find_duplicates(encodings_bytes)
+        batch = Gallery(range(len(new)), np.stack([deserialize_encoding(encoding) for encoding in encodings_bytes]))
+        within = batch.distances_many(batch.encodings)
+        kept = []
+        for i, ((row, encoding), match) in enumerate(zip(new, matches)):
+            if match is not None:
+                duplicate_of = f"employee {match[0]}"
+            elif i and within[i, :i].min() < settings.DUPLICATE_THRESHOLD:
+                duplicate_of = f"folder {new[int(within[i, :i].argmin())][0]['folder']}"
+            else:
+                kept.append((row, encoding))
+                continue
+            duplicates[action].inc()
+            if action == "reject":
+                self.failures[row["folder"]] = f"Duplicate of {duplicate_of}"
+            else:
+                self.flagged[row["folder"]] = duplicate_of
+                kept.append((row, encoding))
+        return kept
+
+    def run(self, workers=None):
+        """ Runs the import with its own process pool (CLI). An employee whose photos cannot be read fails alone. Returns: stats() """
+        workers = workers or os.cpu_count()
+        self.started = time.perf_counter()
+        work = iter(self.pending())
+        # "spawn" because TensorFlow is not fork-safe; every worker loads the models once
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(True,)) as executor: # Every worker runs MTCNN here
+            running = {}
+            while True:
+                # Keep a bounded number of employees in flight instead of queueing the whole site
+                while len(running) < 2 * workers:
+                    item = next(work, None)
+                    if item is None:
+                        break
+                    running[executor.submit(enroll_photos, self.source, item[1])] = item[0]
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    row = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as exc: # e.g. a corrupt zip member: this employee fails alone
+                        self.failures[row["folder"]] = f"Could not read the photos: {exc}"
+                        continue
+                    if self.handle(row, result):
+                        self.flush()
+                        self.report()
+        self.flush()
+        self.finished = time.perf_counter()
+        return self.stats()
+
+    async def run_async(self, concurrency):
+        """
+        Runs the import through the server's face pool (API job), at most `concurrency` employees at a time.
+        An employee whose photos cannot be read fails alone (recorded in failures); the job only fails on
+        errors that stop the import (e.g. the database), and then waits for every employee task to stop.
+        """
+        self.started = time.perf_counter()
+        tasks = []
+        try:
+            work = await asyncio.to_thread(self.pending)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def enroll(row, paths):
+                async with semaphore:
+                    try:
+                        result = await self._detect(paths)
+                    except Exception as exc: # e.g. a corrupt zip member
+                        self.failures[row["folder"]] = f"Could not read the photos: {exc}"
+                        return
+                if self.handle(row, result):
+                    await asyncio.to_thread(self.flush, self.take_batch()) # The batch is taken on the event loop
+
+            tasks = [asyncio.create_task(enroll(row, paths)) for row, paths in work]
+            await asyncio.gather(*tasks)
+            await asyncio.to_thread(self.flush, self.take_batch())
+        except Exception as exc:
+            self.error = str(exc)
+        finally:
+            # Nothing may still read the source when the job ends (an uploaded archive is deleted then)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.finished = time.perf_counter()
+
+    async def _detect(self, paths):
+        """ enroll_photos in the face pool. A full pool is live traffic: the import waits for room instead of failing. """
+        while True:
+            try:
+                return await run_face_job(enroll_photos, self.source, paths)
+            except FaceQueueFull:
+                await asyncio.sleep(0.5)
+
+    def report(self):
+        stats = self.stats()
+        print(f"{stats['processed']}/{stats['total']} processed, {stats['enrolled']} enrolled, "
+              f"{stats['failed']} failed, {stats['employees_per_minute']:.1f} employees/min")
+
+    def stats(self):
+        elapsed = ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+        failed = len(self.failures)
+        # Throughput counts the employees handled by this run, not the ones skipped from the checkpoint
+        worked = self.enrolled + failed + len(self._batch)
+        return {
+            "status": "failed" if self.error else ("done" if self.finished else "running"),
+            "error": self.error,
+            "total": self.total,
+            "processed": self.skipped + worked,
+            "enrolled": self.enrolled,
+            "failed": failed,
+            "skipped": self.skipped,
+            "elapsed_seconds": elapsed,
+            "employees_per_minute": worked / elapsed * 60 if elapsed else 0.0,
+        }
+
+
+# Import jobs started through the API, by id (kept in memory for this worker)
+import_jobs = {}
+
+def start_import_job(source, manifest, checkpoint_path, batch_size, concurrency, on_insert=None):
+    """ Starts an EnrollmentImport in the background on the running event loop. Returns: the job id """
+    job = EnrollmentImport(source, manifest, checkpoint_path, batch_size, on_insert)
+    job_id = uuid.uuid4().hex
+    job.task = asyncio.create_task(job.run_async(concurrency))
+    import_jobs[job_id] = job
+    return job_id
@@ -1,86 +1,381 @@
-import face_recognition
 import numpy as np
 import cv2
-import pickle
 import os
-from mtcnn import MTCNN # Import MTCNN for face detection (Multi-Task Cascaded Convolutional Neural Network)
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from app.core.config import settings
+from app.core.metrics import stage, collect_stages, record_stages
+from app.services.encoding_format import serialize_encoding, deserialize_encoding
+from app.services.gallery import Gallery
+from app.services.ann_index import IVFIndex
 import asyncio
-# 1. Initialize Smart Detector (Global)
-# This loads the heavy Neural Network once when the app starts.
+# 1. Lazy, Role-based Model Loading
+# Models are imported on first use, and only the ones this worker's WORKER_ROLE needs:
+# a "recognize" worker uses the dlib HOG detector and encoder and never imports MTCNN / TensorFlow.
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' # Hide TensorFlow warnings
-mtcnn_detector = MTCNN() # Initialize MTCNN face detector
+_models = {}
+_models_lock = threading.Lock()
+
+class RoleNotServed(Exception):
+    """ Raised when a worker is asked for work its WORKER_ROLE does not cover. """
+
+def serves(role):
+    """ True if this worker's WORKER_ROLE ("all", "recognize" or "register") includes `role`. """
+    return settings.WORKER_ROLE in ("all", role)
+
+def get_face_recognition():
+    """ face_recognition (dlib HOG detector + 128-d encoder), imported once on first use. Used by both roles. """
+    if "face_recognition" not in _models:
+        with _models_lock:
+            if "face_recognition" not in _models:
+                import face_recognition
+                _models["face_recognition"] = face_recognition
+    return _models["face_recognition"]
+
+def get_mtcnn_detector():
+    """ MTCNN face detector (Multi-Task Cascaded Convolutional Neural Network), built once on first use by register workers. """
+    if not serves("register"):
+        raise RoleNotServed(f"MTCNN is not loaded by {settings.WORKER_ROLE!r} workers")
+    if "mtcnn" not in _models:
+        with _models_lock:
+            if "mtcnn" not in _models:
+                from mtcnn import MTCNN # Pulls in TensorFlow
+                _models["mtcnn"] = MTCNN()
+    return _models["mtcnn"]
+
+# 2. Executor Layer
+# Decode, detection and encoding are CPU-bound. Running them on the event loop would serialize every scan,
+# so the endpoints send them to a pool and await the result.
+_executor = None
+_in_flight = 0 # Jobs submitted and not finished yet (only touched from the event loop)
+
+class FaceQueueFull(Exception):
+    """ Raised when FACE_QUEUE_LIMIT jobs are already waiting for the pool. """
+
+def load_models(mtcnn=None):
+    """
+    Loads and warms up dlib (HOG + encoder), so the first scan does not pay for it. MTCNN (TensorFlow, hundreds of MB
+    per process) is only warmed up with `mtcnn` (default MTCNN_WARMUP) on register workers; otherwise the first
+    registration that reaches a pool worker loads it there.
+    """
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    get_face_recognition().face_locations(blank)
+    mtcnn = settings.MTCNN_WARMUP if mtcnn is None else mtcnn
+    if mtcnn and serves("register"):
+        get_mtcnn_detector().detect_faces(blank) # The first call also builds the TensorFlow graph
+
+def _init_worker(mtcnn=None):
+    """ Runs once in every pool process. """
+    load_models(mtcnn)
+
+def pool_size():
+    """ Number of face pool workers (FACE_WORKERS, one per CPU core by default). """
+    return settings.FACE_WORKERS or os.cpu_count()
+
+def get_executor():
+    """ Creates the pool on first use, according to FACE_EXECUTOR ("process", "thread" or "inline"). """
+    global _executor
+    if _executor is None and settings.FACE_EXECUTOR != "inline":
+        workers = pool_size()
+        if settings.FACE_EXECUTOR == "process":
+            # "spawn" because TensorFlow is not fork-safe
+            _executor = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=workers)
+    return _executor
+
+def start_executor():
+    """ Starts the pool and its workers at application startup instead of on the first scan. """
+    executor = get_executor()
+    if executor is not None:
+        for _ in range(pool_size()):
+            executor.submit(os.getpid) # Forces every worker process to spawn and run _init_worker
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+def face_jobs_in_flight():
+    """ Face jobs queued or running in the pool (for /metrics). """
+    return _in_flight
+
+async def run_face_job(func, *args):
+    """
+    Runs a CPU-bound face function in the pool and awaits its result without blocking the event loop.
+    Raises FaceQueueFull instead of queueing without bound when the pool is saturated.
+    """
+    global _in_flight
+    if _in_flight >= settings.FACE_QUEUE_LIMIT:
+        raise FaceQueueFull(f"{_in_flight} face jobs already queued")
+    _in_flight += 1
+    try:
+        executor = get_executor()
+        # Stage timings are collected where the job runs (maybe another process) and observed here
+        if executor is None:
+            result, stages = collect_stages(func, *args)
+        else:
+            result, stages = await asyncio.get_running_loop().run_in_executor(executor, collect_stages, func, *args)
+        record_stages(stages)
+        return result
+    finally:
+        _in_flight -= 1
 
 # Helper : Convert Bytes to Image RGB
 def load_image_from_bytes(image_bytes: bytes):
     """ Decodes raw uploaded image bytes to an RGB image array. """
-    nparr = np.frombuffer(image_bytes, np.uint8) # Convert bytes to numpy array
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR) # Decode image from numpy array
-    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) # Convert BGR to RGB
+    with stage("decode"):
+        nparr = np.frombuffer(image_bytes, np.uint8) # Convert bytes to numpy array
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR) # Decode image from numpy array
+        if img is None:
+            raise ValueError("Could not decode image bytes") # Corrupt upload or unsupported format
+        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) # Convert BGR to RGB
     return rgb_img
 
+# Helper : Resolution-aware decoding for the detectors
+# JPEG can be decoded directly at 1/2, 1/4 or 1/8 size (libjpeg DCT scaling), which is much cheaper than a full decode
+_REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def _jpeg_size(image_bytes):
+    """ Reads (width, height) from the JPEG frame header without decoding, or None if it is not a JPEG. """
+    if image_bytes[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(image_bytes):
+        if image_bytes[i] != 0xFF:
+            return None
+        marker = image_bytes[i + 1]
+        if marker == 0xFF: # Fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8: # Markers without a length field
+            i += 2
+            continue
+        length = struct.unpack(">H", image_bytes[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC): # Start Of Frame
+            height, width = struct.unpack(">HH", image_bytes[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+def load_detection_image(image_bytes, max_side=None):
+    """
+    Decodes a copy of the image whose longer side is at most `max_side` (DETECTION_MAX_SIDE) for the detectors.
+    Returns: RGB image (numpy array), Scale (Float) to multiply its coordinates by to get full-resolution ones
+    """
+    max_side = settings.DETECTION_MAX_SIDE if max_side is None else max_side
+    if not max_side:
+        return load_image_from_bytes(image_bytes), 1.0 # Downscaling disabled
+
+    with stage("decode"):
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        full_side = None
+        flag = cv2.IMREAD_COLOR
+        size = _jpeg_size(image_bytes)
+        if size:
+            full_side = max(size)
+            # Largest reduced-decode factor that still leaves at least max_side pixels
+            for factor, reduced_flag in _REDUCED_DECODE_FLAGS:
+                if full_side / factor >= max_side:
+                    flag = reduced_flag
+                    break
+        img = cv2.imdecode(nparr, flag)
+        if img is None:
+            raise ValueError("Could not decode image bytes")
+        full_side = full_side or max(img.shape[:2])
+
+        # Finish with an area resize (also the only step for PNG and other formats)
+        side = max(img.shape[:2])
+        if side > max_side:
+            ratio = max_side / side
+            img = cv2.resize(img, (max(1, round(img.shape[1] * ratio)), max(1, round(img.shape[0] * ratio))), interpolation=cv2.INTER_AREA)
+        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) # Only the small copy is converted here
+    return rgb_img, full_side / max(rgb_img.shape[:2])
+
+def scale_box(box, scale):
+    """ Maps a (top, right, bottom, left) box from the detection image back to full resolution. """
+    return tuple(int(round(v * scale)) for v in box)
+
+def encode_faces_full_resolution(image_bytes, boxes):
+    """
+    Encodes faces from the original pixels. Only a padded crop around each face is converted to RGB,
+    never the whole frame.
+    Returns: A list of 128-d encodings (one per box, None where dlib could not encode) and the clamped boxes
+    """
+    with stage("decode"):
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image bytes")
+    height, width = img.shape[:2]
+    encodings, clamped = [], []
+    for top, right, bottom, left in boxes:
+        top, right, bottom, left = max(0, top), min(width, right), min(height, bottom), max(0, left)
+        # Keep a margin around the face, dlib's landmark model looks slightly outside the box
+        margin = (bottom - top) // 4
+        y0, x0 = max(0, top - margin), max(0, left - margin)
+        y1, x1 = min(height, bottom + margin), min(width, right + margin)
+        crop = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2RGB)
+        with stage("encode"):
+            found = get_face_recognition().face_encodings(crop, [(top - y0, right - x0, bottom - y0, left - x0)])
+        encodings.append(found[0] if found else None)
+        clamped.append((top, right, bottom, left))
+    return encodings, clamped
+
 # Logic : Detect Faces using MTCNN for Regesistration
-async  def detect_faces(files):
+def detect_image_face(image_bytes):
     """
-    Takes a list of 5 images. Uses MTCNN to find the best face.
-    Returns: Best Encoding (Bytes), Best Index (Int), Best Confidence (Float)
+    Runs MTCNN on one registration image (inside a pool worker).
+    Returns: Confidence of the most confident face (Float), its box as (top, right, bottom, left) -- or (0.0, None)
     """
+    # Load a reduced-size RGB copy for detection
+    try:
+        rgb_img, scale = load_detection_image(image_bytes)
+    except ValueError:
+        return 0.0, None # Unreadable photo, the other ones may still be usable
+    # Detect faces using MTCNN
+    with stage("mtcnn"):
+        detections = get_mtcnn_detector().detect_faces(rgb_img) # Get list of detected faces
+    # detection is a list of dicts with 'box', 'confidence', 'keypoints'
+    #         detections = [
+    #     {
+    #         'box': [120, 80, 160, 160],
+    #         'confidence': 0.82,
+    #         'keypoints': {...}
+    #     },
+    #     {
+    #         'box': [200, 90, 150, 150],
+    #         'confidence': 0.96,
+    #         'keypoints': {...}
+    #     }
+    # ]
+    if not detections:
+        return 0.0, None # No faces detected in this image
+    # Find the detection with the highest confidence
+    # max(iterable, key=function)
+    best_detection = max(detections, key=lambda det:det["confidence"])
+    x, y, w, h = best_detection["box"] # Get the bounding box
+    # Convert from (x, y, w, h) to (top, right, bottom, left) format
+    # Because face_recognition expects (top, right, bottom, left)
+    top, right, bottom, left = max(0,y), max(0,x+w), max(0, y+h), max(0,x)
+    # Map the box back to full resolution so encoding uses the original pixels
+    return float(best_detection["confidence"]), scale_box((top, right, bottom, left), scale)
 
-    best_confidence = 0.0
-    best_encoding = None
-    best_index = -1
+def encode_image_face(image_bytes, box):
+    """
+    Encodes the face inside the full-resolution `box` (inside a pool worker).
+    Returns: Encoding (Bytes), or None if face_recognition could not encode it
+    """
+    try:
+        encodings, _ = encode_faces_full_resolution(image_bytes, [box])
+    except ValueError:
+        return None
+    if encodings[0] is None:
+        return None
+    return serialize_encoding(encodings[0]) # Serialize encoding to compact float32 bytes
 
-    # Iterate over the 5 photos
-    for i , file in enumerate(files):
+def _good_enough(confidence):
+    """ True if a detection is confident enough to stop looking at the remaining registration images. """
+    return 0 < settings.REGISTER_GOOD_ENOUGH_CONFIDENCE <= confidence
+
+def _pick_best(candidates, images_bytes):
+    """
+    Encodes only the winner: tries candidates (confidence, index, box) from most to least confident
+    and returns the first one that encodes.
+    """
+    for confidence, i, box in sorted(candidates, key=lambda c: (-c[0], c[1])): # Ties go to the earlier photo
+        encoding_bytes = encode_image_face(images_bytes[i], box)
+        if encoding_bytes:
+            return encoding_bytes, i, confidence
+    return None, -1, 0.0
+
+async def detect_faces(files):
+    """
+    Takes a list of 5 images. Uses MTCNN to find the best face.
+    All images are detected concurrently in the face pool and only the winning face is encoded.
+    With REGISTER_GOOD_ENOUGH_CONFIDENCE set, the first face reaching it wins and the other detections are cancelled.
+    Returns: Best Encoding (Bytes), Best Index (Int), Best Confidence (Float)
+    """
+    images_bytes = []
+    for file in files:
         # read image bytes
-        image_bytes = await file.read()
+        images_bytes.append(await file.read())
         await file.seek(0) # Reset file pointer for future use
-        # Load image from bytes to numpy RGB Array
-        rgb_img = load_image_from_bytes(image_bytes)
-        # Detect faces using MTCNN
-        detections = mtcnn_detector.detect_faces(rgb_img) # Get list of detected faces
-        # detection is a list of dicts with 'box', 'confidence', 'keypoints'
-        #         detections = [
-        #     {
-        #         'box': [120, 80, 160, 160],
-        #         'confidence': 0.82,
-        #         'keypoints': {...}
-        #     },
-        #     {
-        #         'box': [200, 90, 150, 150],
-        #         'confidence': 0.96,
-        #         'keypoints': {...}
-        #     }
-        # ]
-        if not detections:
-            continue # No faces detected in this image
-        # Find the detection with the highest confidence
-        # max(iterable, key=function)
-        if detections:
-            best_detection = max(detections, key=lambda det:det["confidence"])
-            confidence = best_detection["confidence"]
-        else:
-            best_detection = None
-
-        # If confidence is higher than previous best, and above threshold, get the bounding box
-        if confidence > best_confidence and confidence >= settings.CONFIDENCE_THRESHOLD:
-            x, y, w, h = best_detection["box"] # Get the bounding box
-            # Convert from (x, y, w, h) to (top, right, bottom, left) format
-            # Because face_recognition expects (top, right, bottom, left)
-            top, right, bottom, left = max(0,y), max(0,x+w), max(0, y+h), max(0,x)
-            box = [(top, right, bottom, left)] # face_recognition expects a list of boxes
-            # Get the face encoding using face_recognition
-            try:
-                # Add [0] to get the vector, not the list
-                encoding = face_recognition.face_encodings(rgb_img, box)[0] # Returns a list of encodings
-                best_confidence = confidence
-                best_encoding_bytes = pickle.dumps(encoding) # Serialize encoding to bytes
-                best_index = i
-
-            except IndexError:
+    return await detect_faces_in_images(images_bytes)
+
+async def _detect_candidates(images_bytes, wanted):
+    """
+    Detects all images concurrently in the face pool, stopping early once `wanted` faces reach
+    REGISTER_GOOD_ENOUGH_CONFIDENCE.
+    Returns: The (confidence, index, box) candidates above CONFIDENCE_THRESHOLD
+    """
+    async def detect(i):
+        return i, await run_face_job(detect_image_face, images_bytes[i])
+
+    tasks = [asyncio.ensure_future(detect(i)) for i in range(len(images_bytes))]
+    candidates = []
+    good = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            i, (confidence, box) = await next_done
+            if box is None or confidence < settings.CONFIDENCE_THRESHOLD:
                 continue
+            candidates.append((confidence, i, box))
+            good += _good_enough(confidence)
+            if good >= wanted:
+                break # Early exit: no need to wait for the remaining images
+    finally:
+        for task in tasks:
+            task.cancel() # Detections still queued in the pool are dropped
+    return candidates
 
-    return best_encoding_bytes, best_index, best_confidence
+async def detect_faces_in_images(images_bytes):
+    """ detect_faces for images already read (e.g. by a registration job, after the upload is closed). """
+    candidates = await _detect_candidates(images_bytes, 1)
+    if not candidates:
+        return None, -1, 0.0
+    # Encoding runs once, for the winner only
+    return await run_face_job(_pick_best, candidates, images_bytes)
+
+async def detect_face_templates(images_bytes, max_templates=None):
+    """
+    Multi-template version of detect_faces, for images already read: keeps every registration photo whose face passes
+    CONFIDENCE_THRESHOLD (at most `max_templates`, GALLERY_MAX_TEMPLATES by default), so side angles are enrolled too.
+    Photos are detected and the kept ones encoded in parallel in the face pool. Detection stops early only once
+    `max_templates` faces reach REGISTER_GOOD_ENOUGH_CONFIDENCE, so with 5 templates for 5 photos every photo is
+    detected and encoded; only max_templates=1 keeps the single-winner early exit of detect_faces.
+    Returns: A list of (Encoding (Bytes), Image index (Int), Confidence (Float)), most confident first
+    """
+    max_templates = max_templates or settings.GALLERY_MAX_TEMPLATES
+    if max_templates <= 1:
+        best = await detect_faces_in_images(images_bytes) # Single template: early exit and one encoding, as before
+        return [best] if best[0] else []
+
+    candidates = await _detect_candidates(images_bytes, max_templates)
+    candidates = sorted(candidates, key=lambda c: (-c[0], c[1]))[:max_templates] # Ties go to the earlier photo
+    encodings = await asyncio.gather(*(run_face_job(encode_image_face, images_bytes[i], box) for _, i, box in candidates))
+    return [(encoding, i, confidence) for (confidence, i, _), encoding in zip(candidates, encodings) if encoding]
+
+def detect_best_face(images_bytes):
+    """
+    Synchronous version of detect_faces for code that already runs inside a worker (same result contract).
+    Returns: Best Encoding (Bytes), Best Index (Int), Best Confidence (Float)
+    """
+    candidates = []
+    # Iterate over the 5 photos
+    for i, image_bytes in enumerate(images_bytes):
+        confidence, box = detect_image_face(image_bytes)
+        # Keep faces above the threshold, the most confident one is encoded at the end
+        if box is not None and confidence >= settings.CONFIDENCE_THRESHOLD:
+            candidates.append((confidence, i, box))
+            if _good_enough(confidence):
+                break
+    return _pick_best(candidates, images_bytes)
 
 
 def get_live_encoding(image_bytes):
@@ -88,60 +383,87 @@ def get_live_encoding(image_bytes):
     Use fast HOG detector for real-time video feed.
     It takes image_bytes (raw bytes of an image captured from the camera).
     HOG (Histogram of Oriented Gradients) is a fast, CPU-friendly method to detect faces.
+    Returns the encoding bytes of the first face, or None.
+    """
+    faces = get_live_encodings([image_bytes], max_faces=1)[0]
+    # if no faces detected, return None
+    if not faces:
+        return None
+    return faces[0][1]
 
+def detect_face_boxes(image_bytes, max_faces=None):
+    """
+    HOG detection only, on a downscaled copy of the frame.
+    Returns: A list of full-resolution (top, right, bottom, left) boxes (empty if the frame is unreadable or has no face)
     """
     try:
-    # Load image from bytes to numpy RGB Array
-        rgb_img = load_image_from_bytes(image_bytes)
+        rgb_img, scale = load_detection_image(image_bytes)
     except ValueError:
-        return None
+        return []
+    with stage("hog"):
+        boxes = get_face_recognition().face_locations(rgb_img)[:max_faces] # Returns list of (top, right, bottom, left) tuples
+    return [scale_box(box, scale) for box in boxes]
 
-    # Detect face locations using HOG
-    boxes = face_recognition.face_locations(rgb_img) # Returns list of (top, right, bottom, left) tuples
-    # if no faces detected, return None
-    if not boxes:
-        return None
-    # Get the face encodings for the detected faces
-    # face_encodings generates a 128-dimensional vector that uniquely represents a face.
-    # boxes tells it where the faces are.
-    encoding = face_recognition.face_encodings(rgb_img, boxes)[0] # Get the first face encoding
-    # Serializes the NumPy array (encoding) into bytes using pickle.
-    # This allows you to store the face encoding in a database or send it over the network.
-    return pickle.dumps(encoding)
+def get_live_encodings(images_bytes, max_faces=None):
+    """
+    Batch version of get_live_encoding: decodes, detects (HOG) and encodes a list of images in one job,
+    keeping every face (or the first `max_faces`) instead of only the first one.
+    Returns: For each image, a list of (box, encoding_bytes) pairs with box = (top, right, bottom, left).
+    Images that cannot be decoded or contain no face give an empty list.
+    """
+    results = []
+    for image_bytes in images_bytes:
+        # Detect face locations using HOG on a downscaled copy
+        boxes = detect_face_boxes(image_bytes, max_faces)
+        if not boxes:
+            results.append([]) # No face: the full-resolution frame is never decoded
+            continue
+        try:
+            # face_encodings generates a 128-dimensional vector that uniquely represents a face.
+            # It runs on the original pixels, with the boxes mapped back to full resolution.
+            encodings, boxes = encode_faces_full_resolution(image_bytes, boxes)
+        except ValueError:
+            results.append([])
+            continue
+        # Serializes the NumPy arrays (encodings) into compact float32 bytes.
+        results.append([(box, serialize_encoding(encoding)) for box, encoding in zip(boxes, encodings) if encoding is not None])
+    return results
 
 # Logic Matching
 def find_match(known_employees, live_encoding_bytes):
     """
-    Compares the live encoding with known employee encodings to find a match.
+    Compares the live encoding with known employee encodings to find the nearest match.
 
     Parameters:
-    - known_employees: List of Employee objects with known encodings
+    - known_employees: A Gallery or IVFIndex, or a list of Employee objects with known encodings
     - live_encoding_bytes: Serialized bytes of the live face encoding
 
     Returns:
-    - matched_employee: The Employee object that matches, or None if no match found
-    - match_index: Index of the matched employee in the known_employees list, or -1 if no match
+    - matched_employee: The Employee object that matches (the employee id when a Gallery is given), or None if no match found
+    - match_index: Index of the matched employee in the gallery / known_employees list, or -1 if no match
     - match_distance: Distance of the best match, or None if no match
     """
-    live_encoding = pickle.loads(live_encoding_bytes) # Deserialize live encoding bytes to Numpy array
-
-    # Loop through known employees to find a match
-    for emp in known_employees:
-        # Convert the stored encoding for the current employee from bytes → NumPy array.
-        known_encoding = pickle.loads(emp.encoding)
-        # compare the live encoding with the known encoding
-        # match = face_recognition.compare_faces( # compare_faces calculates the distance between the new face and known faces.
-        #     [known_encoding], live_encoding,
-        #     tolerance=settings.FACE_TOLRANCE # Returns True if the face matches (distance ≤ tolerance) False otherwise.
-        # )[0] # compare_faces returns a list of booleans indicating matches
+    live_encoding = deserialize_encoding(live_encoding_bytes) # Deserialize live encoding bytes to Numpy array
 
-        # if any(match):
-        distance = face_recognition.face_distance( # Calculate the distance between the live encoding and known encoding
-            [known_encoding], live_encoding
-        )[0] # face_distance returns a list of distances
+    if isinstance(known_employees, (Gallery, IVFIndex)):
+        # Exact: all distances in one vectorized pass. IVF: only the closest partitions are scanned
+        with stage("match"):
+            return known_employees.match(live_encoding)
 
-        print(f"Debug: checking {emp.name} ... Distance: {distance:.4f} (Tolerance: {settings.FACE_TOLERANCE})" )
-        if distance < settings.FACE_TOLERANCE:
+    # A plain list of employees: index them by position so the match maps back to the object
+    gallery = Gallery.from_rows((i, emp.encoding) for i, emp in enumerate(known_employees))
+    employee_index, _, distance = gallery.match(live_encoding)
+    if employee_index is None:
+        return None, -1, None # No match found
+    return known_employees[employee_index], employee_index, distance
 
-            return emp, known_employees.index(emp), distance
-    return None, -1, None # No match found
+def find_matches(gallery, live_encodings_bytes):
+    """
+    Matches many live encodings against a Gallery (or IVFIndex) at once.
+    Returns: A list of (Employee id, Row index, Distance) tuples in the same order, (None, -1, None) for unknown faces
+    """
+    if not live_encodings_bytes:
+        return []
+    live_encodings = np.stack([deserialize_encoding(encoding_bytes) for encoding_bytes in live_encodings_bytes])
+    with stage("match"):
+        return gallery.match_many(live_encodings)
@@ -0,0 +1,100 @@
+import threading
+import numpy as np
+import cv2
+from app.core.config import settings
+from app.core.metrics import registry, stage, stage_histogram
+from app.services.face_logic import _jpeg_size
+
+# Reason codes returned for rejected frames, with the message shown to the user
+REJECTION_MESSAGES = {
+    "unreadable": "Could not read the image.",
+    "too_dark": "Image too dark, please add some light.",
+    "too_bright": "Image overexposed, please avoid direct light.",
+    "blurry": "Image too blurry, please hold still.",
+    "no_face": "No face in view, please look at the camera.",
+}
+_REDUCED_GRAY_FLAGS = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4), (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+rejections = {
+    reason: registry.counter("quality_gate_rejections_total", "Frames rejected before detection", {"reason": reason})
+    for reason in REJECTION_MESSAGES
+}
+saved_seconds = registry.counter("quality_gate_saved_seconds_total",
+                                 "Detector time not spent on rejected frames (mean detector time per rejected frame)")
+
+_local = threading.local() # OpenCV cascades must not be shared between threads
+
+
+def _face_cascade():
+    if not hasattr(_local, "cascade"):
+        _local.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    return _local.cascade
+
+
+def load_gate_image(image_bytes, max_side=None):
+    """
+    Decodes a small grayscale copy (longer side at most QUALITY_MAX_SIDE). JPEGs are decoded at reduced scale.
+    Returns: Grayscale image (numpy array), or None if the bytes are not an image
+    """
+    max_side = max_side or settings.QUALITY_MAX_SIDE
+    flag = cv2.IMREAD_GRAYSCALE
+    size = _jpeg_size(image_bytes)
+    if size:
+        for factor, reduced_flag in _REDUCED_GRAY_FLAGS:
+            if max(size) / factor >= max_side:
+                flag = reduced_flag
+                break
+    gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    if gray is None:
+        return None
+    side = max(gray.shape[:2])
+    if side > max_side:
+        ratio = max_side / side
+        gray = cv2.resize(gray, (max(1, round(gray.shape[1] * ratio)), max(1, round(gray.shape[0] * ratio))),
+                          interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def check_frame(image_bytes, face_check=None):
+    """
+    Cheap quality gate run before HOG / MTCNN: exposure (mean brightness), blur (variance of the Laplacian)
+    and, for live frames, a Haar cascade face-presence check, all on a small grayscale copy.
+    `face_check` defaults to QUALITY_FACE_CHECK; registration turns it off (the frontal cascade misses side angles).
+    Returns: None if the frame is worth detecting, otherwise a reason code of REJECTION_MESSAGES
+    """
+    if not settings.QUALITY_GATE:
+        return None
+    face_check = settings.QUALITY_FACE_CHECK if face_check is None else face_check
+    with stage("quality"):
+        gray = load_gate_image(image_bytes)
+        if gray is None:
+            return "unreadable"
+        brightness = float(gray.mean())
+        if brightness < settings.QUALITY_MIN_BRIGHTNESS:
+            return "too_dark"
+        if brightness > settings.QUALITY_MAX_BRIGHTNESS:
+            return "too_bright"
+        if cv2.Laplacian(gray, cv2.CV_64F).var() < settings.QUALITY_MIN_SHARPNESS:
+            return "blurry"
+        if face_check:
+            faces = _face_cascade().detectMultiScale(gray, scaleFactor=1.15, minNeighbors=3, minSize=(20, 20))
+            if len(faces) == 0:
+                return "no_face"
+    return None
+
+
+def check_frames(images_bytes, face_check=None):
+    """ check_frame for several images (one thread hop for a whole batch). Returns: A reason code or None per image """
+    return [check_frame(image_bytes, face_check) for image_bytes in images_bytes]
+
+
+def record_rejection(reason, detector="hog"):
+    """ Counts a rejected frame and the detector time it saved, estimated by that detector's mean observed time. """
+    rejections[reason].inc()
+    snapshot = stage_histogram(detector).snapshot()
+    if snapshot["count"]:
+        saved_seconds.inc(snapshot["sum"] / snapshot["count"])
+
+
+def rejection_response(reason):
+    return {"status": "error", "msg": REJECTION_MESSAGES[reason], "reason": reason}
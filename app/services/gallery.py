@@ -0,0 +1,165 @@
+import numpy as np
+from app.core.config import settings
+from app.services.encoding_format import ENCODING_DIM, deserialize_encoding
+
+# Gallery Engine : every known face in one contiguous matrix
+class Gallery:
+    """
+    Holds every known encoding (template) in one contiguous N x 128 float32 NumPy matrix with a parallel
+    owner id array; an employee may own several rows (one per registration angle or adaptive update).
+    A live encoding is compared against all rows in a single vectorized pass. The nearest row's owner is
+    the nearest employee; per-employee distances are a group-min over the owner index (employee_distances).
+    """
+
+    def __init__(self, ids=None, encodings=None):
+        ids = np.asarray([] if ids is None else ids, dtype=np.int64)
+        if encodings is None or len(ids) == 0:
+            encodings = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if len(ids) != len(encodings):
+            raise ValueError("ids and encodings must have the same length")
+
+        self._size = len(ids)
+        # Keep spare capacity so registering a new employee does not copy the whole matrix every time
+        capacity = max(self._size, 16)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._encodings = np.zeros((capacity, ENCODING_DIM), dtype=np.float32)
+        self._ids[:self._size] = ids
+        self._encodings[:self._size] = encodings
+        # Squared norms of every row, so distances reduce to one matrix-vector product
+        self._sq_norms = np.einsum("ij,ij->i", self._encodings, self._encodings)
+        self._owners = None # (unique employee ids, owner index per row), built on first use
+
+    @classmethod
+    def from_rows(cls, rows):
+        """ Builds a gallery from (id, encoding_bytes) pairs, e.g. db.query(Employee.id, Employee.encoding). """
+        ids, encodings = [], []
+        for employee_id, encoding_bytes in rows:
+            if not encoding_bytes:
+                continue # Employee registered without a usable encoding
+            ids.append(employee_id)
+            encodings.append(deserialize_encoding(encoding_bytes))
+        return cls(ids, np.array(encodings) if encodings else None)
+
+    @classmethod
+    def from_arrays(cls, ids, encodings, sq_norms):
+        """
+        Wraps existing arrays without copying them, e.g. read-only views of a memory-mapped snapshot.
+        The first add() moves the rows to private, growable arrays.
+        """
+        gallery = cls()
+        gallery._size = len(ids)
+        gallery._ids, gallery._encodings, gallery._sq_norms = ids, encodings, sq_norms
+        return gallery
+
+    @property
+    def ids(self):
+        """ Employee ids, one per row of the encodings matrix. """
+        return self._ids[:self._size]
+
+    @property
+    def encodings(self):
+        """ The N x 128 encodings matrix. """
+        return self._encodings[:self._size]
+
+    @property
+    def sq_norms(self):
+        """ Squared norm of every row. """
+        return self._sq_norms[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """ Memory held by the matrix, id and norm arrays (including spare capacity). """
+        return self._ids.nbytes + self._encodings.nbytes + self._sq_norms.nbytes
+
+    # Per row : 128 float32 values + int64 owner id + float32 squared norm
+    BYTES_PER_TEMPLATE = ENCODING_DIM * 4 + 8 + 4
+
+    def owner_index(self):
+        """ Returns: Unique employee ids (sorted), the position of each row's owner in that array """
+        if self._owners is None:
+            self._owners = np.unique(self.ids, return_inverse=True)
+        return self._owners
+
+    def add(self, employee_id, encoding):
+        """ Appends one encoding, growing the underlying matrix geometrically when it is full. """
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(ENCODING_DIM)
+        if self._size == len(self._ids):
+            capacity = len(self._ids) * 2
+            self._ids = np.resize(self._ids, capacity)
+            self._sq_norms = np.resize(self._sq_norms, capacity)
+            encodings = np.zeros((capacity, ENCODING_DIM), dtype=np.float32)
+            encodings[:self._size] = self.encodings
+            self._encodings = encodings
+        self._ids[self._size] = employee_id
+        self._encodings[self._size] = encoding
+        self._sq_norms[self._size] = encoding @ encoding
+        self._size += 1
+        self._owners = None
+
+    def distances(self, live_encoding):
+        """ Euclidean distance from the live encoding to every row, computed in one pass. """
+        live_encoding = np.asarray(live_encoding, dtype=np.float32).reshape(ENCODING_DIM)
+        # ||a - b||^2 = ||a||^2 - 2 a.b + ||b||^2
+        sq_distances = self._sq_norms[:self._size] - 2.0 * (self.encodings @ live_encoding) + live_encoding @ live_encoding
+        return np.sqrt(np.maximum(sq_distances, 0.0))
+
+    def distances_many(self, live_encodings):
+        """ M x N distance matrix from M live encodings to every row, as one matrix-by-matrix product. """
+        live_encodings = np.asarray(live_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        live_sq_norms = np.einsum("ij,ij->i", live_encodings, live_encodings)
+        sq_distances = self._sq_norms[None, :self._size] - 2.0 * (live_encodings @ self.encodings.T) + live_sq_norms[:, None]
+        return np.sqrt(np.maximum(sq_distances, 0.0))
+
+    def employee_distances(self, live_encoding):
+        """
+        Distance from the live encoding to every employee: the closest of that employee's templates.
+        One distance pass over all rows, then a group-min over the owner index.
+        Returns: Employee ids (sorted array), Distances (array, same order)
+        """
+        employee_ids, owners = self.owner_index()
+        minimums = np.full(len(employee_ids), np.inf, dtype=np.float32)
+        np.minimum.at(minimums, owners, self.distances(live_encoding))
+        return employee_ids, minimums
+
+    def nearest(self, live_encoding):
+        """
+        Returns: Index of the nearest row (Int), Distance to it (Float)
+        Returns (-1, None) when the gallery is empty.
+        """
+        if self._size == 0:
+            return -1, None
+        distances = self.distances(live_encoding)
+        index = int(np.argmin(distances))
+        return index, float(distances[index])
+
+    def match(self, live_encoding, tolerance=None):
+        """
+        Finds the true nearest employee and accepts it only if it is inside the tolerance.
+        Returns: Employee id (Int), Row index (Int), Distance (Float) -- or (None, -1, None)
+        """
+        tolerance = settings.FACE_TOLERANCE if tolerance is None else tolerance
+        index, distance = self.nearest(live_encoding)
+        if index == -1 or distance >= tolerance:
+            return None, -1, None
+        return int(self._ids[index]), index, distance
+
+    def match_many(self, live_encodings, tolerance=None):
+        """
+        Batch version of match: every live encoding is compared to every row in one computation.
+        Returns: A list of (Employee id, Row index, Distance) tuples, (None, -1, None) for faces without a match
+        """
+        tolerance = settings.FACE_TOLERANCE if tolerance is None else tolerance
+        live_encodings = np.asarray(live_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if self._size == 0 or len(live_encodings) == 0:
+            return [(None, -1, None)] * len(live_encodings)
+        distances = self.distances_many(live_encodings)
+        indices = np.argmin(distances, axis=1)
+        best = distances[np.arange(len(indices)), indices]
+        return [
+            (int(self._ids[index]), int(index), float(distance)) if distance < tolerance else (None, -1, None)
+            for index, distance in zip(indices, best)
+        ]
@@ -0,0 +1,274 @@
+import asyncio
+import threading
+import numpy as np
+from sqlalchemy import func, select
+from app.core.database import SessionLocal
+from app.models.employee import Employee
+from app.models.face_template import FaceTemplate
+from app.core.config import settings
+from app.core.metrics import stage, registry
+from app.services.ann_index import IVFIndex
+from app.services.encoding_format import deserialize_encoding
+from app.services.gallery import Gallery
+from app.services.gallery_snapshot import open_snapshot, read_header, write_snapshot, publish_lock
+from app.services.partitions import GalleryPartitions
+
+scoped_searches = registry.counter("gallery_scoped_searches_total", "Recognitions searched inside a site / department / group scope")
+scope_fallbacks = registry.counter("gallery_scope_fallbacks_total", "Scoped recognitions without a match in scope, searched globally")
+
+# Process-level Gallery Cache
+class GalleryCache:
+    """
+    Keeps one Gallery per process so /api/recognize never has to read the employees table.
+    It is loaded once at startup, updated incrementally by /api/register, and refreshed
+    when a cheap (count, max id) version check shows another worker has changed the tables.
+    Rows are face templates: every FaceTemplate, plus Employee.encoding for employees that have none.
+    Scoped searches use the per-site / per-department partitions of the same rows (GalleryPartitions).
+    With GALLERY_SNAPSHOT_PATH set, the rows are not held per worker: every worker of the host maps the
+    same read-only snapshot file, and the first one to see new rows publishes the next snapshot for all.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._gallery = Gallery()
+        self._index = None # Optional IVFIndex over the same encodings (GALLERY_INDEX=ivf)
+        self._partitions = GalleryPartitions(self._gallery, {})
+        self._snapshot = None # Mapped gallery snapshot (GALLERY_SNAPSHOT_PATH)
+        self._version = None # (count, max id) of the employees and face_templates tables when the gallery was built
+        self.hits = 0 # Lookups served from memory
+        self.refreshes = 0 # Full reloads from the database
+        self.generation = 0 # Bumped on every change, lets result caches drop stale answers
+
+    @staticmethod
+    def _read_version(db):
+        """ Two aggregate queries, no encodings are transferred. """
+        count, max_id = db.execute(select(func.count(Employee.id), func.max(Employee.id))).one()
+        templates, max_template_id = db.execute(select(func.count(FaceTemplate.id), func.max(FaceTemplate.id))).one()
+        return count, max_id or 0, templates, max_template_id or 0
+
+    @staticmethod
+    def _read_rows(db):
+        """ (employee id, encoding) of every template, ordered by owner then template id so row order is stable. """
+        rows = db.execute(select(FaceTemplate.employee_id, FaceTemplate.encoding)
+                          .order_by(FaceTemplate.employee_id, FaceTemplate.id)).all()
+        # Employees registered before templates existed (or imported with a single encoding)
+        rows += db.execute(select(Employee.id, Employee.encoding)
+                           .where(~Employee.id.in_(select(FaceTemplate.employee_id)))).all()
+        return rows
+
+    @staticmethod
+    def _read_scopes(db):
+        """ {employee id: (site, department)} for the partitions, without loading the ORM objects. """
+        return {employee_id: (site, department) for employee_id, site, department
+                in db.execute(select(Employee.id, Employee.site, Employee.department))}
+
+    @staticmethod
+    def _build_index(gallery):
+        """ Loads the saved IVF index, or trains a new one, when ivf mode is on and the gallery is large enough. """
+        if settings.GALLERY_INDEX != "ivf" or len(gallery) < settings.IVF_MIN_SIZE:
+            return None
+        index = IVFIndex.load(gallery)
+        # Retrain when nothing was saved or the gallery has outgrown the centroids it was fitted on
+        if index is None or len(gallery) > 4 * index.trained_size:
+            index = IVFIndex.train(gallery)
+            index.save()
+        return index
+
+    def _map_snapshot(self, db, version):
+        """ Maps the host's snapshot, publishing it first if it does not hold the database's current rows. """
+        path = settings.GALLERY_SNAPSHOT_PATH
+        with publish_lock(path): # Workers starting together wait for the first one's snapshot
+            snapshot = open_snapshot(path)
+            if snapshot is None or snapshot.version != version:
+                # This worker reads the encodings once for every worker of the host
+                write_snapshot(path, [Gallery.from_rows(self._read_rows(db))], version)
+                snapshot = open_snapshot(path)
+        return snapshot
+
+    def load(self):
+        """ (Re)builds the gallery from the id and encoding columns only (or maps the shared snapshot). """
+        db = self._session_factory()
+        try:
+            version = self._read_version(db)
+            snapshot = self._map_snapshot(db, version) if settings.GALLERY_SNAPSHOT_PATH else None
+            if snapshot is not None:
+                gallery, version = snapshot.gallery, snapshot.version
+            else:
+                gallery = Gallery.from_rows(self._read_rows(db))
+            partitions = GalleryPartitions(gallery, self._read_scopes(db))
+        finally:
+            db.close()
+        index = self._build_index(gallery)
+        # Swap the whole gallery at once so readers never see a half-built matrix
+        with self._lock:
+            self._gallery = gallery
+            self._index = index
+            self._partitions = partitions
+            self._snapshot = snapshot
+            self._version = version
+            self.refreshes += 1
+            self.generation += 1
+        return gallery
+
+    def refresh_if_stale(self):
+        """
+        Reloads the gallery if the table no longer matches the cached version, or maps the snapshot another worker
+        has just published. Returns True if it reloaded.
+        """
+        db = self._session_factory()
+        try:
+            version = self._read_version(db)
+        finally:
+            db.close()
+        published = read_header(settings.GALLERY_SNAPSHOT_PATH) if self._snapshot is not None else None
+        if version == self._version and (published is None or published[2] == self._snapshot.file_id):
+            return False
+        self.load()
+        return True
+
+    async def watch(self, interval):
+        """ Background loop that polls the version every `interval` seconds, off the request path. """
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.refresh_if_stale)
+
+    def get(self, scope=None):
+        """
+        Returns the cached gallery, or its IVF index when one is active. Both provide match().
+        With a (kind, name) scope: the exact sub-gallery of that site, department or access group.
+        """
+        self.hits += 1
+        if scope is not None:
+            return self._partitions.gallery(scope)
+        return self._index if self._index is not None else self._gallery
+
+    def search(self, live_encodings, scope=None):
+        """
+        match_many inside the scope's partition. With SCOPE_FALLBACK, faces without a match there are searched
+        again in the whole gallery (e.g. a visitor from another building). Row indices of scoped matches refer to the partition.
+        Returns: A list of (Employee id, Row index, Distance) tuples, (None, -1, None) for faces without a match
+        """
+        live_encodings = np.asarray(live_encodings, dtype=np.float32)
+        with stage("match"):
+            matches = list(self.get(scope).match_many(live_encodings))
+            if scope is None:
+                return matches
+            scoped_searches.inc(len(matches))
+            misses = [i for i, (employee_id, _, _) in enumerate(matches) if employee_id is None]
+            if misses and settings.SCOPE_FALLBACK:
+                scope_fallbacks.inc(len(misses))
+                for i, match in zip(misses, self.get().match_many(live_encodings[misses])):
+                    matches[i] = match
+            return matches
+
+    def find_duplicate(self, encodings_bytes, threshold=None):
+        """
+        Nearest-neighbour lookup of a new employee's templates in the active index (IVF or exact), after picking up
+        employees registered by other workers. Used before inserting, so one face is not registered under two names.
+        Returns: (Employee id, Distance) of the closest registered employee within `threshold` (DUPLICATE_THRESHOLD), or None
+        """
+        matches = [match for match in self.find_duplicates(encodings_bytes, threshold) if match is not None]
+        return min(matches, key=lambda match: match[1]) if matches else None
+
+    def find_duplicates(self, encodings_bytes, threshold=None):
+        """
+        Batch version of find_duplicate (e.g. one encoding per employee of an import batch), in one lookup.
+        Returns: For each encoding, (Employee id, Distance) of the nearest registered employee within `threshold`, or None
+        """
+        threshold = settings.DUPLICATE_THRESHOLD if threshold is None else threshold
+        self.refresh_if_stale()
+        live_encodings = np.stack([deserialize_encoding(encoding_bytes) for encoding_bytes in encodings_bytes])
+        with stage("duplicate_check"):
+            index = self._index if self._index is not None else self._gallery
+            return [(employee_id, distance) if employee_id is not None else None
+                    for employee_id, _, distance in index.match_many(live_encodings, threshold)]
+
+    @property
+    def gallery(self):
+        """ The exact Gallery, even when an IVF index serves the matches (for per-employee distances). """
+        return self._gallery
+
+    def add(self, employee_id, encoding_bytes, site=None, department=None):
+        """ Adds a newly registered employee with a single encoding (no template rows) without reloading the table. """
+        self.add_employees([(employee_id, encoding_bytes, site, department)])
+
+    def add_employees(self, rows):
+        """ Adds new employees with a single encoding each, (id, encoding bytes, site, department), e.g. an import batch. """
+        self._append(rows, new_employee_ids=[employee_id for employee_id, _, _, _ in rows])
+
+    def add_templates(self, employee_id, encodings_bytes, template_ids=(), new_employee=False, site=None, department=None):
+        """
+        Adds templates just written by this worker (FaceTemplate ids `template_ids`), for a new or an existing employee.
+        A new employee's site and department place the rows in their partitions.
+        """
+        self._append([(employee_id, encoding_bytes, site, department) for encoding_bytes in encodings_bytes],
+                     [employee_id] if new_employee else [], template_ids)
+
+    def _publish(self, ids, encodings, version):
+        """
+        Writes the mapped rows followed by the new ones as the next snapshot generation, and maps it.
+        Returns: The Snapshot, or None if another worker replaced the file in between (the next refresh sorts it out)
+        """
+        path = settings.GALLERY_SNAPSHOT_PATH
+        with publish_lock(path):
+            write_snapshot(path, [self._gallery, Gallery(ids, np.stack(encodings))], version)
+            snapshot = open_snapshot(path)
+        return snapshot if snapshot is not None and snapshot.version == version else None
+
+    def _append(self, rows, new_employee_ids=(), template_ids=()):
+        """ Adds rows written by this worker, (employee id, encoding bytes, site, department), to the gallery, its partitions and index. """
+        encodings = [deserialize_encoding(encoding_bytes) for _, encoding_bytes, _, _ in rows]
+        if not encodings:
+            return
+        with self._lock:
+            version = self._version
+            if version is not None:
+                # Expected version after our own insert; rows added elsewhere will still mismatch and trigger a reload
+                count, max_id, templates, max_template_id = version
+                version = (count + len(new_employee_ids), max([max_id, *new_employee_ids]),
+                           templates + len(template_ids), max([max_template_id, *template_ids]))
+            first_row = len(self._gallery)
+            snapshot = None
+            if self._snapshot is not None and version is not None:
+                snapshot = self._publish([employee_id for employee_id, _, _, _ in rows], encodings, version)
+            if snapshot is not None:
+                # Same rows in the same order plus the new ones : the partitions only need the new rows
+                self._gallery, self._snapshot = snapshot.gallery, snapshot
+                self._partitions.rebind(self._gallery)
+            else:
+                for (employee_id, _, _, _), encoding in zip(rows, encodings):
+                    self._gallery.add(employee_id, encoding)
+            for row, ((employee_id, _, site, department), encoding) in enumerate(zip(rows, encodings), first_row):
+                self._partitions.add(employee_id, row, site, department)
+                if self._index is not None:
+                    self._index.add(employee_id, encoding)
+            if self._index is None:
+                self._index = self._build_index(self._gallery) # Switches to ivf once the gallery crosses IVF_MIN_SIZE
+            self.generation += 1
+            if version is not None:
+                self._version = version
+
+    def save_index(self):
+        """ Persists the IVF index (if any) so the next start does not re-run k-means. """
+        if self._index is not None:
+            self._index.save()
+
+    def stats(self):
+        employees = len(self._gallery.owner_index()[0])
+        return {
+            "size": len(self._gallery),
+            "employees": employees,
+            "templates_per_employee": len(self._gallery) / employees if employees else 0.0,
+            "bytes_per_template": Gallery.BYTES_PER_TEMPLATE,
+            "memory_mb": self._gallery.nbytes / 2**20, # Including spare capacity
+            # Shared snapshot: the matrix is mapped from this file, its pages are counted once per host
+            "snapshot": {"path": self._snapshot.path, "generation": self._snapshot.generation} if self._snapshot is not None else None,
+            "index": "ivf" if self._index is not None else "exact",
+            "partitions": self._partitions.stats(),
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+        }
+
+
+gallery_cache = GalleryCache()
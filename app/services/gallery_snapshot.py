@@ -0,0 +1,118 @@
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+import numpy as np
+try:
+    import fcntl
+except ImportError: # Windows: no publish lock, concurrent publishers only waste work
+    fcntl = None
+from app.services.encoding_format import ENCODING_DIM
+from app.services.gallery import Gallery
+
+# Snapshot file layout (little-endian):
+#   header (64 bytes) : magic, dimension, row count, generation, database version (4 x int64)
+#   encodings         : count x 128 float32 (starts at byte 64, so every row is 64-byte aligned)
+#   ids               : count x int64 (owner employee id of each row)
+#   squared norms     : count x float32
+_MAGIC = b"EMPGAL01"
+_HEADER = struct.Struct("<8sIIQQ4q")
+_HEADER_SIZE = 64
+
+
+class Snapshot:
+    """ A read-only, memory-mapped gallery snapshot. Every process that maps the same file shares its pages. """
+
+    def __init__(self, path, generation, version, gallery, file_id):
+        self.path = path
+        self.generation = generation
+        self.version = version # Database version (GalleryCache._read_version) the rows were read at
+        self.gallery = gallery # Gallery over read-only views of the mapping (no copy)
+        self.file_id = file_id # (device, inode) of the mapped file, changes with every publication
+
+
+def _file_id(stat):
+    return stat.st_dev, stat.st_ino
+
+
+@contextmanager
+def publish_lock(path):
+    """ Serializes publishers of one snapshot across processes, so workers starting together read the table only once. """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_header(path):
+    """ Returns: (generation, database version, file id) of the published snapshot, or None if there is none. """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER_SIZE)
+            file_id = _file_id(os.fstat(f.fileno()))
+    except FileNotFoundError:
+        return None
+    if len(header) < _HEADER_SIZE:
+        return None
+    magic, dim, _, _, generation, *version = _HEADER.unpack_from(header)
+    if magic != _MAGIC or dim != ENCODING_DIM:
+        return None
+    return generation, tuple(version), file_id
+
+
+def open_snapshot(path):
+    """
+    Maps the published snapshot read-only. The mapping stays valid after a newer snapshot replaces the file,
+    and is released when the last Gallery using it is garbage collected.
+    Returns: A Snapshot, or None if there is no (valid) snapshot file
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        file_id = _file_id(os.fstat(f.fileno()))
+        header = f.read(_HEADER_SIZE)
+        if len(header) < _HEADER_SIZE:
+            return None
+        magic, dim, _, count, generation, *version = _HEADER.unpack_from(header)
+        if magic != _MAGIC or dim != ENCODING_DIM:
+            return None
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+    if mapping is None:
+        return Snapshot(path, generation, tuple(version), Gallery(), file_id)
+    ids_offset = _HEADER_SIZE + count * ENCODING_DIM * 4
+    encodings = np.frombuffer(mapping, np.float32, count * ENCODING_DIM, _HEADER_SIZE).reshape(count, ENCODING_DIM)
+    ids = np.frombuffer(mapping, np.int64, count, ids_offset)
+    sq_norms = np.frombuffer(mapping, np.float32, count, ids_offset + count * 8)
+    return Snapshot(path, generation, tuple(version), Gallery.from_arrays(ids, encodings, sq_norms), file_id)
+
+
+def write_snapshot(path, galleries, version):
+    """
+    Publishes the rows of `galleries` (in order) as a new snapshot generation. The file is written next to
+    `path` and renamed over it, so readers only ever see a complete snapshot; the rows are streamed from
+    each gallery, nothing is concatenated in memory.
+    Returns: The new generation number
+    """
+    previous = read_header(path)
+    generation = (previous[0] if previous else 0) + 1
+    count = sum(len(gallery) for gallery in galleries)
+    tmp_path = f"{path}.{os.getpid()}.tmp" # Per-process temp file, several workers may publish at once
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, ENCODING_DIM, 0, count, generation, *version).ljust(_HEADER_SIZE, b"\0"))
+        for gallery in galleries:
+            f.write(np.ascontiguousarray(gallery.encodings, dtype=np.float32).data)
+        for gallery in galleries:
+            f.write(np.ascontiguousarray(gallery.ids, dtype=np.int64).data)
+        for gallery in galleries:
+            f.write(np.ascontiguousarray(gallery.sq_norms, dtype=np.float32).data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path) # Atomic on POSIX: a worker mapping the old file keeps reading it
+    return generation
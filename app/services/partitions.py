@@ -0,0 +1,104 @@
+import numpy as np
+from app.core.config import settings
+from app.services.gallery import Gallery
+
+SCOPE_KINDS = ("site", "department", "group")
+
+
+def parse_scope(text):
+    """
+    Parses a search scope: "site:<name>", "department:<name>" or "group:<name>" (an access group of ACCESS_GROUPS).
+    Returns: (kind, name), or None when no scope is given (search everyone)
+    Raises ValueError for anything else.
+    """
+    if not text:
+        return None
+    kind, _, name = text.partition(":")
+    kind, name = kind.strip().lower(), name.strip()
+    if kind not in SCOPE_KINDS or not name:
+        raise ValueError(f"Invalid scope '{text}', expected site:<name>, department:<name> or group:<name>.")
+    if kind == "group" and name not in settings.ACCESS_GROUPS:
+        raise ValueError(f"Unknown access group '{name}'.")
+    return kind, name
+
+
+def in_scope(scope, site, department):
+    """ Returns: True if an employee of this site and department belongs to the scope (always True without a scope) """
+    if scope is None:
+        return True
+    kind, name = scope
+    if kind == "site":
+        return site == name
+    if kind == "department":
+        return department == name
+    group = settings.ACCESS_GROUPS.get(name, {})
+    return site in group.get("sites", []) or department in group.get("departments", [])
+
+
+# Partitioned Gallery : the gallery rows of each site and department
+class GalleryPartitions:
+    """
+    Row numbers of a Gallery grouped by their owner's site and department. A scoped search runs on a
+    sub-gallery holding only that slice (copied once, on first use), so it costs as much as the partition,
+    not the whole headcount. An access group is the union of its sites' and departments' rows.
+    """
+
+    def __init__(self, gallery, employee_keys):
+        """ employee_keys : {employee id: (site, department)} for every employee of the gallery """
+        self._gallery = gallery
+        self._keys = dict(employee_keys)
+        self._rows = {} # ("site" | "department", name) -> row numbers (int64 array)
+        self._galleries = {} # scope -> sub-Gallery, built on first use
+        employee_ids, owners = gallery.owner_index()
+        for position, kind in enumerate(("site", "department")):
+            # Group rows by name in one sort instead of a Python loop over the rows
+            names = [self._keys.get(int(employee_id), (None, None))[position] or "" for employee_id in employee_ids]
+            unique_names, codes = np.unique(np.array(names, dtype=str), return_inverse=True)
+            row_codes = codes[owners]
+            order = np.argsort(row_codes, kind="stable")
+            bounds = np.cumsum(np.bincount(row_codes, minlength=len(unique_names)))
+            for name, rows in zip(unique_names, np.split(order, bounds[:-1])):
+                if name: # Employees without a site (or department) only appear in global searches
+                    self._rows[(kind, str(name))] = rows
+
+    def rows(self, scope):
+        """ Returns: The gallery row numbers of a (kind, name) scope """
+        kind, name = scope
+        if kind != "group":
+            return self._rows.get(scope, np.empty(0, dtype=np.int64))
+        group = settings.ACCESS_GROUPS.get(name, {})
+        parts = [self._rows[key] for key in ([("site", site) for site in group.get("sites", [])] +
+                                             [("department", department) for department in group.get("departments", [])])
+                 if key in self._rows]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def gallery(self, scope):
+        """ Returns: The sub-Gallery of a scope (an empty Gallery for a scope without employees) """
+        gallery = self._galleries.get(scope)
+        if gallery is None:
+            rows = self.rows(scope)
+            gallery = Gallery(self._gallery.ids[rows], self._gallery.encodings[rows])
+            self._galleries[scope] = gallery
+        return gallery
+
+    def rebind(self, gallery):
+        """ Points the partitions at a new Gallery holding the same rows in the same order (plus rows added after). """
+        self._gallery = gallery
+
+    def add(self, employee_id, row, site=None, department=None):
+        """ Records a row just appended to the gallery; sub-galleries already built get the row too. """
+        site, department = self._keys.setdefault(employee_id, (site, department))
+        for key in (("site", site), ("department", department)):
+            if key[1]:
+                self._rows[key] = np.append(self._rows.get(key, np.empty(0, dtype=np.int64)), row)
+        encoding = self._gallery.encodings[row]
+        for scope, gallery in self._galleries.items():
+            if in_scope(scope, site, department):
+                gallery.add(employee_id, encoding)
+
+    def stats(self):
+        return {
+            "sites": sum(1 for kind, _ in self._rows if kind == "site"),
+            "departments": sum(1 for kind, _ in self._rows if kind == "department"),
+            "built": len(self._galleries), # Scopes searched at least once since the last reload
+        }
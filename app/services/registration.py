@@ -0,0 +1,70 @@
+import asyncio
+from app.core.config import settings
+from app.core.metrics import registry, stage
+from app.models.employee import Employee
+from app.services.face_logic import detect_face_templates
+from app.services.frame_quality import check_frames, record_rejection
+from app.services.gallery_cache import gallery_cache
+from app.services.templates import save_templates
+
+duplicates = {
+    action: registry.counter("register_duplicates_total", "Registrations matching an already registered employee", {"action": action})
+    for action in ("reject", "flag")
+}
+
+
+async def register_employee(db, name, department, site, images_bytes):
+    """
+    Registers one employee from photos already read: quality gate, MTCNN detection and encoding in the face pool,
+    then a duplicate-face check against the gallery (DUPLICATE_ACTION), then the employee and its templates in one
+    transaction. Shared by /api/register and the registration jobs.
+    Raises FaceQueueFull when the face pool refuses the work.
+    Returns: {"status": "success", "id", "image_index" (of the best photo, in upload order), "confidence", "templates"}
+    (plus "duplicate_of" and "duplicate_distance" when flagged), or an error dict
+    """
+    # Dark or blurry shots are dropped before MTCNN (no face-presence check: side angles are wanted here)
+    reasons = await asyncio.to_thread(check_frames, images_bytes, False)
+    for reason in filter(None, reasons):
+        record_rejection(reason, "mtcnn")
+    usable = [i for i, reason in enumerate(reasons) if reason is None]
+    if not usable:
+        return {"status": "error", "msg": "No clear face found.", "reasons": reasons}
+
+    # Every good shot becomes a template (up to GALLERY_MAX_TEMPLATES), most confident first
+    templates = await detect_face_templates([images_bytes[i] for i in usable])
+    if not templates:
+        return {"status": "error", "msg": "No clear face found."}
+    best_encoding_bytes, best_index, best_confidence = templates[0]
+
+    # The same person must not be enrolled twice under another name: every template is looked up in the gallery
+    duplicate = None
+    if settings.DUPLICATE_ACTION in ("reject", "flag"):
+        duplicate = await asyncio.to_thread(gallery_cache.find_duplicate, [encoding for encoding, _, _ in templates])
+    if duplicate is not None:
+        duplicates[settings.DUPLICATE_ACTION].inc()
+        if settings.DUPLICATE_ACTION == "reject":
+            return {"status": "error", "msg": "This face is already registered.",
+                    "duplicate_of": duplicate[0], "duplicate_distance": duplicate[1]}
+    # Add new Employee in Table Employee in the DataBase
+    new_employee = Employee(
+        name=name,
+        department=department,
+        site=site or None,
+        encoding=best_encoding_bytes
+    )
+
+    with stage("db"):
+        db.add(new_employee)
+        db.flush() # Assigns the id, the templates are written in the same transaction
+        template_ids = save_templates(db, new_employee.id, [(encoding, confidence) for encoding, _, confidence in templates])
+        db.commit()
+        db.refresh(new_employee)
+    # Add the new faces to this worker's in-memory gallery (other workers pick them up on their next version check).
+    # In a thread: with a shared snapshot this writes the next snapshot file.
+    await asyncio.to_thread(gallery_cache.add_templates, new_employee.id, [encoding for encoding, _, _ in templates], template_ids,
+                            new_employee=True, site=new_employee.site, department=department)
+    response = {"status": "success", "msg": f"Registered {name}", "id": new_employee.id,
+                "image_index": usable[best_index], "confidence": float(best_confidence), "templates": len(templates)}
+    if duplicate is not None: # DUPLICATE_ACTION=flag: registered, for an administrator to review
+        response.update({"duplicate_of": duplicate[0], "duplicate_distance": duplicate[1]})
+    return response
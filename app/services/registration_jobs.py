@@ -0,0 +1,237 @@
+import asyncio
+import datetime
+import json
+import os
+import socket
+import uuid
+from sqlalchemy import delete, update
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.metrics import registry
+from app.models.registration_job import RegistrationJobRecord
+from app.services.face_logic import FaceQueueFull
+from app.services.registration import register_employee
+
+_JOB_SECONDS_BUCKETS = [0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120]
+_WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class RegistrationJob:
+    """ One queued registration: the uploaded photos, kept in memory until a worker of this process has run it. """
+
+    def __init__(self, job_id, name, department, site, images_bytes):
+        self.id = job_id
+        self.name = name
+        self.department = department
+        self.site = site
+        self.images_bytes = images_bytes # Released as soon as the job has run
+        self.queued_at = datetime.datetime.utcnow()
+        self.started = None
+        self.result = None
+
+
+def job_status(record):
+    """ Returns: The status response of a RegistrationJobRecord """
+    now = datetime.datetime.utcnow()
+    response = {
+        "job_id": record.id,
+        "status": record.status,
+        "name": record.name,
+        "worker": record.worker,
+        "queued_seconds": ((record.started_at or now) - record.queued_at).total_seconds(),
+        "elapsed_seconds": ((record.finished_at or now) - record.started_at).total_seconds() if record.started_at else 0.0,
+    }
+    if record.result:
+        # "id", "image_index", "confidence" and "templates" when done, "msg" (and "reasons") when failed
+        response.update({key: value for key, value in json.loads(record.result).items() if key != "status"})
+    return response
+
+
+# Background Registration Queue
+class RegistrationQueue:
+    """
+    Bounded queue of registration jobs, run by REGISTER_JOB_WORKERS tasks on the event loop (the MTCNN work itself
+    runs in the face pool). Requests return a job id at once; a full queue refuses new jobs instead of growing.
+    Job status is kept in the registration_jobs table, so a poll can reach any worker; finished jobs are
+    deleted REGISTER_JOB_TTL seconds later. On shutdown the queue is drained for up to REGISTER_DRAIN_TIMEOUT
+    seconds and the jobs still left are marked failed.
+    """
+
+    def __init__(self, max_size=None, workers=None, ttl=None, session_factory=SessionLocal):
+        self.max_size = max_size or settings.REGISTER_QUEUE_SIZE
+        self.workers = workers or settings.REGISTER_JOB_WORKERS
+        self.ttl = settings.REGISTER_JOB_TTL if ttl is None else ttl
+        self._session_factory = session_factory
+        self._pending = {} # job id -> RegistrationJob, queued or running in this worker
+        self._queue = None
+        self._tasks = []
+        self._loop = None
+        self._running = 0
+        self._accepting = True
+        registry.gauge("register_queue_depth", lambda: self._queue.qsize() if self._queue else 0,
+                       "Registration jobs waiting for a worker")
+        registry.gauge("register_jobs_running", lambda: self._running, "Registration jobs being processed")
+        self.queue_waits = registry.histogram("register_job_queue_wait_seconds", _JOB_SECONDS_BUCKETS,
+                                              "Time a registration job waited before a worker took it")
+        self.durations = registry.histogram("register_job_seconds", _JOB_SECONDS_BUCKETS,
+                                            "Processing time of a registration job (gate, MTCNN, encoding, insert)")
+        self.outcomes = {
+            outcome: registry.counter("register_jobs_total", "Registration jobs by outcome", {"outcome": outcome})
+            for outcome in ("done", "failed", "rejected")
+        }
+
+    def start(self):
+        """ Starts the worker tasks on the running event loop. """
+        loop = asyncio.get_running_loop()
+        if not self._tasks or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(self.max_size)
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+            self._accepting = True
+
+    async def stop(self, timeout=None):
+        """ Stops accepting jobs, waits up to `timeout` (REGISTER_DRAIN_TIMEOUT) for the accepted ones, fails the rest. """
+        if not self._tasks:
+            return
+        self._accepting = False
+        timeout = settings.REGISTER_DRAIN_TIMEOUT if timeout is None else timeout
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in list(self._pending.values()): # Still queued: never started
+            job.result = {"status": "error", "msg": "The server restarted, please register again."}
+            await asyncio.to_thread(self._finish, job)
+
+    async def submit(self, name, department, site, images_bytes):
+        """ Queues a registration. Returns: the job id, or None if REGISTER_QUEUE_SIZE jobs are already waiting """
+        self.start() # No-op once running; lets the queue work without the lifespan hook
+        if not self._accepting or self._queue.full():
+            self.outcomes["rejected"].inc()
+            return None
+        job = RegistrationJob(uuid.uuid4().hex, name, department, site, images_bytes)
+        await asyncio.to_thread(self._save_queued, job)
+        try:
+            # Another submit may have taken the last slot while the row was being saved
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            await asyncio.to_thread(self._discard, job)
+            self.outcomes["rejected"].inc()
+            return None
+        self._pending[job.id] = job
+        return job.id
+
+    def status(self, job_id):
+        """ Returns: The job's status response (from any worker), or None for unknown or expired jobs """
+        db = self._session_factory()
+        try:
+            record = db.get(RegistrationJobRecord, job_id)
+            return job_status(record) if record is not None else None
+        finally:
+            db.close()
+
+    def _save_queued(self, job):
+        db = self._session_factory()
+        try:
+            now = datetime.datetime.utcnow()
+            # Finished jobs expire; unfinished ones that old belong to a worker that died (their photos are gone)
+            expired = now - datetime.timedelta(seconds=self.ttl)
+            db.execute(delete(RegistrationJobRecord).where(RegistrationJobRecord.finished_at < expired))
+            db.execute(update(RegistrationJobRecord)
+                       .where(RegistrationJobRecord.finished_at.is_(None), RegistrationJobRecord.queued_at < expired)
+                       .values(status="failed", finished_at=now,
+                               result=json.dumps({"msg": "The server restarted, please register again."})))
+            db.add(RegistrationJobRecord(id=job.id, status="queued", name=job.name, worker=_WORKER, queued_at=job.queued_at))
+            db.commit()
+        finally:
+            db.close()
+
+    def _discard(self, job):
+        db = self._session_factory()
+        try:
+            db.execute(delete(RegistrationJobRecord).where(RegistrationJobRecord.id == job.id))
+            db.commit()
+        finally:
+            db.close()
+
+    def _save_running(self, job):
+        db = self._session_factory()
+        try:
+            db.execute(update(RegistrationJobRecord).where(RegistrationJobRecord.id == job.id)
+                       .values(status="running", started_at=job.started))
+            db.commit()
+        finally:
+            db.close()
+
+    def _finish(self, job):
+        """ Records the outcome. Returns: "done" or "failed" """
+        self._pending.pop(job.id, None)
+        job.images_bytes = None
+        status = "done" if job.result["status"] == "success" else "failed"
+        db = self._session_factory()
+        try:
+            db.execute(update(RegistrationJobRecord).where(RegistrationJobRecord.id == job.id)
+                       .values(status=status, finished_at=datetime.datetime.utcnow(), result=json.dumps(job.result)))
+            db.commit()
+        finally:
+            db.close()
+        return status
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job):
+        job.started = datetime.datetime.utcnow()
+        self.queue_waits.observe((job.started - job.queued_at).total_seconds())
+        self._running += 1
+        try:
+            await asyncio.to_thread(self._save_running, job)
+            job.result = await self._run(job)
+        except asyncio.CancelledError: # Shutdown after the drain timeout
+            job.result = {"status": "error", "msg": "The server restarted, please register again."}
+            raise
+        except Exception as exc: # A bad job must not stop the worker
+            print(f"Registration job {job.id} failed: {exc!r}")
+            job.result = {"status": "error", "msg": "Registration failed."}
+        finally:
+            self._running -= 1
+            status = await asyncio.shield(asyncio.to_thread(self._finish, job))
+            self.durations.observe((datetime.datetime.utcnow() - job.started).total_seconds())
+            self.outcomes[status].inc()
+
+    async def _run(self, job):
+        db = self._session_factory()
+        try:
+            # The face pool being full is transient here: the job waits for room (with backoff) instead of failing
+            for delay in (0.1, 0.25, 0.5, 1, 2, 4, None):
+                try:
+                    return await register_employee(db, job.name, job.department, job.site, job.images_bytes)
+                except FaceQueueFull:
+                    if delay is None:
+                        return {"status": "error", "msg": "Server busy, please try again."}
+                    await asyncio.sleep(delay)
+        finally:
+            db.close()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": self._running,
+            "max_size": self.max_size,
+            "workers": self.workers,
+            "queue_wait_seconds": self.queue_waits.snapshot(),
+            "job_seconds": self.durations.snapshot(),
+        }
+
+
+# Singleton Instance (one queue per worker process, statuses shared through the database)
+registration_queue = RegistrationQueue()
@@ -0,0 +1,109 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+import cv2
+from app.core.config import settings
+from app.services.gallery_cache import gallery_cache
+
+_HASH_SIZE = 16 # 16 x 16 gradient bits = 256-bit hash
+
+
+def frame_hash(image_bytes):
+    """
+    Difference hash (dHash) of a frame: sign of the horizontal gradient on a 17 x 16 grayscale thumbnail.
+    JPEGs are decoded at 1/8 scale, so this costs a small fraction of a detection pass.
+    Returns: The hash as an int, or None if the bytes are not an image
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    gray = cv2.imdecode(nparr, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    thumb = cv2.resize(gray, (_HASH_SIZE + 1, _HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(thumb[:, 1:] > thumb[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+# Duplicate-frame Result Cache for /api/recognize
+class RecognizeCache:
+    """
+    Remembers the last few recognize results of each device for `ttl` seconds.
+    A frame whose hash is within `max_distance` bits of a remembered frame of the same device gets that
+    result back without detection or matching. Devices are evicted least recently used beyond `max_devices`,
+    and every entry is dropped as soon as the gallery changes (register, reload from another worker).
+    """
+
+    def __init__(self, ttl=None, max_devices=None, per_device=None, max_distance=None):
+        self.ttl = settings.RESULT_CACHE_TTL if ttl is None else ttl
+        self.max_devices = max_devices or settings.RESULT_CACHE_DEVICES
+        self.per_device = per_device or settings.RESULT_CACHE_PER_DEVICE
+        self.max_distance = settings.RESULT_CACHE_MAX_HAMMING if max_distance is None else max_distance
+        self._devices = OrderedDict() # device -> [(hash, result, stored at), ...] newest last
+        self._lock = threading.Lock()
+        self._generation = None # Gallery generation the entries were computed against
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _check_generation(self):
+        generation = gallery_cache.generation
+        if generation != self._generation:
+            if self._devices:
+                self.invalidations += 1
+            self._devices.clear()
+            self._generation = generation
+
+    def get(self, device, image_hash):
+        """ Returns: (True, cached result) for a recent near-duplicate frame of this device, otherwise (False, None) """
+        now = time.monotonic()
+        with self._lock:
+            self._check_generation()
+            entries = self._devices.get(device)
+            if entries:
+                entries[:] = [entry for entry in entries if now - entry[2] < self.ttl] # Expire
+                for stored_hash, result, _ in reversed(entries):
+                    if hamming(stored_hash, image_hash) <= self.max_distance:
+                        self._devices.move_to_end(device)
+                        self.hits += 1
+                        return True, result
+            self.misses += 1
+            return False, None
+
+    def put(self, device, image_hash, result, generation):
+        """ Stores a result computed against gallery `generation` (ignored if the gallery changed meanwhile). """
+        with self._lock:
+            self._check_generation()
+            if generation != self._generation:
+                return
+            entries = self._devices.setdefault(device, [])
+            self._devices.move_to_end(device)
+            entries.append((image_hash, result, time.monotonic()))
+            del entries[:-self.per_device]
+            while len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False) # Least recently used device
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "devices": len(self._devices),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+recognize_cache = RecognizeCache()
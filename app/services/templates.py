@@ -0,0 +1,89 @@
+import asyncio
+import numpy as np
+from sqlalchemy import insert, select, func
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.employee import Employee
+from app.models.face_template import FaceTemplate
+from app.services.encoding_format import deserialize_encoding
+from app.services.gallery_cache import gallery_cache
+
+
+def save_templates(db, employee_id, templates, source="registration"):
+    """
+    Inserts (encoding bytes, quality) pairs for one employee with one bulk INSERT, in the caller's transaction.
+    Returns: The new FaceTemplate ids, in the same order
+    """
+    if not templates:
+        return []
+    return list(db.scalars(
+        insert(FaceTemplate).returning(FaceTemplate.id, sort_by_parameter_order=True),
+        [{"employee_id": employee_id, "encoding": encoding, "source": source, "quality": quality}
+         for encoding, quality in templates],
+    ))
+
+
+# Adaptive Template Updates
+class AdaptiveTemplates:
+    """
+    Turns confident recognitions into extra templates, so an employee registered facing the camera
+    is also recognized from the angles they actually walk in with. Every check runs on the cached
+    gallery; only an accepted update touches the database (in a thread, off the request path).
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._pending = set() # Employees with an update being written
+        self._tasks = set()
+        self.added = 0
+
+    def consider(self, employee_id, encoding_bytes, distance):
+        """ Called with every match (on the event loop). Returns True if an update was started. """
+        if not settings.ADAPTIVE_TEMPLATES or employee_id is None or employee_id in self._pending:
+            return False
+        # Confident, but a new angle: near-identical encodings would only cost memory
+        if not settings.ADAPTIVE_TEMPLATE_NOVELTY < distance <= settings.ADAPTIVE_TEMPLATE_DISTANCE:
+            return False
+        gallery = gallery_cache.gallery
+        if np.count_nonzero(gallery.ids == employee_id) >= settings.GALLERY_MAX_TEMPLATES:
+            return False
+        # Unambiguous: every other employee is clearly farther (one distance pass + group-min)
+        employee_ids, distances = gallery.employee_distances(deserialize_encoding(encoding_bytes))
+        others = distances[employee_ids != employee_id]
+        if len(others) and others.min() - distance < settings.ADAPTIVE_TEMPLATE_MARGIN:
+            return False
+
+        self._pending.add(employee_id)
+        task = asyncio.get_running_loop().create_task(self._save(employee_id, encoding_bytes, distance))
+        self._tasks.add(task) # Strong reference until it is done
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def _write(self, employee_id, encoding_bytes, distance):
+        db = self._session_factory()
+        try:
+            template_ids = []
+            if not db.scalar(select(func.count(FaceTemplate.id)).where(FaceTemplate.employee_id == employee_id)):
+                # First template row of an employee matched on Employee.encoding: keep that encoding as a template,
+                # otherwise the next gallery reload (templates only) would drop it
+                primary = db.scalar(select(Employee.encoding).where(Employee.id == employee_id))
+                if primary:
+                    template_ids += save_templates(db, employee_id, [(primary, None)])
+            template_ids += save_templates(db, employee_id, [(encoding_bytes, distance)], source="adaptive")
+            db.commit()
+            return template_ids
+        finally:
+            db.close()
+
+    async def _save(self, employee_id, encoding_bytes, distance):
+        try:
+            template_ids = await asyncio.to_thread(self._write, employee_id, encoding_bytes, distance)
+            await asyncio.to_thread(gallery_cache.add_templates, employee_id, [encoding_bytes], template_ids)
+            self.added += 1
+        except Exception as exc:
+            print(f"Adaptive template for employee {employee_id} not saved: {exc}")
+        finally:
+            self._pending.discard(employee_id)
+
+
+adaptive_templates = AdaptiveTemplates()
@@ -1,8 +1,8 @@
 import asyncio
 from app.services.face_logic import detect_faces
+from app.services.encoding_format import deserialize_encoding
 from io import BytesIO
 import os
-import pickle
 import cv2
 import matplotlib.pyplot as plt
 
@@ -37,8 +37,8 @@ async def show_best_face():
         best_image_path = images_paths[best_index]
         print(f"Best face found in image index: {best_index}")
         print(f"Confidence", best_confidence)
-        encoding = pickle.loads(best_encoding_bytes)
-        print(f"Encoding bytes length: {len(encoding[0])}")
+        encoding = deserialize_encoding(best_encoding_bytes)
+        print(f"Encoding bytes length: {len(best_encoding_bytes)} ({len(encoding)} values)")
         print(f"Best image path", best_image_path)
 
         # load and show the image
@@ -0,0 +1,85 @@
+import itertools
+from app.core.config import settings
+
+def iou(a, b):
+    """ Intersection over union of two (top, right, bottom, left) boxes. """
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """ One face followed across frames, with the identity it was last encoded as. """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, box, frame):
+        self.id = next(Track._ids)
+        self.box = box
+        self.employee_id = None
+        self.distance = None
+        self.verified_frame = None # Frame of the last encoding, None until the first one
+        self.last_detected = frame
+
+    def needs_encoding(self, frame):
+        """ New track, unknown / low-confidence identity, or identity not re-checked for a while. """
+        if self.verified_frame is None:
+            return True # New track
+        if self.employee_id is None or self.distance > settings.STREAM_CONFIDENT_DISTANCE:
+            return True # Identity confidence too low, try again with this frame
+        return frame - self.verified_frame >= settings.STREAM_REVERIFY_FRAMES # Periodic re-check of a confident identity
+
+
+# Cheap Track-by-detection Tracker (IoU association, no per-frame work between detections)
+class FaceTracker:
+    """
+    Associates the boxes of each detection pass with existing tracks by greatest IoU.
+    Unmatched boxes start new tracks; tracks missing from `max_misses` consecutive detection passes are dropped.
+    """
+
+    def __init__(self, iou_threshold=None, max_misses=None):
+        self.iou_threshold = settings.STREAM_IOU_THRESHOLD if iou_threshold is None else iou_threshold
+        self.max_misses = settings.STREAM_MAX_MISSES if max_misses is None else max_misses
+        self.tracks = []
+        self._misses = {}
+
+    def update(self, boxes, frame):
+        """
+        Returns: Tracks that need an encoding (new, uncertain or stale), Tracks dropped by this update
+        """
+        pairs = sorted(
+            ((iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True,
+        )
+        matched_tracks, matched_boxes = set(), set()
+        for overlap, t, b in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            self.tracks[t].box = boxes[b]
+            self.tracks[t].last_detected = frame
+            self._misses[self.tracks[t].id] = 0
+
+        kept, dropped = [], []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                self._misses[track.id] = self._misses.get(track.id, 0) + 1
+                if self._misses[track.id] > self.max_misses:
+                    dropped.append(track)
+                    self._misses.pop(track.id)
+                    continue
+            kept.append(track)
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                kept.append(Track(box, frame))
+        self.tracks = kept
+        # Only faces seen in this detection pass can be encoded from this frame
+        visible = [track for track in kept if track.last_detected == frame]
+        return [track for track in visible if track.needs_encoding(frame)], dropped
@@ -0,0 +1,76 @@
+#Host memory of the gallery with N workers: every worker holding its own copy vs one shared snapshot (GALLERY_SNAPSHOT_PATH).
+#Usage : python -m benchmarks.bench_gallery_memory --size 200000 --workers 4
+#Linux only : memory is read from /proc/<pid>/smaps_rollup. PSS splits shared pages between the processes mapping them,
+#so the sum of PSS is what the workers really cost the host.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from sqlalchemy import insert
+
+# Runs inside each worker interpreter : load the gallery, wait until every worker has loaded, then report
+_PROBE = """
+import json, sys
+import numpy as np
+from app.services.gallery_cache import GalleryCache
+cache = GalleryCache()
+cache.load()
+cache.get().match(np.zeros(128, dtype=np.float32)) # Touch every row, like the first scan
+print("ready", flush=True)
+sys.stdin.readline()
+memory = {line.split(":")[0]: int(line.split()[1]) for line in open("/proc/self/smaps_rollup") if line.startswith(("Rss:", "Pss:"))}
+print(json.dumps({"rss_mb": memory["Rss"] / 1024, "pss_mb": memory["Pss"] / 1024}), flush=True)
+"""
+
+
+def seed(url, size):
+    os.environ["DATABASE_URL"] = url # Read by app.core.config at import
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.employee import Employee
+    from app.models.face_template import FaceTemplate
+    from app.services.encoding_format import serialize_encoding
+    from benchmarks.synthetic import synthetic_gallery
+    Base.metadata.create_all(engine)
+    _, encodings = synthetic_gallery(size)
+    db = SessionLocal()
+    db.execute(insert(Employee), [{"name": f"Employee {i}", "department": f"Dept {i % 20}",
+                                   "encoding": serialize_encoding(encoding)} for i, encoding in enumerate(encodings)])
+    db.commit()
+    db.close()
+
+
+def measure(url, workers, snapshot_path):
+    """ Returns: Sum of RSS and sum of PSS (MB) of `workers` processes that have all loaded the gallery """
+    env = dict(os.environ, DATABASE_URL=url, GALLERY_SNAPSHOT_PATH=snapshot_path, GALLERY_INDEX="exact")
+    processes = [subprocess.Popen([sys.executable, "-c", _PROBE], env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+    for process in processes:
+        if process.stdout.readline().strip() != "ready":
+            raise SystemExit("A worker failed to load the gallery")
+    results = []
+    for process in processes:
+        process.stdin.write("\n")
+        process.stdin.flush()
+    for process in processes:
+        results.append(json.loads(process.stdout.readline()))
+        process.wait()
+    return sum(r["rss_mb"] for r in results), sum(r["pss_mb"] for r in results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gallery memory per host: private copies vs a shared mmap snapshot.")
+    parser.add_argument("--size", type=int, default=200000, help="Employees seeded in a temporary SQLite database")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_gallery_")
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    seed(url, args.size)
+    print(f"{args.size} employees ({args.size * 512 / 2**20:.0f} MB of encodings), {args.workers} workers")
+    print(f"{'mode':<22} {'sum RSS MB':>11} {'sum PSS MB':>11}")
+    for label, snapshot_path in (("private copies", ""), ("shared snapshot", os.path.join(directory, "gallery.snapshot"))):
+        rss, pss = measure(url, args.workers, snapshot_path)
+        print(f"{label:<22} {rss:>11.0f} {pss:>11.0f}")
@@ -0,0 +1,54 @@
+#Latency and recognition agreement of get_live_encoding at each DETECTION_MAX_SIDE.
+#Usage : python -m benchmarks.bench_resolution --images "path/to/faces/*.jpg" --sides 0 1280 960 640 480 320
+
+import argparse
+import glob
+import time
+import numpy as np
+from app.core.config import settings
+from app.services.encoding_format import deserialize_encoding
+from app.services.face_logic import get_live_encoding
+from app.services.gallery import Gallery
+
+
+def encode_all(images_bytes, max_side, repeats):
+    """ Returns: encodings (None where no face was found), mean milliseconds per image """
+    settings.DETECTION_MAX_SIDE = max_side
+    encodings = [get_live_encoding(image_bytes) for image_bytes in images_bytes] # Warm-up and result
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for image_bytes in images_bytes:
+            get_live_encoding(image_bytes)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / (repeats * len(images_bytes))
+    return [deserialize_encoding(e) if e else None for e in encodings], elapsed_ms
+
+
+def run(paths, sides, repeats):
+    images_bytes = [open(path, "rb").read() for path in paths]
+    # Reference : full resolution detection, one gallery entry per image
+    reference, full_ms = encode_all(images_bytes, 0, repeats)
+    found = [i for i, encoding in enumerate(reference) if encoding is not None]
+    if not found:
+        raise SystemExit("No face found in any image at full resolution.")
+    gallery = Gallery(found, np.stack([reference[i] for i in found]))
+
+    print(f"{len(images_bytes)} images, {len(found)} with a face at full resolution")
+    print(f"{'max side':>9} {'ms/image':>9} {'speedup':>8} {'faces':>7} {'agreement':>10} {'mean dist':>10}")
+    for side in sides:
+        encodings, ms = encode_all(images_bytes, side, repeats) if side else (reference, full_ms)
+        faces = sum(encoding is not None for encoding in encodings)
+        # Agreement : the reduced-scale encoding is recognised as the same image as the full-resolution one
+        agree = sum(encodings[i] is not None and gallery.match(encodings[i])[0] == i for i in found)
+        distances = [float(np.linalg.norm(encodings[i] - reference[i])) for i in found if encodings[i] is not None]
+        mean_distance = np.mean(distances) if distances else float("nan")
+        print(f"{side or 'full':>9} {ms:>9.1f} {full_ms / ms:>7.2f}x {faces:>7} {agree / len(found):>10.1%} {mean_distance:>10.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reduced-resolution detection against full resolution.")
+    parser.add_argument("--images", required=True, help="Glob of face photos, e.g. 'faces/*.jpg'")
+    parser.add_argument("--sides", type=int, nargs="+", default=[0, 1280, 960, 640, 480, 320],
+                        help="DETECTION_MAX_SIDE values to test (0 = full resolution)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the image set")
+    args = parser.parse_args()
+    run(sorted(glob.glob(args.images)), args.sides, args.repeats)
@@ -0,0 +1,43 @@
+#Startup time and memory of a worker for each WORKER_ROLE, measured in a fresh interpreter per role.
+#Usage : python -m benchmarks.bench_startup --roles recognize register all
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Runs inside the child interpreter
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from app.services.face_logic import load_models
+load_models()
+ready = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "models_s": ready - imported,
+    "total_s": ready - start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, # ru_maxrss is in KB on Linux
+    "tensorflow_loaded": "tensorflow" in sys.modules,
+}))
+"""
+
+
+def measure(role):
+    env = dict(os.environ, WORKER_ROLE=role, FACE_EXECUTOR="inline", DATABASE_URL="sqlite://")
+    output = subprocess.run([sys.executable, "-c", _PROBE], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report worker startup time and memory per WORKER_ROLE.")
+    parser.add_argument("--roles", nargs="+", default=["recognize", "register", "all"])
+    args = parser.parse_args()
+
+    print(f"{'role':>10} {'import s':>9} {'models s':>9} {'total s':>8} {'max RSS MB':>11} {'tensorflow':>11}")
+    for role in args.roles:
+        r = measure(role)
+        print(f"{role:>10} {r['import_s']:>9.2f} {r['models_s']:>9.2f} {r['total_s']:>8.2f} {r['max_rss_mb']:>11.0f} {str(r['tensorflow_loaded']):>11}")
@@ -0,0 +1,44 @@
+#Compares two benchmark result files from benchmarks.suite and flags regressions.
+#Usage : python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+#Exits with status 1 when any shared measurement got slower than the threshold, so it can gate CI.
+
+import argparse
+import json
+
+
+def compare(baseline, candidate, threshold, metric="median_ms"):
+    """ Returns: A list of (name, baseline ms, candidate ms, ratio, regressed) for the measurements in both files """
+    rows = []
+    for name, old in baseline["results"].items():
+        new = candidate["results"].get(name)
+        if new is None or not old.get(metric):
+            continue
+        ratio = new[metric] / old[metric]
+        rows.append((name, old[metric], new[metric], ratio, ratio > 1 + threshold))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmarks.suite JSON files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown before flagging (0.10 = 10%%)")
+    parser.add_argument("--metric", default="median_ms", choices=["median_ms", "mean_ms", "p95_ms", "min_ms"])
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    print(f"baseline {baseline['environment'].get('commit')}  candidate {candidate['environment'].get('commit')}")
+    if baseline["environment"].get("platform") != candidate["environment"].get("platform"):
+        print("Warning: results come from different machines, ratios are not meaningful.")
+
+    rows = compare(baseline, candidate, args.threshold, args.metric)
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"{'measurement':<{width}} {'baseline':>10} {'candidate':>10} {'ratio':>7}")
+    for name, old, new, ratio, regressed in rows:
+        print(f"{name:<{width}} {old:>10.3f} {new:>10.3f} {ratio:>6.2f}x{'  REGRESSION' if regressed else ''}")
+    regressions = sum(row[4] for row in rows)
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    raise SystemExit(1 if regressions else 0)
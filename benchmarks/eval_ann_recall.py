@@ -0,0 +1,48 @@
+#Reports recall@1 and latency of the IVF index against the exact Gallery on a synthetic gallery.
+#Usage : python -m benchmarks.eval_ann_recall --size 100000 --queries 1000 --nprobe 1 4 8 16 32
+
+import argparse
+import time
+import numpy as np
+from app.services.ann_index import IVFIndex
+from app.services.gallery import Gallery
+from benchmarks.synthetic import synthetic_gallery, noisy_queries
+
+
+def evaluate(size, queries, nlist, nprobes, seed=0):
+    ids, encodings = synthetic_gallery(size, seed)
+    _, query_matrix = noisy_queries(encodings, queries, seed=seed + 1)
+    gallery = Gallery(ids, encodings)
+
+    start = time.perf_counter()
+    index = IVFIndex.train(gallery, nlist=nlist)
+    print(f"Gallery: {size} encodings, {index.nlist} partitions, trained in {time.perf_counter() - start:.2f}s")
+
+    # Ground truth : the exact nearest neighbour of every query
+    start = time.perf_counter()
+    exact_ids = [int(ids[gallery.nearest(query)[0]]) for query in query_matrix]
+    exact_ms = (time.perf_counter() - start) * 1000 / queries
+    print(f"{'mode':>10} {'recall@1':>9} {'ms/query':>9} {'speedup':>8}")
+    print(f"{'exact':>10} {1.0:>9.4f} {exact_ms:>9.3f} {1.0:>7.1f}x")
+
+    results = []
+    for nprobe in nprobes:
+        index.nprobe = nprobe
+        start = time.perf_counter()
+        found = [index.nearest(query)[0] for query in query_matrix]
+        ivf_ms = (time.perf_counter() - start) * 1000 / queries
+        recall = float(np.mean([a == b for a, b in zip(found, exact_ids)]))
+        results.append({"nprobe": nprobe, "recall_at_1": recall, "ms_per_query": ivf_ms})
+        print(f"{'nprobe=' + str(nprobe):>10} {recall:>9.4f} {ivf_ms:>9.3f} {exact_ms / ivf_ms:>7.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@1 of the IVF gallery index versus the exact matcher.")
+    parser.add_argument("--size", type=int, default=100_000, help="Number of synthetic encodings in the gallery")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of noisy probe encodings")
+    parser.add_argument("--nlist", type=int, default=0, help="Partitions (0 = sqrt(size))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="Values of IVF_NPROBE to test")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    evaluate(args.size, args.queries, args.nlist or None, args.nprobe, args.seed)
@@ -0,0 +1,256 @@
+#Headless, offline benchmark of the face pipeline and the API. Writes JSON results that can be compared across commits.
+#Usage : python -m benchmarks.suite --sizes 1000 10000 100000 --output bench.json
+#        python -m benchmarks.suite --images "faces/*.jpg" --sizes 1000000 --output bench.json
+#        python -m benchmarks.compare baseline.json bench.json
+
+import os
+import tempfile
+
+# Settings are read at import time: point the app at a throwaway database (never the real one),
+# run face jobs inline so the timings are of the functions themselves, and disable the duplicate-frame cache
+# and the duplicate-face check (the suite resends the same frames and registers the same photos on purpose).
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='bench_')}/bench.db"
+os.environ["FACE_EXECUTOR"] = "inline"
+os.environ["RESULT_CACHE_TTL"] = "0"
+os.environ["DUPLICATE_ACTION"] = "off"
+
+import argparse
+import asyncio
+import datetime
+import glob
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from sqlalchemy import insert
+from app.core.config import settings
+from app.services.encoding_format import serialize_encoding
+from app.services.face_logic import load_image_from_bytes, get_live_encoding, detect_faces, find_match
+from app.services.gallery import Gallery
+from benchmarks.synthetic import synthetic_gallery, noisy_queries, synthetic_frames
+
+DEFAULT_RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def log(message):
+    print(message, file=sys.stderr) # Progress goes to stderr, stdout is kept for the JSON report
+
+
+def summarize(samples_ms):
+    """ Returns: mean / median / p95 / min milliseconds of the samples """
+    samples = np.sort(np.asarray(samples_ms))
+    return {
+        "runs": len(samples),
+        "mean_ms": float(samples.mean()),
+        "median_ms": float(np.median(samples)),
+        "p95_ms": float(samples[min(len(samples) - 1, int(0.95 * len(samples)))]),
+        "min_ms": float(samples[0]),
+    }
+
+
+def time_each(func, inputs, repeats, warmup=1):
+    """ Calls func(x) for every input, `repeats` times after `warmup` untimed passes. Returns: summary per call """
+    for _ in range(warmup):
+        for x in inputs:
+            func(x)
+    samples = []
+    for _ in range(repeats):
+        for x in inputs:
+            start = time.perf_counter()
+            func(x)
+            samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def environment():
+    """ Enough context to tell whether two result files are comparable. """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {name: getattr(settings, name) for name in (
+            "DETECTION_MAX_SIDE", "GALLERY_INDEX", "RECOGNIZE_BATCH_SIZE", "RECOGNIZE_BATCH_WAIT_MS", "FACE_TOLERANCE")},
+    }
+
+
+# 1. Pipeline functions
+class _Upload:
+    """ The part of UploadFile that detect_faces uses. """
+
+    def __init__(self, data):
+        self.data = data
+
+    async def read(self):
+        return self.data
+
+    async def seek(self, pos):
+        pass
+
+
+def bench_pipeline(images, labels, repeats, results):
+    for image_bytes, label in zip(images, labels):
+        results[f"load_image_from_bytes[{label}]"] = time_each(load_image_from_bytes, [image_bytes], repeats)
+        results[f"get_live_encoding[{label}]"] = time_each(get_live_encoding, [image_bytes], repeats)
+        results[f"get_live_encoding[{label}]"]["face_found"] = get_live_encoding(image_bytes) is not None
+        log(f"  {label}: decode {results[f'load_image_from_bytes[{label}]']['median_ms']:.1f} ms, "
+            f"live encoding {results[f'get_live_encoding[{label}]']['median_ms']:.1f} ms")
+
+    # Registration: five photos per employee, like the webcam form
+    photos = [images[i % len(images)] for i in range(5)]
+    results["detect_faces[5 photos]"] = time_each(lambda _: asyncio.run(detect_faces([_Upload(p) for p in photos])),
+                                                  [None], repeats)
+    log(f"  detect_faces (5 photos): {results['detect_faces[5 photos]']['median_ms']:.1f} ms")
+
+
+# 2. Gallery matching
+def bench_matching(sizes, queries, repeats, results):
+    for size in sizes:
+        ids, encodings = synthetic_gallery(size)
+        start = time.perf_counter()
+        gallery = Gallery(ids, encodings)
+        build_ms = (time.perf_counter() - start) * 1000
+        _, query_matrix = noisy_queries(encodings, queries)
+        query_bytes = [serialize_encoding(query) for query in query_matrix]
+        entry = time_each(lambda q: find_match(gallery, q), query_bytes, repeats)
+        entry.update({"gallery_build_ms": build_ms, "gallery_mb": encodings.nbytes / 2**20})
+        results[f"find_match[n={size}]"] = entry
+        log(f"  find_match n={size}: {entry['median_ms']:.3f} ms")
+        del gallery, encodings
+
+
+# 3. Endpoints, in-process through the ASGI app (no server, no HTTP client library)
+def _multipart(fields, files):
+    boundary = "benchmark-boundary"
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: image/jpeg\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+async def _post(app, path, fields, files):
+    body, content_type = _multipart(fields, files)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+        "client": ("benchmark", 0), "server": ("benchmark", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status, chunks = None, []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, json.loads(b"".join(chunks))
+
+
+async def _time_endpoint(app, path, fields, files, repeats):
+    await _post(app, path, fields, files) # Warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        status, body = await _post(app, path, fields, files)
+        samples.append((time.perf_counter() - start) * 1000)
+    entry = summarize(samples)
+    entry.update({"http_status": status, "response_status": body.get("status")})
+    return entry
+
+
+def bench_endpoints(images, gallery_size, repeats, results):
+    from app.main import app
+    from app.core.database import SessionLocal
+    from app.models.employee import Employee
+
+    # Seed the throwaway database with a synthetic workforce
+    ids, encodings = synthetic_gallery(gallery_size)
+    db = SessionLocal()
+    db.execute(insert(Employee), [{"name": f"Employee {i}", "department": f"Dept {i % 20}",
+                                   "encoding": serialize_encoding(encoding)} for i, encoding in zip(ids, encodings)])
+    db.commit()
+    db.close()
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            recognize = [("file", "frame.jpg", images[0])]
+            register = [("files", f"photo{i}.jpg", images[i % len(images)]) for i in range(5)]
+            results[f"endpoint.recognize[n={gallery_size}]"] = await _time_endpoint(
+                app, "/api/recognize", {"device": "benchmark"}, recognize, repeats)
+            results[f"endpoint.register[n={gallery_size}]"] = await _time_endpoint(
+                app, "/api/register", {"name": "Benchmark", "department": "Benchmark"}, register, repeats)
+
+    asyncio.run(run())
+    for name in ("recognize", "register"):
+        log(f"  /api/{name}: {results[f'endpoint.{name}[n={gallery_size}]']['median_ms']:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the face pipeline and API, with JSON output.")
+    parser.add_argument("--images", help="Glob of face photos (default: synthetic frames, which contain no detectable face)")
+    parser.add_argument("--resolutions", nargs="+", default=[f"{w}x{h}" for w, h in DEFAULT_RESOLUTIONS],
+                        help="Synthetic frame sizes, WIDTHxHEIGHT")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Synthetic gallery sizes for find_match (1000000 needs ~1.5 GB of RAM)")
+    parser.add_argument("--queries", type=int, default=200, help="Probe encodings per gallery size")
+    parser.add_argument("--endpoint-gallery", type=int, default=1000, help="Employees seeded for the endpoint benchmarks")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed passes per measurement")
+    parser.add_argument("--only", nargs="+", choices=["pipeline", "matching", "endpoints"],
+                        default=["pipeline", "matching", "endpoints"])
+    parser.add_argument("--output", help="Write the JSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.images:
+        paths = sorted(glob.glob(args.images))
+        if not paths:
+            raise SystemExit(f"No image matches {args.images}")
+        images = [open(path, "rb").read() for path in paths]
+        labels = [os.path.basename(path) for path in paths]
+    else:
+        resolutions = [tuple(int(v) for v in r.split("x")) for r in args.resolutions]
+        images = synthetic_frames(resolutions)
+        labels = [f"synthetic {w}x{h}" for w, h in resolutions]
+
+    results = {}
+    if "pipeline" in args.only:
+        log("Pipeline")
+        bench_pipeline(images, labels, args.repeats, results)
+    if "matching" in args.only:
+        log("Matching")
+        bench_matching(args.sizes, args.queries, args.repeats, results)
+    if "endpoints" in args.only:
+        log("Endpoints")
+        bench_endpoints(images, args.endpoint_gallery, args.repeats, results)
+
+    report = {"environment": environment(), "images": labels, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        log(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#Synthetic face encodings for benchmarks : no photos or models needed.
+
+import numpy as np
+import cv2
+
+def synthetic_gallery(size, seed=0, groups=64):
+    """
+    Generates `size` unit-scale 128-d encodings shaped roughly like face_recognition output:
+    identities are spread around a few `groups` (faces are not uniformly distributed),
+    and two different people are usually 0.7-1.2 apart.
+    Returns: ids (int64 array), encodings (size x 128 float32 matrix)
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0.0, 0.05, size=(groups, 128))
+    encodings = centers[rng.integers(0, groups, size)] + rng.normal(0.0, 0.045, size=(size, 128))
+    return np.arange(1, size + 1, dtype=np.int64), encodings.astype(np.float32)
+
+
+def noisy_queries(encodings, count, noise=0.02, seed=1):
+    """
+    Picks `count` gallery rows and perturbs them like a new photo of the same person (distance ~0.2-0.3).
+    Returns: row indices of the true identities, query matrix (count x 128 float32)
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(encodings), count)
+    queries = encodings[rows] + rng.normal(0.0, noise, size=(count, encodings.shape[1]))
+    return rows, queries.astype(np.float32)
+
+
+def synthetic_frames(resolutions, seed=0, quality=90):
+    """
+    Camera-like JPEG frames (smooth background with a face-sized oval) for timing decode and detection offline.
+    The detectors usually find no face in them: encoding and matching costs need real photos (--images).
+    Returns: A list of JPEG bytes, one per (width, height)
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for width, height in resolutions:
+        noise = rng.integers(0, 255, size=(height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+        img = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+        center, axes = (width // 2, height // 2), (width // 8, height // 5)
+        cv2.ellipse(img, center, axes, 0, 0, 360, (150, 180, 220), -1)
+        for dx in (-axes[0] // 2, axes[0] // 2): # Eyes
+            cv2.circle(img, (center[0] + dx, center[1] - axes[1] // 4), max(axes[0] // 8, 1), (40, 40, 40), -1)
+        frames.append(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    return frames
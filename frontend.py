@@ -1,10 +1,14 @@
 import streamlit as st
 import requests
 import time
+import uuid
+import cv2
+import numpy as np
 from datetime import datetime
+from app.core.config import settings
 
 # --- CONFIGURATION ---
-API_URL = "http://127.0.0.1:8000/api"
+API_URL = settings.API_URL # From .env, like the backend settings
 st.set_page_config(page_title="Face Recognition Attendance System", page_icon="🛡️", layout="wide")
 
 # --- PROFESSIONAL CSS STYLING ---
@@ -83,6 +87,9 @@ if 'page' not in st.session_state:
     st.session_state['page'] = 'login'
 if 'login_time' not in st.session_state:
     st.session_state['login_time'] = None
+if 'device' not in st.session_state:
+    # Stable across reruns, so a resent frame hits the server's duplicate-frame cache
+    st.session_state['device'] = settings.KIOSK_ID or f"streamlit-{uuid.uuid4().hex[:8]}"
 
 # --- HELPER FUNCTIONS ---
 def switch_page(page_name):
@@ -101,6 +108,84 @@ def get_greeting():
     elif hour < 18: return "Good Afternoon"
     else: return "Good Evening"
 
+# One pooled keep-alive HTTP session per Streamlit process: scans reuse open connections instead of a new TCP handshake each
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def compress_frame(image_bytes):
+    """ Downscales a camera frame to UPLOAD_MAX_SIDE and re-encodes it as JPEG (UPLOAD_JPEG_QUALITY) before upload. """
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return image_bytes # Not an image we can read: let the server answer
+    longest = max(image.shape[:2])
+    if settings.UPLOAD_MAX_SIDE and longest > settings.UPLOAD_MAX_SIDE:
+        scale = settings.UPLOAD_MAX_SIDE / longest
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, settings.UPLOAD_JPEG_QUALITY])
+    return encoded.tobytes() if ok else image_bytes
+
+def post_api(path, **kwargs):
+    """ POST through the shared session, asking the server for its stage timings. Returns: Response, round trip (ms) """
+    start = time.perf_counter()
+    res = get_http_session().post(f"{API_URL}{path}", headers={"X-Trace": "1"}, timeout=settings.UPLOAD_TIMEOUT, **kwargs)
+    return res, (time.perf_counter() - start) * 1000
+
+def show_timings(res, round_trip_ms, uploaded_bytes):
+    """ Shows where the time went: round trip, upload size, and the server's Server-Timing stages. """
+    server = {}
+    for entry in res.headers.get("Server-Timing", "").split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if name and duration:
+            server[name] = float(duration)
+    total = server.pop("total", None)
+    summary = [f"Round trip {round_trip_ms:.0f} ms", f"upload {uploaded_bytes / 1024:.0f} KB"]
+    if total is not None:
+        summary += [f"server {total:.0f} ms", f"network + client {max(0.0, round_trip_ms - total):.0f} ms"]
+    st.caption(" · ".join(summary))
+    if server:
+        st.caption("Server stages: " + " · ".join(f"{name} {ms:.0f} ms" for name, ms in server.items()))
+
+def wait_for_registration(job_id, interval=0.5):
+    """ Polls a registration job until it is done or failed (or UPLOAD_TIMEOUT passes). Returns: The last job status """
+    deadline = time.perf_counter() + settings.UPLOAD_TIMEOUT
+    status = st.empty()
+    while True:
+        job = get_http_session().get(f"{API_URL}/register/jobs/{job_id}", timeout=5).json()
+        if job.get('status') not in ('queued', 'running'):
+            status.empty()
+            return job
+        if time.perf_counter() > deadline:
+            status.empty()
+            return {"status": "failed", "msg": "Registration is taking too long, please try again later."}
+        status.caption("⏳ Waiting in queue..." if job['status'] == 'queued' else "🔍 Detecting faces...")
+        time.sleep(interval)
+
+# Attendance history is cached per employee, so reruns of the dashboard do not hit the API again
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_attendance(employee_id, period="month", limit=1):
+    try:
+        res = get_http_session().get(f"{API_URL}/attendance/employees/{employee_id}", params={"period": period, "limit": limit}, timeout=5)
+        return res.json().get("items", [])
+    except Exception:
+        return []
+
+@st.cache_data(ttl=15, show_spinner=False)
+def fetch_recent_events(employee_id, limit=10):
+    try:
+        res = get_http_session().get(f"{API_URL}/attendance/employees/{employee_id}/events", params={"limit": limit}, timeout=5)
+        return res.json().get("items", [])
+    except Exception:
+        return []
+
+def working_days_this_month():
+    today = datetime.now().date()
+    return sum(1 for d in range(1, today.day + 1) if today.replace(day=d).weekday() < 5) or 1
+
 # --- PAGE: LOGIN ---
 def login_page():
     # Centered Layout
@@ -121,9 +206,11 @@ def login_page():
             if img_file:
                 with st.spinner("🔄 Verifying Biometrics..."):
                     try:
-                        files = {"file": img_file.getvalue()}
-                        res = requests.post(f"{API_URL}/recognize", files=files)
+                        frame = compress_frame(img_file.getvalue())
+                        res, round_trip_ms = post_api("/recognize", files={"file": ("frame.jpg", frame, "image/jpeg")},
+                                                      data={"device": st.session_state['device']})
                         data = res.json()
+                        show_timings(res, round_trip_ms, len(frame))
                         
                         if data.get('status') == 'success':
                             # Success Logic
@@ -180,19 +267,25 @@ def register_page():
                         try:
                             files_to_send = []
                             for i, pic in enumerate(st.session_state['reg_photos']):
-                                files_to_send.append(('files', (f'photo_{i}.jpg', pic.getvalue(), 'image/jpeg')))
+                                files_to_send.append(('files', (f'photo_{i}.jpg', compress_frame(pic.getvalue()), 'image/jpeg')))
                             
                             payload = {'name': st.session_state['reg_name'], 'department': st.session_state['reg_dept']}
-                            res = requests.post(f"{API_URL}/register", data=payload, files=files_to_send)
+                            # The server answers with a job id at once, the page polls it while MTCNN runs
+                            res, round_trip_ms = post_api("/register/jobs", data=payload, files=files_to_send)
+                            show_timings(res, round_trip_ms, sum(len(f[1][1]) for f in files_to_send))
+                            job = res.json()
+                            if job.get('status') == 'success':
+                                job = wait_for_registration(job['job_id'])
                             
-                            if res.status_code == 200 and res.json().get('status') == 'success':
+                            if job.get('status') == 'done':
                                 st.balloons()
-                                st.success("✅ Registration Complete!")
+                                st.success(f"✅ Registration Complete! (best photo {job['image_index'] + 1}, "
+                                           f"confidence {job['confidence']:.2f}, {job['elapsed_seconds']:.1f} s)")
                                 time.sleep(2)
                                 st.session_state['reg_photos'] = []
                                 switch_page('login')
                             else:
-                                st.error(f"Failed: {res.json().get('msg')}")
+                                st.error(f"Failed: {job.get('msg')}")
                         except Exception as e:
                             st.error(f"Error: {e}")
                 else:
@@ -239,22 +332,29 @@ def dashboard_page():
     st.markdown("Here is your daily attendance summary.")
     st.markdown("---")
 
-    # Metrics
+    # Metrics (from the precomputed monthly rollup)
+    employee_id = user.get('id')
+    this_month = fetch_attendance(employee_id, "month", 1) if employee_id else []
+    # The newest row may be last month's (no scan flushed yet this month)
+    month_start = datetime.now().date().replace(day=1).isoformat()
+    this_month = [row for row in this_month if str(row.get('period_start', ''))[:10] == month_start]
+    days_present = this_month[0]['days_present'] if this_month else 0
+    scans = this_month[0]['scans'] if this_month else 0
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Current Status", "✅ Checked In", delta="Active")
     c2.metric("Check-In Time", login_time, delta="On Time")
-    c3.metric("Attendance Rate", "98%", "+2%")
-    c4.metric("Pending Tasks", "3", "Normal", delta_color="off")
+    c3.metric("Attendance Rate", f"{min(100, round(100 * days_present / working_days_this_month()))}%", f"{days_present} days this month", delta_color="off")
+    c4.metric("Scans This Month", scans, delta_color="off")
 
     st.markdown("### 📊 Activity Log")
     
     # Styled Table
-    # We add the "Current Login" as the top row dynamically
+    # Latest recognitions recorded by the server (the current login may still be in the write-behind buffer)
+    events = fetch_recent_events(employee_id) if employee_id else []
     data = [
-        {"Event": "Login Success", "Time": login_time, "Date": datetime.now().strftime("%Y-%m-%d"), "Status": "Verified"},
-        {"Event": "System Check", "Time": "08:55 AM", "Date": datetime.now().strftime("%Y-%m-%d"), "Status": "Auto"},
-        {"Event": "Logout", "Time": "05:00 PM", "Date": "Yesterday", "Status": "User"},
-    ]
+        {"Event": "Face Verified", "Time": e['timestamp'][11:16], "Date": e['timestamp'][:10], "Device": e.get('device') or "-"}
+        for e in events
+    ] or [{"Event": "Login Success", "Time": login_time, "Date": datetime.now().strftime("%Y-%m-%d"), "Device": "-"}]
     st.dataframe(data, use_container_width=True)
 
     # Quick Actions
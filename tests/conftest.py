@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import: point the app at a throwaway SQLite database before anything imports it
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='attendance_tests_'), 'test.db')}"
+os.environ["GALLERY_SNAPSHOT_PATH"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, create_db_engine
+import app.models.employee, app.models.attendance, app.models.face_template, app.models.registration_job # Register every table on Base
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """ A fresh SQLite database per test. Returns: a sessionmaker bound to it """
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    engine.dispose()
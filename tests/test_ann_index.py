@@ -0,0 +1,44 @@
+import numpy as np
+from app.services.ann_index import IVFIndex
+from app.services.gallery import Gallery
+
+
+def clustered_gallery(size=2000, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, 128)).astype(np.float32)
+    encodings = centers[rng.integers(0, clusters, size)] + rng.normal(size=(size, 128)).astype(np.float32) * 0.05
+    return Gallery(np.arange(size), encodings)
+
+
+def test_full_probe_is_exact():
+    gallery = clustered_gallery()
+    index = IVFIndex.train(gallery, nlist=16, nprobe=16)
+    queries = gallery.encodings[::97] + 0.01
+    for query in queries:
+        exact = gallery.nearest(query)
+        assert index.nearest(query) == (int(gallery.ids[exact[0]]), exact[1])
+
+
+def test_recall_with_few_probes():
+    gallery = clustered_gallery()
+    index = IVFIndex.train(gallery, nlist=16, nprobe=4)
+    queries = gallery.encodings[::20] + 0.01
+    hits = sum(index.nearest(query)[0] == int(gallery.ids[gallery.nearest(query)[0]]) for query in queries)
+    assert hits / len(queries) >= 0.95
+
+
+def test_add_and_save_load(tmp_path):
+    gallery = clustered_gallery(500, 8)
+    index = IVFIndex.train(gallery, nlist=8, nprobe=8)
+    new = np.full(128, 3.0, dtype=np.float32)
+    index.add(9999, new)
+    assert len(index) == 501 and index.match(new, tolerance=0.1)[0] == 9999
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    gallery.add(9999, new)
+    loaded = IVFIndex.load(gallery, path, nprobe=8)
+    assert len(loaded) == 501
+    np.testing.assert_array_equal(loaded.centroids, index.centroids)
+    assert loaded.match(new, tolerance=0.1)[0] == 9999
+    assert IVFIndex.load(gallery, str(tmp_path / "missing.npz")) is None
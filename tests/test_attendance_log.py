@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+import numpy as np
+from sqlalchemy import select
+from app.models.attendance import AttendanceEvent
+from app.models.employee import Employee
+from app.services.attendance_log import AttendanceWriter
+from app.services.encoding_format import serialize_encoding
+
+T0 = datetime.datetime(2026, 3, 2, 8, 0)
+
+
+def add_employees(session_factory, count=2):
+    db = session_factory()
+    db.add_all([Employee(name=f"E{i}", department="AI", encoding=serialize_encoding(np.full(128, i / 10)))
+                for i in range(1, count + 1)])
+    db.commit()
+    db.close()
+
+
+def stored_events(session_factory):
+    db = session_factory()
+    try:
+        return [(event.employee_id, event.device) for event in db.scalars(select(AttendanceEvent).order_by(AttendanceEvent.id))]
+    finally:
+        db.close()
+
+
+def test_stop_writes_buffered_events(session_factory):
+    add_employees(session_factory)
+    writer = AttendanceWriter(flush_size=100, flush_interval=60, session_factory=session_factory)
+
+    async def run():
+        for i in range(3):
+            writer.record(1, 0.3, f"kiosk-{i}", T0)
+        assert stored_events(session_factory) == [] # Neither trigger reached
+        await writer.stop()
+    asyncio.run(run())
+    assert stored_events(session_factory) == [(1, "kiosk-0"), (1, "kiosk-1"), (1, "kiosk-2")]
+    assert writer.stats() == {"buffered": 0, "flushed": 3}
+
+
+def test_size_trigger_flushes_before_the_interval(session_factory):
+    add_employees(session_factory)
+    writer = AttendanceWriter(flush_size=2, flush_interval=60, session_factory=session_factory)
+
+    async def run():
+        writer.record(1, 0.3, "a", T0)
+        writer.record(2, 0.3, "b", T0)
+        await asyncio.sleep(0.2)
+        flushed = writer.flushed
+        await writer.stop()
+        return flushed
+    assert asyncio.run(run()) == 2
+
+
+def test_failed_flush_keeps_events_ahead_of_newer_ones(session_factory):
+    add_employees(session_factory)
+    failures = [RuntimeError("database is down")] # The first commit fails
+
+    def flaky_sessions():
+        db = session_factory()
+        if failures:
+            error = failures.pop()
+            def commit():
+                raise error
+            db.commit = commit
+        return db
+    writer = AttendanceWriter(flush_size=100, flush_interval=60, session_factory=flaky_sessions)
+    writer.record(1, 0.3, "first", T0) # No event loop: flushed explicitly
+    writer.record(2, 0.3, "second", T0)
+    assert writer.flush() == 0 and writer.stats()["buffered"] == 2
+    writer.record(1, 0.3, "third", T0)
+    assert writer.flush() == 3
+    assert stored_events(session_factory) == [(1, "first"), (2, "second"), (1, "third")]
+
+
+def test_last_seen_is_the_latest_timestamp(session_factory):
+    add_employees(session_factory)
+    writer = AttendanceWriter(flush_size=100, flush_interval=60, session_factory=session_factory)
+    later = T0 + datetime.timedelta(hours=9)
+    writer.record(1, 0.3, "a", later)
+    writer.record(1, 0.3, "a", T0) # Arrives last, but is older
+    writer.record(2, 0.3, "b", T0)
+    writer.flush()
+    db = session_factory()
+    assert dict(db.execute(select(Employee.id, Employee.last_seen)).all()) == {1: later, 2: T0}
+    db.close()
@@ -0,0 +1,69 @@
+import datetime
+from sqlalchemy import select
+from app.models.employee import Employee
+from app.models.attendance import AttendanceDaily, AttendanceDepartmentDaily
+from app.services.attendance_rollup import apply_rollups
+
+DAY = datetime.date(2026, 3, 10)
+
+
+def at(hour, minute=0):
+    return datetime.datetime.combine(DAY, datetime.time(hour, minute))
+
+
+def add_employees(session_factory):
+    db = session_factory()
+    db.add_all([Employee(id=1, name="A", department="AI", encoding=b""),
+                Employee(id=2, name="B", department="AI", encoding=b"")])
+    db.commit()
+    db.close()
+
+
+def fold(session_factory, events):
+    db = session_factory()
+    try:
+        apply_rollups(db, events)
+        db.commit()
+    finally:
+        db.close()
+
+
+def read(session_factory):
+    db = session_factory()
+    try:
+        daily = {row.employee_id: (row.scans, row.first_seen, row.last_seen) for row in db.scalars(select(AttendanceDaily))}
+        department = {row.department: (row.employees_present, row.scans) for row in db.scalars(select(AttendanceDepartmentDaily))}
+        return daily, department
+    finally:
+        db.close()
+
+
+def test_new_rows(session_factory):
+    add_employees(session_factory)
+    fold(session_factory, [{"employee_id": 1, "timestamp": at(9)}, {"employee_id": 1, "timestamp": at(8)},
+                           {"employee_id": 2, "timestamp": at(10)}])
+    daily, department = read(session_factory)
+    assert daily == {1: (2, at(8), at(9)), 2: (1, at(10), at(10))}
+    assert department == {"AI": (2, 3)}
+
+
+def test_same_batch_through_two_sessions(session_factory):
+    add_employees(session_factory)
+    batch = [{"employee_id": 1, "timestamp": at(9)}, {"employee_id": 1, "timestamp": at(17)},
+             {"employee_id": 2, "timestamp": at(12)}]
+    fold(session_factory, batch)
+    # A second worker flushing the same events: counts add up, nobody is counted present twice
+    fold(session_factory, [dict(event) for event in batch])
+    daily, department = read(session_factory)
+    assert daily == {1: (4, at(9), at(17)), 2: (2, at(12), at(12))}
+    assert department == {"AI": (2, 6)}
+
+
+def test_first_and_last_seen_widen(session_factory):
+    add_employees(session_factory)
+    fold(session_factory, [{"employee_id": 1, "timestamp": at(12)}])
+    fold(session_factory, [{"employee_id": 1, "timestamp": at(7)}, {"employee_id": 2, "timestamp": at(8)}])
+    fold(session_factory, [{"employee_id": 1, "timestamp": at(19)}])
+    daily, department = read(session_factory)
+    assert daily[1] == (3, at(7), at(19))
+    assert department == {"AI": (2, 4)}
@@ -0,0 +1,29 @@
+import numpy as np
+from app.scripts.dedup_report import near_duplicate_pairs
+from app.services.gallery import Gallery
+
+
+def brute_force_pairs(ids, encodings, threshold):
+    pairs = {}
+    for i in range(len(ids)):
+        for j in range(i + 1, len(ids)):
+            distance = float(np.linalg.norm(encodings[i] - encodings[j]))
+            if ids[i] != ids[j] and distance < threshold:
+                key = (min(ids[i], ids[j]), max(ids[i], ids[j]))
+                pairs[key] = min(pairs.get(key, np.inf), distance)
+    return pairs
+
+
+def test_blocked_pairs_match_brute_force():
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(size=(300, 128)).astype(np.float32) * 0.05
+    ids = np.arange(300) // 2 # Two templates per employee
+    encodings[10] = encodings[250] + 0.001 # Employees 5 and 125 look alike
+    encodings[40] = encodings[41] # Same employee: never a pair
+    gallery = Gallery(ids, encodings)
+    expected = brute_force_pairs(ids.tolist(), encodings, 0.6)
+    for block_size in (7, 64, 1000):
+        pairs = near_duplicate_pairs(gallery, 0.6, block_size)
+        assert set(pairs) == set(expected)
+        assert max(abs(pairs[key] - expected[key]) for key in expected) < 1e-4
+    assert (5, 125) in expected and (20, 20) not in expected
@@ -0,0 +1,36 @@
+import os
+import pickle
+import numpy as np
+import pytest
+from app.services.encoding_format import (ENCODING_SIZE, serialize_encoding, deserialize_encoding, is_legacy_encoding)
+
+
+def test_round_trip():
+    encoding = np.random.default_rng(0).normal(size=128)
+    blob = serialize_encoding(encoding)
+    assert len(blob) == ENCODING_SIZE and not is_legacy_encoding(blob)
+    np.testing.assert_allclose(deserialize_encoding(blob), encoding.astype(np.float32))
+
+
+def test_legacy_pickled_float64():
+    encoding = np.random.default_rng(1).normal(size=128) # face_recognition encodings are float64
+    blob = pickle.dumps(encoding)
+    assert is_legacy_encoding(blob)
+    decoded = deserialize_encoding(blob)
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, encoding.astype(np.float32))
+    # Migrating a legacy row gives the same vector in the new format
+    np.testing.assert_array_equal(deserialize_encoding(serialize_encoding(decoded)), decoded)
+
+
+def test_legacy_loader_refuses_other_objects():
+    with pytest.raises(pickle.UnpicklingError):
+        deserialize_encoding(pickle.dumps(os.system))
+
+
+def test_bad_version_or_size():
+    blob = serialize_encoding(np.zeros(128))
+    with pytest.raises(ValueError):
+        deserialize_encoding(blob[:2] + bytes([9]) + blob[3:])
+    with pytest.raises(ValueError):
+        deserialize_encoding(blob[:-4])
@@ -0,0 +1,121 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.models.employee import Employee
+from app.services import enrollment
+from app.services.encoding_format import serialize_encoding
+from app.services.enrollment import resolve_import_source
+from app.services.gallery_cache import GalleryCache
+
+
+@pytest.fixture
+def import_root(tmp_path, monkeypatch):
+    root = tmp_path / "imports"
+    (root / "site_a").mkdir(parents=True)
+    monkeypatch.setattr(settings, "IMPORT_ROOT", str(root))
+    return root
+
+
+def test_path_inside_root(import_root):
+    assert resolve_import_source("site_a") == os.path.realpath(import_root / "site_a")
+
+
+@pytest.mark.parametrize("source", ["../", "site_a/../..", "/etc", ".", "missing"])
+def test_path_outside_root_or_missing(import_root, source):
+    with pytest.raises(ValueError):
+        resolve_import_source(source)
+
+
+def test_symlink_out_of_root(import_root, tmp_path):
+    os.symlink(tmp_path, import_root / "escape")
+    with pytest.raises(ValueError):
+        resolve_import_source("escape")
+
+
+def test_disabled_without_root(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_ROOT", "")
+    with pytest.raises(ValueError):
+        resolve_import_source("site_a")
+
+
+def photo_folders(root, contents):
+    for folder, content in contents.items():
+        (root / folder).mkdir()
+        (root / folder / "1.jpg").write_bytes(content)
+    return [{"folder": name, "name": name, "department": "AI", "site": None} for name in contents]
+
+
+@pytest.fixture
+def import_job(tmp_path, monkeypatch, session_factory):
+    """ Runs an API-style import against the test database; every photo's "face" is the vector named in its bytes. """
+    monkeypatch.setattr(settings, "FACE_EXECUTOR", "inline")
+    monkeypatch.setattr(enrollment, "SessionLocal", session_factory)
+    cache = GalleryCache(session_factory)
+    monkeypatch.setattr(enrollment, "gallery_cache", cache)
+    faces = {b"face 1": np.full(128, 0.1), b"face 2": np.full(128, -0.1), b"face 3": np.linspace(-0.2, 0.2, 128)}
+
+    def fake_detect(images_bytes):
+        face = faces.get(images_bytes[0].rstrip()) # Trailing spaces: the same face, a slightly different encoding
+        if face is None:
+            raise ValueError("bad image")
+        return serialize_encoding(face + 0.001 * len(images_bytes[0])), 0, 0.99
+
+    monkeypatch.setattr(enrollment, "detect_best_face", fake_detect)
+
+    def run(contents, cli=False):
+        source = tmp_path / "source"
+        source.mkdir()
+        job = enrollment.EnrollmentImport(str(source), photo_folders(source, contents), str(tmp_path / "import.json"),
+                                          batch_size=10, on_insert=cache.add_employees)
+        if cli:
+            job.run(workers=2)
+        else:
+            asyncio.run(job.run_async(2))
+        return job
+    return run
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """ The CLI's process pool, in threads so the fake detector applies. """
+
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers)
+
+
+def test_unreadable_employee_fails_alone(import_job):
+    job = import_job({"a": b"face 1", "b": b"corrupt", "c": b"face 2"})
+    assert job.error is None
+    assert set(job.failures) == {"b"}
+    assert job.enrolled == 2
+
+
+def test_cli_unreadable_employee_fails_alone(import_job, monkeypatch):
+    monkeypatch.setattr(enrollment, "ProcessPoolExecutor", ThreadPool)
+    job = import_job({"a": b"face 1", "b": b"corrupt", "c": b"face 2"}, cli=True)
+    assert job.failures == {"b": "Could not read the photos: bad image"}
+    assert job.enrolled == 2 and set(job.done) == {"a", "c"}
+    # A resumed run only tries the failed folder again
+    resumed = enrollment.EnrollmentImport(job.source, job.manifest, job.checkpoint_path)
+    assert [row["folder"] for row, _ in resumed.pending()] == ["b"]
+
+
+def test_duplicates_rejected(import_job, session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "DUPLICATE_ACTION", "reject")
+    db = session_factory()
+    db.add(Employee(name="Registered", department="AI", encoding=serialize_encoding(np.full(128, -0.1))))
+    db.commit()
+    db.close()
+    # "b" is the registered employee, "c" is "a" again (a few bytes longer, same face) in the same batch
+    job = import_job({"a": b"face 1", "b": b"face 2", "c": b"face 1 ", "d": b"face 3"})
+    assert job.failures == {"b": "Duplicate of employee 1", "c": "Duplicate of folder a"}
+    assert job.enrolled == 2
+
+
+def test_duplicates_flagged(import_job, monkeypatch):
+    monkeypatch.setattr(settings, "DUPLICATE_ACTION", "flag")
+    job = import_job({"a": b"face 1", "b": b"face 1 "})
+    assert job.flagged == {"b": "folder a"}
+    assert job.enrolled == 2
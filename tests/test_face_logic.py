@@ -0,0 +1,129 @@
+import asyncio
+import cv2
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services import face_logic
+
+
+@pytest.fixture
+def fake_faces(monkeypatch):
+    """
+    Runs the registration logic inline on fake photos: each photo's bytes name its MTCNN confidence, b"0" has no face
+    and b"x" photos detect but cannot be encoded. Returns: the list of photos detected, in order.
+    """
+    monkeypatch.setattr(settings, "FACE_EXECUTOR", "inline")
+    monkeypatch.setattr(settings, "CONFIDENCE_THRESHOLD", 0.9)
+    monkeypatch.setattr(settings, "REGISTER_GOOD_ENOUGH_CONFIDENCE", 0)
+    detected = []
+
+    def detect(image_bytes):
+        detected.append(image_bytes)
+        confidence = float(image_bytes.rstrip(b"x"))
+        return confidence, ((0, 10, 10, 0) if confidence else None)
+
+    def encode(image_bytes, box):
+        return None if image_bytes.endswith(b"x") else b"encoding " + image_bytes
+
+    monkeypatch.setattr(face_logic, "detect_image_face", detect)
+    monkeypatch.setattr(face_logic, "encode_image_face", encode)
+    return detected
+
+
+def test_templates_keep_good_photos(fake_faces):
+    photos = [b"0.95", b"0", b"0.99", b"0.5", b"0.97x"]
+    templates = asyncio.run(face_logic.detect_face_templates(photos, max_templates=5))
+    assert [(i, confidence) for _, i, confidence in templates] == [(2, 0.99), (0, 0.95)]
+    assert len(fake_faces) == 5
+
+
+def test_templates_stop_once_enough_are_good(fake_faces, monkeypatch):
+    monkeypatch.setattr(settings, "REGISTER_GOOD_ENOUGH_CONFIDENCE", 0.96)
+    photos = [b"0.98", b"0.95", b"0.97", b"0.99", b"0.99"]
+    templates = asyncio.run(face_logic.detect_face_templates(photos, max_templates=2))
+    # Photos 0 and 2 reach 0.96: the search stops there, the better photos 3 and 4 are never used
+    assert [i for _, i, _ in templates] == [0, 2]
+
+
+def encode(image, ext=".jpg", params=()):
+    return cv2.imencode(ext, image, list(params))[1].tobytes()
+
+
+def frame(width, height):
+    return np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("params", [(), (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)])
+def test_jpeg_size_baseline_and_progressive(params):
+    assert face_logic._jpeg_size(encode(frame(1280, 720), params=params)) == (1280, 720)
+
+
+@pytest.mark.parametrize("image_bytes", [
+    encode(frame(64, 48), ".png"),
+    encode(frame(1280, 720))[:40], # Truncated before the frame header
+    b"\xff\xd8" + bytes(range(256)), # Garbage after the JPEG signature
+    b"",
+])
+def test_jpeg_size_not_a_readable_jpeg(image_bytes):
+    assert face_logic._jpeg_size(image_bytes) is None
+
+
+@pytest.mark.parametrize("ext", [".jpg", ".png"])
+def test_detection_image_is_downscaled(ext):
+    rgb_img, scale = face_logic.load_detection_image(encode(frame(1280, 960), ext), max_side=640)
+    assert rgb_img.shape == (480, 640, 3) and scale == 2.0
+
+
+def test_small_image_keeps_full_resolution():
+    rgb_img, scale = face_logic.load_detection_image(encode(frame(320, 240)), max_side=640)
+    assert rgb_img.shape == (240, 320, 3) and scale == 1.0
+
+
+def test_unreadable_detection_image():
+    with pytest.raises(ValueError):
+        face_logic.load_detection_image(encode(frame(1280, 720))[:40], max_side=640)
+
+
+def test_boxes_map_back_to_full_resolution():
+    image = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    top, right, bottom, left = 400, 1200, 700, 900
+    image[top:bottom, left:right] = 255
+    rgb_img, scale = face_logic.load_detection_image(encode(image), max_side=640)
+    rows, cols = np.nonzero(rgb_img[:, :, 0] > 127)
+    box = (rows.min(), cols.max() + 1, rows.max() + 1, cols.min()) # Found on the small copy
+    for full, mapped in zip((top, right, bottom, left), face_logic.scale_box(box, scale)):
+        assert abs(full - mapped) <= scale
+
+
+def best_face_async(images_bytes):
+    return asyncio.run(face_logic.detect_faces_in_images(images_bytes))
+
+
+@pytest.fixture(params=[best_face_async, face_logic.detect_best_face], ids=["async", "sync"])
+def best_face(request, fake_faces):
+    """ Both registration entry points share the (best_encoding_bytes, best_index, best_confidence) contract. """
+    return request.param
+
+
+def test_best_face_is_the_most_confident(best_face):
+    assert best_face([b"0.95", b"0.99", b"0.97"]) == (b"encoding 0.99", 1, 0.99)
+
+
+def test_best_face_tie_goes_to_the_earlier_photo(best_face):
+    assert best_face([b"0.5", b"0.97", b"0.97 "]) == (b"encoding 0.97", 1, 0.97)
+
+
+def test_best_face_falls_back_when_encoding_fails(best_face):
+    assert best_face([b"0.95", b"0.99x"]) == (b"encoding 0.95", 0, 0.95)
+
+
+def test_best_face_none_above_threshold(best_face):
+    assert best_face([b"0.5", b"0", b"0.99x"]) == (None, -1, 0.0)
+
+
+def test_best_face_early_exit(best_face, fake_faces, monkeypatch):
+    monkeypatch.setattr(settings, "REGISTER_GOOD_ENOUGH_CONFIDENCE", 0.96)
+    # Photo 1 is good enough: the better photo 2 is never used
+    assert best_face([b"0.92", b"0.97", b"0.99"]) == (b"encoding 0.97", 1, 0.97)
+    if best_face is face_logic.detect_best_face:
+        assert fake_faces == [b"0.92", b"0.97"] # Photo 2 is not even detected
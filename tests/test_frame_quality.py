@@ -0,0 +1,70 @@
+import asyncio
+import cv2
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services import registration
+from app.services.frame_quality import check_frame, load_gate_image
+
+
+def jpeg(image):
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def textured(seed=0, shape=(480, 640)):
+    """ A sharp, evenly lit frame without a face. """
+    return np.random.default_rng(seed).integers(60, 200, shape, dtype=np.uint8)
+
+
+@pytest.fixture(autouse=True)
+def gate_settings(monkeypatch):
+    monkeypatch.setattr(settings, "QUALITY_GATE", True)
+    monkeypatch.setattr(settings, "QUALITY_MAX_SIDE", 240)
+    monkeypatch.setattr(settings, "QUALITY_MIN_BRIGHTNESS", 35)
+    monkeypatch.setattr(settings, "QUALITY_MAX_BRIGHTNESS", 225)
+    monkeypatch.setattr(settings, "QUALITY_MIN_SHARPNESS", 20)
+    monkeypatch.setattr(settings, "QUALITY_FACE_CHECK", False)
+
+
+def test_load_gate_image_downscales():
+    gray = load_gate_image(jpeg(textured(shape=(960, 1280))))
+    assert gray.ndim == 2 and max(gray.shape) == 240
+    small = load_gate_image(cv2.imencode(".png", textured(shape=(100, 80)))[1].tobytes())
+    assert small.shape == (100, 80)
+    assert load_gate_image(b"not an image") is None
+
+
+@pytest.mark.parametrize("image, reason", [
+    (np.full((480, 640), 10, dtype=np.uint8), "too_dark"),
+    (np.full((480, 640), 245, dtype=np.uint8), "too_bright"),
+    (cv2.GaussianBlur(textured(), (0, 0), 8), "blurry"),
+    (textured(), None),
+])
+def test_check_frame(image, reason):
+    assert check_frame(jpeg(image)) == reason
+
+
+def test_unreadable_and_gate_off(monkeypatch):
+    assert check_frame(b"\xff\xd8 truncated") == "unreadable"
+    monkeypatch.setattr(settings, "QUALITY_GATE", False)
+    assert check_frame(b"\xff\xd8 truncated") is None
+
+
+def test_face_check_only_when_asked():
+    frame = jpeg(textured())
+    assert check_frame(frame, face_check=True) == "no_face"
+    assert check_frame(frame) is None # QUALITY_FACE_CHECK is off by default
+
+
+def test_registration_skips_face_check(monkeypatch):
+    monkeypatch.setattr(settings, "QUALITY_FACE_CHECK", True)
+    detected = []
+
+    async def detect_face_templates(images_bytes):
+        detected.extend(images_bytes)
+        return []
+    monkeypatch.setattr(registration, "detect_face_templates", detect_face_templates)
+    side_angle, dark = jpeg(textured()), jpeg(np.zeros((480, 640), dtype=np.uint8))
+    response = asyncio.run(registration.register_employee(None, "A", "AI", None, [side_angle, dark]))
+    assert response["msg"] == "No clear face found."
+    assert detected == [side_angle] # No face for the cascade, still sent to MTCNN; the dark shot is dropped
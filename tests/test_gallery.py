@@ -0,0 +1,46 @@
+import numpy as np
+from app.services.gallery import Gallery
+
+
+def brute_force(encodings, live):
+    return np.sqrt(((encodings - live) ** 2).sum(axis=1))
+
+
+def test_distances_match_brute_force():
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(size=(50, 128)).astype(np.float32) * 0.1
+    gallery = Gallery(np.arange(50), encodings)
+    live = rng.normal(size=(4, 128)).astype(np.float32) * 0.1
+    np.testing.assert_allclose(gallery.distances(live[0]), brute_force(encodings, live[0]), atol=1e-5)
+    np.testing.assert_allclose(gallery.distances_many(live), np.stack([brute_force(encodings, l) for l in live]), atol=1e-5)
+
+
+def test_match_and_tolerance():
+    encodings = np.eye(3, 128, dtype=np.float32)
+    gallery = Gallery([10, 20, 30], encodings)
+    assert gallery.match(encodings[1] + 0.01, tolerance=0.5)[:2] == (20, 1)
+    assert gallery.match(np.zeros(128), tolerance=0.5) == (None, -1, None)
+    assert Gallery().match(np.zeros(128)) == (None, -1, None)
+    many = gallery.match_many(np.stack([encodings[2], np.zeros(128)]), tolerance=0.5)
+    assert [match[0] for match in many] == [30, None]
+
+
+def test_add_grows_and_keeps_rows():
+    gallery = Gallery()
+    rng = np.random.default_rng(1)
+    encodings = rng.normal(size=(40, 128)).astype(np.float32)
+    for employee_id, encoding in enumerate(encodings):
+        gallery.add(employee_id, encoding)
+    assert len(gallery) == 40
+    np.testing.assert_array_equal(gallery.encodings, encodings)
+    np.testing.assert_allclose(gallery.sq_norms, (encodings ** 2).sum(axis=1), rtol=1e-5)
+    assert gallery.match(encodings[33], tolerance=0.1)[0] == 33
+
+
+def test_employee_distances_take_closest_template():
+    encodings = np.zeros((3, 128), dtype=np.float32)
+    encodings[0, 0], encodings[1, 0], encodings[2, 0] = 1.0, 0.2, 0.5
+    gallery = Gallery([7, 7, 9], encodings) # Employee 7 has two templates
+    employee_ids, distances = gallery.employee_distances(np.zeros(128))
+    assert employee_ids.tolist() == [7, 9]
+    np.testing.assert_allclose(distances, [0.2, 0.5], atol=1e-6)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.models.employee import Employee
+from app.services.encoding_format import serialize_encoding
+from app.services.gallery import Gallery
+from app.services.gallery_cache import GalleryCache
+from app.services.gallery_snapshot import open_snapshot, read_header, write_snapshot
+
+
+def random_gallery(size, seed=0, first_id=1):
+    rng = np.random.default_rng(seed)
+    return Gallery(np.arange(first_id, first_id + size), rng.normal(size=(size, 128)).astype(np.float32))
+
+
+def test_write_and_open(tmp_path):
+    path = str(tmp_path / "gallery.snapshot")
+    first, second = random_gallery(5), random_gallery(3, seed=1, first_id=10)
+    assert write_snapshot(path, [first, second], (8, 12, 0, 0)) == 1
+    snapshot = open_snapshot(path)
+    assert (snapshot.generation, snapshot.version) == (1, (8, 12, 0, 0))
+    np.testing.assert_array_equal(snapshot.gallery.ids, np.concatenate([first.ids, second.ids]))
+    np.testing.assert_array_equal(snapshot.gallery.encodings, np.concatenate([first.encodings, second.encodings]))
+    np.testing.assert_allclose(snapshot.gallery.sq_norms, np.concatenate([first.sq_norms, second.sq_norms]), rtol=1e-6)
+    assert read_header(path) == (1, (8, 12, 0, 0), snapshot.file_id)
+
+
+def test_replaced_snapshot_keeps_old_mapping(tmp_path):
+    path = str(tmp_path / "gallery.snapshot")
+    old_gallery = random_gallery(4)
+    write_snapshot(path, [old_gallery], (4, 4, 0, 0))
+    old = open_snapshot(path)
+    write_snapshot(path, [random_gallery(6, seed=2)], (6, 6, 0, 0))
+    new = open_snapshot(path)
+    assert new.generation == 2 and new.file_id != old.file_id
+    # A worker still searching the old mapping reads the old rows, untouched by the rename
+    np.testing.assert_array_equal(old.gallery.encodings, old_gallery.encodings)
+    assert old.gallery.match(old_gallery.encodings[2])[0] == 3
+
+
+def test_missing_or_invalid_snapshot(tmp_path):
+    path = tmp_path / "gallery.snapshot"
+    assert open_snapshot(str(path)) is None and read_header(str(path)) is None
+    path.write_bytes(b"not a snapshot" * 10)
+    assert open_snapshot(str(path)) is None and read_header(str(path)) is None
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "gallery.snapshot")
+    write_snapshot(path, [Gallery()], (0, 0, 0, 0))
+    assert len(open_snapshot(path).gallery) == 0
+
+
+@pytest.fixture
+def shared_snapshot(tmp_path, monkeypatch, session_factory):
+    monkeypatch.setattr(settings, "GALLERY_SNAPSHOT_PATH", str(tmp_path / "gallery.snapshot"))
+    monkeypatch.setattr(settings, "GALLERY_INDEX", "exact")
+    db = session_factory()
+    encodings = np.random.default_rng(3).normal(size=(3, 128)).astype(np.float32)
+    db.add_all([Employee(name=f"E{i}", department="AI", encoding=serialize_encoding(encoding)) for i, encoding in enumerate(encodings)])
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def test_workers_share_one_publication(shared_snapshot):
+    first, second = GalleryCache(shared_snapshot), GalleryCache(shared_snapshot)
+    first.load()
+    second.load() # Maps the first worker's file instead of publishing again
+    assert first.stats()["snapshot"]["generation"] == second.stats()["snapshot"]["generation"] == 1
+    assert len(second.gallery) == 3
+
+
+def test_append_publishes_and_other_worker_remaps(shared_snapshot):
+    first, second = GalleryCache(shared_snapshot), GalleryCache(shared_snapshot)
+    first.load()
+    second.load()
+    encoding = np.full(128, 0.05, dtype=np.float32)
+    db = shared_snapshot()
+    employee = Employee(name="New", department="HR", encoding=serialize_encoding(encoding))
+    db.add(employee)
+    db.commit()
+    employee_id = employee.id
+    db.close()
+
+    first.add_employees([(employee_id, serialize_encoding(encoding), "HQ", "HR")])
+    assert first.stats()["snapshot"]["generation"] == 2
+    assert first.get().match(encoding)[0] == employee_id
+    assert first.get(("site", "HQ")).match(encoding)[0] == employee_id
+
+    assert second.get().match(encoding)[0] is None # Not seen until its next version check
+    assert second.refresh_if_stale()
+    assert second.stats()["snapshot"]["generation"] == 2 # Mapped, not republished
+    assert second.get().match(encoding)[0] == employee_id
+    assert not second.refresh_if_stale()
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.gallery import Gallery
+from app.services.partitions import GalleryPartitions, parse_scope, in_scope
+
+
+@pytest.fixture(autouse=True)
+def access_groups(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_GROUPS", {"lobby": {"sites": ["HQ"], "departments": ["Security"]}})
+
+
+def test_parse_scope():
+    assert parse_scope(None) is None
+    assert parse_scope(" Site : HQ ") == ("site", "HQ")
+    assert parse_scope("group:lobby") == ("group", "lobby")
+    for text in ("HQ", "building:HQ", "site:", "group:unknown"):
+        with pytest.raises(ValueError):
+            parse_scope(text)
+
+
+def test_in_scope():
+    assert in_scope(None, None, None)
+    assert in_scope(("site", "HQ"), "HQ", "AI") and not in_scope(("site", "HQ"), "Plant", "AI")
+    assert in_scope(("group", "lobby"), "Plant", "Security") and not in_scope(("group", "lobby"), "Plant", "AI")
+
+
+def make_partitions():
+    encodings = np.eye(5, 128, dtype=np.float32)
+    gallery = Gallery([1, 1, 2, 3, 4], encodings) # Employee 1 has two templates
+    keys = {1: ("HQ", "AI"), 2: ("HQ", "Security"), 3: ("Plant", "Security"), 4: (None, "AI")}
+    return gallery, GalleryPartitions(gallery, keys)
+
+
+def test_rows_per_scope():
+    _, partitions = make_partitions()
+    assert partitions.rows(("site", "HQ")).tolist() == [0, 1, 2]
+    assert partitions.rows(("department", "AI")).tolist() == [0, 1, 4]
+    assert partitions.rows(("group", "lobby")).tolist() == [0, 1, 2, 3]
+    assert partitions.rows(("site", "Nowhere")).tolist() == []
+    assert partitions.gallery(("site", "Plant")).ids.tolist() == [3]
+
+
+def test_add_updates_rows_and_built_galleries():
+    gallery, partitions = make_partitions()
+    hq = partitions.gallery(("site", "HQ")) # Built before the add
+    encoding = np.full(128, 0.5, dtype=np.float32)
+    gallery.add(5, encoding)
+    partitions.add(5, len(gallery) - 1, "HQ", "Finance")
+    assert partitions.rows(("site", "HQ")).tolist() == [0, 1, 2, 5]
+    assert partitions.rows(("department", "Finance")).tolist() == [5]
+    assert hq.match(encoding, tolerance=0.1)[0] == 5
+    assert partitions.gallery(("site", "Plant")).match(encoding, tolerance=0.1)[0] is None
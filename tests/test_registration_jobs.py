@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from app.services import registration_jobs
+from app.services.registration_jobs import RegistrationQueue
+
+
+@pytest.fixture
+def fake_register(monkeypatch):
+    """ register_employee stand-in: "slow" photos take a while, "bad" ones fail. """
+    async def register(db, name, department, site, images_bytes):
+        await asyncio.sleep(0.2 if images_bytes == [b"slow"] else 0)
+        if images_bytes == [b"bad"]:
+            return {"status": "error", "msg": "No clear face found."}
+        return {"status": "success", "msg": f"Registered {name}", "id": 7, "image_index": 0, "confidence": 0.99, "templates": 1}
+    monkeypatch.setattr(registration_jobs, "register_employee", register)
+
+
+def test_status_visible_from_another_worker(session_factory, fake_register):
+    accepting = RegistrationQueue(4, 1, session_factory=session_factory)
+    other_worker = RegistrationQueue(4, 1, session_factory=session_factory)
+
+    async def run():
+        good = await accepting.submit("A", "AI", None, [b"photo"])
+        bad = await accepting.submit("B", "AI", None, [b"bad"])
+        assert other_worker.status(good)["status"] in ("queued", "running")
+        await accepting.stop()
+        return good, bad
+    good, bad = asyncio.run(run())
+    done, failed = other_worker.status(good), other_worker.status(bad)
+    assert (done["status"], done["id"], done["image_index"], done["confidence"]) == ("done", 7, 0, 0.99)
+    assert (failed["status"], failed["msg"]) == ("failed", "No clear face found.")
+    assert other_worker.status("unknown") is None
+
+
+def test_full_queue_refuses_jobs(session_factory, fake_register):
+    queue = RegistrationQueue(1, 1, session_factory=session_factory)
+
+    async def run():
+        first = await queue.submit("A", "AI", None, [b"slow"])
+        await asyncio.sleep(0.05) # Taken by the worker, the queue is empty again
+        second = await queue.submit("B", "AI", None, [b"slow"])
+        third = await queue.submit("C", "AI", None, [b"slow"])
+        await queue.stop()
+        return first, second, third
+    first, second, third = asyncio.run(run())
+    assert first and second and third is None
+
+
+def test_stop_drains_or_fails_accepted_jobs(session_factory, fake_register):
+    queue = RegistrationQueue(4, 1, session_factory=session_factory)
+
+    async def run():
+        job_ids = [await queue.submit(name, "AI", None, [b"slow"]) for name in "ABC"]
+        await queue.stop(timeout=0.3) # Enough for the first job only
+        return job_ids
+    job_ids = asyncio.run(run())
+    statuses = [queue.status(job_id) for job_id in job_ids]
+    assert statuses[0]["status"] == "done"
+    assert all(status["status"] == "failed" and "restarted" in status["msg"] for status in statuses[1:])
+
+
+def test_concurrent_submits_for_the_last_slot(session_factory, fake_register):
+    queue = RegistrationQueue(1, 1, session_factory=session_factory)
+
+    async def run():
+        running = await queue.submit("A", "AI", None, [b"slow"])
+        await asyncio.sleep(0.05) # Taken by the worker: one free slot left
+        results = await asyncio.gather(queue.submit("B", "AI", None, [b"slow"]), queue.submit("C", "AI", None, [b"slow"]))
+        await queue.stop()
+        return running, results
+    running, results = asyncio.run(run())
+    accepted = [job_id for job_id in results if job_id]
+    assert running and len(accepted) == 1 and results.count(None) == 1
+    assert queue.status(accepted[0])["status"] == "done"
+    db = session_factory()
+    try:
+        assert db.query(registration_jobs.RegistrationJobRecord).count() == 2 # No row left behind for the refused job
+    finally:
+        db.close()
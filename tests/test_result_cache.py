@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+from app.services import result_cache
+from app.services.result_cache import RecognizeCache, frame_hash, hamming
+
+
+def jpeg(image):
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_frame_hash_near_duplicates():
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (31, 31), 0)
+    noisy = np.clip(image.astype(np.int16) + rng.integers(-2, 3, image.shape), 0, 255).astype(np.uint8)
+    other = cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (31, 31), 0)
+    assert hamming(frame_hash(jpeg(image)), frame_hash(jpeg(noisy))) <= 8
+    assert hamming(frame_hash(jpeg(image)), frame_hash(jpeg(other))) > 40
+    assert frame_hash(b"not an image") is None
+
+
+def test_hit_per_device_and_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    generation = result_cache.gallery_cache.generation
+    cache = RecognizeCache(ttl=2, max_devices=8, per_device=4, max_distance=4)
+    cache.put("kiosk-1", 0b1011, (7, 0, 0.3), generation)
+    assert cache.get("kiosk-1", 0b1001) == (True, (7, 0, 0.3)) # 1 bit away
+    assert cache.get("kiosk-2", 0b1011) == (False, None) # Another device
+    assert cache.get("kiosk-1", 0b1011 ^ 0xFFFF) == (False, None) # Too different
+    now[0] += 3
+    assert cache.get("kiosk-1", 0b1011) == (False, None) # Expired
+
+
+def test_gallery_change_invalidates(monkeypatch):
+    cache = RecognizeCache(ttl=60, max_devices=8, per_device=4, max_distance=4)
+    generation = result_cache.gallery_cache.generation
+    cache.put("kiosk-1", 1, (7, 0, 0.3), generation)
+    monkeypatch.setattr(result_cache.gallery_cache, "generation", generation + 1)
+    assert cache.get("kiosk-1", 1) == (False, None)
+    cache.put("kiosk-1", 1, (7, 0, 0.3), generation) # Computed against the old gallery: not stored
+    assert cache.get("kiosk-1", 1) == (False, None)
+
+
+def test_least_recently_used_device_evicted():
+    cache = RecognizeCache(ttl=60, max_devices=2, per_device=4, max_distance=0)
+    generation = result_cache.gallery_cache.generation
+    for device in ("a", "b", "c"):
+        cache.put(device, 1, device, generation)
+    assert cache.get("a", 1) == (False, None)
+    assert cache.get("c", 1) == (True, "c")
@@ -0,0 +1,44 @@
+import pytest
+from app.core.config import settings
+from app.services.tracker import FaceTracker, iou
+
+
+@pytest.fixture(autouse=True)
+def stream_settings(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_CONFIDENT_DISTANCE", 0.4)
+    monkeypatch.setattr(settings, "STREAM_REVERIFY_FRAMES", 30)
+
+
+def test_iou():
+    assert iou((0, 10, 10, 0), (0, 10, 10, 0)) == 1.0
+    assert iou((0, 10, 10, 0), (20, 30, 30, 20)) == 0.0
+    assert iou((0, 10, 10, 0), (0, 15, 10, 5)) == pytest.approx(50 / 150)
+
+
+def test_tracks_follow_boxes_and_skip_confident_encodings():
+    tracker = FaceTracker(iou_threshold=0.3, max_misses=1)
+    to_encode, dropped = tracker.update([(0, 10, 10, 0)], frame=0)
+    assert len(to_encode) == 1 and not dropped
+    track = to_encode[0]
+    track.employee_id, track.distance, track.verified_frame = 7, 0.3, 0
+
+    to_encode, _ = tracker.update([(1, 11, 11, 1)], frame=5) # Same face, moved a little
+    assert to_encode == [] and tracker.tracks == [track] and track.box == (1, 11, 11, 1)
+    to_encode, _ = tracker.update([(1, 11, 11, 1)], frame=30) # Periodic re-check
+    assert to_encode == [track]
+
+
+def test_uncertain_identity_is_encoded_again():
+    tracker = FaceTracker(iou_threshold=0.3, max_misses=1)
+    track = tracker.update([(0, 10, 10, 0)], frame=0)[0][0]
+    track.employee_id, track.distance, track.verified_frame = 7, 0.45, 0
+    assert tracker.update([(0, 10, 10, 0)], frame=1)[0] == [track]
+
+
+def test_new_face_and_dropped_track():
+    tracker = FaceTracker(iou_threshold=0.3, max_misses=1)
+    first = tracker.update([(0, 10, 10, 0)], frame=0)[0][0]
+    to_encode, dropped = tracker.update([(50, 60, 60, 50)], frame=1) # First face missed once, a new one appears
+    assert len(to_encode) == 1 and to_encode[0] is not first and not dropped
+    _, dropped = tracker.update([(50, 60, 60, 50)], frame=2)
+    assert dropped == [first] and len(tracker.tracks) == 1